@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Имя учетной записи, если файл учетных записей не задан
+DEFAULT_ACCOUNT = "default"
+
+
+class Account(NamedTuple):
+    """
+    Учетная запись МЭШ: имя, класс (раздел кэша расписания - ученики одного класса
+    видят одно расписание; None - определяется по дневнику), файл куки для браузера
+    и токен для MosregAPI
+    """
+    name: str
+    class_key: Optional[str]
+    cookies_file: str = "cookies.json"
+    token: Optional[str] = None
+
+
+class AccountRegistry:
+    """
+    Учетные записи МЭШ и привязка к ним чатов.
+
+    Формат файла (JSON):
+        {
+            "default": "9a",
+            "accounts": {
+                "9a": {"class": "9А", "cookies": "cookies_9a.json"},
+                "10b": {"cookies": "cookies_10b.json", "token": "..."}
+            },
+            "chats": {"-1001234567890": "10b"}
+        }
+
+    Если класс не указан, он определяется по школе и классу из дневника (set_class).
+    """
+
+    def __init__(self, accounts, default=None, chats=None):
+        self.accounts = {account.name: account for account in accounts}
+        if not self.accounts:
+            raise ValueError("Не задано ни одной учетной записи МЭШ")
+        self.default = self.accounts[default] if default else next(iter(self.accounts.values()))
+        # Привязка чатов к учетным записям из файла (команда /account хранит свою отдельно)
+        self.chats = {str(chat_id): name for chat_id, name in (chats or {}).items() if name in self.accounts}
+
+    @classmethod
+    def single(cls, cookies_file="cookies.json"):
+        """
+        Одна учетная запись (как до появления нескольких учетных записей)
+        """
+        return cls([Account(DEFAULT_ACCOUNT, DEFAULT_ACCOUNT, cookies_file)])
+
+    @classmethod
+    def load(cls, path):
+        """
+        Загружает учетные записи из файла; если файла нет - одна учетная запись с cookies.json
+        """
+        if not path or not os.path.exists(path):
+            return cls.single()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        accounts = [
+            Account(name, settings.get("class"), settings.get("cookies", "cookies.json"), settings.get("token"))
+            for name, settings in data.get("accounts", {}).items()
+        ]
+        registry = cls(accounts, data.get("default"), data.get("chats"))
+        logger.info(f"Загружено учетных записей МЭШ: {len(registry.accounts)} "
+                    f"(классов: {len(registry.class_keys())}), по умолчанию {registry.default.name}")
+        return registry
+
+    def get(self, name):
+        """
+        Возвращает учетную запись по имени (или None)
+        """
+        return self.accounts.get(name)
+
+    def names(self):
+        return list(self.accounts)
+
+    def class_keys(self):
+        return {account.class_key for account in self.accounts.values() if account.class_key is not None}
+
+    def set_class(self, name, class_key):
+        """
+        Задает класс учетной записи (определенный по дневнику) и возвращает обновленную запись
+        """
+        account = self.accounts[name]._replace(class_key=class_key)
+        self.accounts[name] = account
+        if self.default.name == name:
+            self.default = account
+        return account
+
+    def __len__(self):
+        return len(self.accounts)
+
+
+def class_key_from_info(info):
+    """
+    Ключ класса по данным дневника {"school": ..., "class": ...}: "школа / класс".
+    None, если класс или школа неизвестны: одноименные классы разных школ
+    не должны попасть в общий кэш (учетная запись остается отдельным классом)
+    """
+    if not info or not info.get("class"):
+        return None
+    class_name = "".join(info["class"].split()).upper()
+    school = " ".join((info.get("school") or "").split())
+    if not school:
+        return None
+    return f"{school} / {class_name}"
+
+
+class SessionPool:
+    """
+    Сеансы МЭШ (браузеры) по учетным записям.
+
+    Число одновременно открытых сеансов ограничено max_sessions: при открытии нового
+    закрывается давно не использовавшийся. Сеанс, простоявший дольше idle_timeout,
+    закрывается при следующем обращении. Браузер не допускает одновременной работы
+    из нескольких потоков, поэтому у каждой учетной записи своя блокировка (lock).
+    """
+
+    def __init__(self, max_sessions=2, idle_timeout=600, close=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._close = close or (lambda session: session.close())
+        # Имя учетной записи -> [сеанс, время последнего использования]
+        self._sessions = OrderedDict()
+        # Почему закрыт последний сеанс учетной записи (причина следующего запуска)
+        self._closed_reason = {}
+        self._locks = {}
+        self.evictions = 0
+
+    def get(self, name, now=None):
+        """
+        Возвращает кортеж (сеанс, причина запуска): сеанс, если он открыт и не простаивал
+        дольше idle_timeout, иначе None и причина открытия нового ("initial", "idle_timeout", "evicted")
+        """
+        now = now or time.time()
+        entry = self._sessions.get(name)
+        if entry is not None and now - entry[1] > self.idle_timeout:
+            self._remove(name, "idle_timeout")
+            entry = None
+        if entry is None:
+            return None, self._closed_reason.get(name, "initial")
+        entry[1] = now
+        self._sessions.move_to_end(name)
+        return entry[0], None
+
+    def put(self, name, session, now=None):
+        """
+        Сохраняет открытый сеанс; при превышении max_sessions закрывает давно не использованные
+        """
+        if name in self._sessions:
+            self._remove(name, "replaced")
+        self._sessions[name] = [session, now or time.time()]
+        while len(self._sessions) > self.max_sessions:
+            old_name = next(iter(self._sessions))
+            logger.info(f"Закрываем сеанс МЭШ учетной записи {old_name}: превышено число сеансов ({self.max_sessions})")
+            self._remove(old_name, "evicted")
+            self.evictions += 1
+
+    def lock(self, name):
+        """
+        Блокировка для работы с сеансом учетной записи из потока
+        """
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks.setdefault(name, threading.Lock())
+        return lock
+
+    def close_all(self):
+        for name in list(self._sessions):
+            self._remove(name, "initial")
+
+    def _remove(self, name, reason):
+        session, _ = self._sessions.pop(name)
+        self._closed_reason[name] = reason
+        try:
+            self._close(session)
+            logger.info(f"Сеанс МЭШ учетной записи {name} закрыт")
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии сеанса МЭШ учетной записи {name}: {e}")
+
+    def __contains__(self, name):
+        return name in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
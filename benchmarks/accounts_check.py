@@ -0,0 +1,83 @@
+"""
+Проверка определения класса учетных записей по дневнику (accounts.class_key_from_info).
+
+Ученики одного класса одной школы используют общий кэш расписания. Сценарий:
+1. ключ класса по данным дневника: "школа / класс"; без школы или класса - None;
+2. две учетные записи, дневник которых показывает одноименный класс без школы:
+   класс не определяется, у каждой учетной записи свой ключ кэша;
+3. те же учетные записи в одной школе: класс определяется, ключ кэша общий.
+
+Код возврата 1, если проверка не пройдена.
+
+Запуск:
+    python benchmarks/accounts_check.py
+"""
+import argparse
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from accounts import Account, AccountRegistry, class_key_from_info  # noqa: E402
+from check_harness import run_bot_check  # noqa: E402
+from portal_stub import STUDENT_CLASS, STUDENT_SCHOOL  # noqa: E402
+
+DATE = "17-03-2025"
+
+
+async def run(bot, args, check):
+    # 1. Ключ класса по данным дневника
+    check(class_key_from_info({"school": f"  {STUDENT_SCHOOL} ", "class": "9 а"}) == f"{STUDENT_SCHOOL} / 9А",
+          "ключ класса - школа и класс без лишних пробелов")
+    check(class_key_from_info({"school": STUDENT_SCHOOL}) is None and class_key_from_info(None) is None,
+          "без класса ключа нет")
+    check(class_key_from_info({"class": STUDENT_CLASS}) is None
+          and class_key_from_info({"school": " ", "class": STUDENT_CLASS}) is None,
+          "без школы ключа нет")
+
+    bot.accounts = AccountRegistry([
+        Account("main", "Другая школа / 5Б"),
+        Account("anna", None, "cookies_anna.json"),
+        Account("boris", None, "cookies_boris.json"),
+    ])
+    diaries = {}
+
+    async def get_class_info(account):
+        return diaries[account.name]
+    bot.get_class_info = get_class_info
+
+    async def keys():
+        anna = await bot.resolve_account(bot.accounts.get("anna"))
+        boris = await bot.resolve_account(bot.accounts.get("boris"))
+        return bot.schedule_key(DATE, anna), bot.schedule_key(DATE, boris)
+
+    # 2. Одноименный класс без школы
+    diaries.update(anna={"class": STUDENT_CLASS}, boris={"class": STUDENT_CLASS})
+    anna_key, boris_key = await keys()
+    print(f"\n  без школы: {anna_key}, {boris_key}\n")
+    check(bot.accounts.get("anna").class_key is None and bot.accounts.get("boris").class_key is None,
+          "без школы класс учетных записей не определен")
+    check(anna_key != boris_key, "без школы у учетных записей разные ключи кэша")
+    check(anna_key == f"account:anna/{DATE}", "учетная запись без класса - отдельный класс")
+
+    # 3. Одна школа
+    bot.class_detect_failures.clear()
+    diaries.update(anna={"school": STUDENT_SCHOOL, "class": STUDENT_CLASS},
+                   boris={"school": STUDENT_SCHOOL, "class": STUDENT_CLASS})
+    anna_key, boris_key = await keys()
+    print(f"\n  в одной школе: {anna_key}, {boris_key}\n")
+    check(anna_key == boris_key, "в одной школе у учетных записей общий ключ кэша")
+    check(bot.accounts.get("anna").class_key == class_key_from_info(diaries["anna"]),
+          "класс учетной записи запомнен")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка определения класса учетных записей")
+    args = parser.parse_args()
+    run_bot_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Бенчмарк разбора карточек уроков.
+
+Сравнивает скорость и точность классификатора строк (lesson_line_classifier)
+с прежним построчным разбором на корпусе сохраненных текстов карточек
+benchmarks/data/lesson_cards.json. Для каждой карточки в корпусе указан
+ожидаемый результат разбора.
+
+Запуск:
+    python benchmarks/bench_line_classifier.py [--iterations N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lesson_line_classifier import (  # noqa: E402
+    LessonLineClassifier, HOMEWORK_INDICATORS, TEACHER_INDICATORS, INTERFACE_ELEMENTS
+)
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lesson_cards.json")
+FIELDS = ("start_time", "end_time", "room", "teacher", "homework")
+
+
+def legacy_parse_card(subject, lesson_text):
+    """
+    Прежний разбор карточки урока из MosregSchedule.get_schedule (для сравнения)
+    """
+    lesson_info = {
+        "subject": subject,
+        "start_time": "Не указано",
+        "end_time": "Не указано",
+        "room": "Не указано",
+        "teacher": "Не указано",
+        "homework": "Не указано"
+    }
+    for line in lesson_text.split('\n'):
+        line = line.strip()
+        if not line or line == subject:
+            continue
+        if ":" in line and len(line) < 20:
+            if "-" in line:
+                parts = line.split("-")
+                lesson_info["start_time"] = parts[0].strip()
+                lesson_info["end_time"] = parts[1].strip()
+            else:
+                lesson_info["start_time"] = line.strip()
+        elif any(char.isdigit() for char in line) and len(line) < 15 and ":" not in line:
+            if "кабинет" in line.lower():
+                lesson_info["room"] = line.split("кабинет", 1)[1].strip()
+            else:
+                lesson_info["room"] = line.strip()
+        elif len(line) > 3:
+            is_homework = any(hw_ind.lower() in line.lower() for hw_ind in HOMEWORK_INDICATORS)
+            is_teacher = any(teacher_ind.lower() in line.lower() for teacher_ind in TEACHER_INDICATORS)
+            if is_homework or (len(line) > 30 and not is_teacher):
+                homework = line
+                for prefix in ["дз:", "домашнее задание:", "задание:"]:
+                    if homework.lower().startswith(prefix):
+                        homework = homework[len(prefix):].strip()
+                lesson_info["homework"] = homework
+            elif is_teacher or (len(line) < 30 and not is_homework):
+                teacher = line
+                for prefix in ["учитель:", "преподаватель:"]:
+                    if teacher.lower().startswith(prefix):
+                        teacher = teacher[len(prefix):].strip()
+                lesson_info["teacher"] = teacher
+    if len(lesson_info["teacher"]) > 50 and lesson_info["homework"] == "Не указано":
+        lesson_info["homework"] = lesson_info["teacher"]
+        lesson_info["teacher"] = "Не указано"
+    if any(word in lesson_info["teacher"].lower() for word in INTERFACE_ELEMENTS):
+        if not any(teacher_ind in lesson_info["teacher"].lower() for teacher_ind in TEACHER_INDICATORS):
+            lesson_info["teacher"] = "Не указано"
+    if any(word in lesson_info["room"].lower() for word in INTERFACE_ELEMENTS):
+        lesson_info["room"] = "Не указано"
+    return lesson_info
+
+
+def accuracy(parse, corpus):
+    """
+    Возвращает долю правильно разобранных полей и список ошибок
+    """
+    correct = 0
+    total = 0
+    errors = []
+    for card in corpus:
+        try:
+            result = parse(card["subject"], card["text"])
+        except Exception as e:
+            result = {}
+            errors.append(f"{card['subject']}: исключение {e!r}")
+        for field in FIELDS:
+            total += 1
+            if result.get(field) == card["expected"][field]:
+                correct += 1
+            elif result:
+                errors.append(f"{card['subject']}.{field}: {result.get(field)!r} != {card['expected'][field]!r}")
+    return correct / total, errors
+
+
+def speed(parse, corpus, iterations):
+    """
+    Возвращает среднее время разбора одной карточки в микросекундах
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for card in corpus:
+            try:
+                parse(card["subject"], card["text"])
+            except Exception:
+                pass
+    return (time.perf_counter() - start) / (iterations * len(corpus)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора карточек уроков")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--corpus", default=CORPUS_FILE)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    cold_classifier = LessonLineClassifier()
+    warm_classifier = LessonLineClassifier()
+    parsers = {
+        "прежний разбор": legacy_parse_card,
+        "классификатор (без памяти)": lambda subject, text: (cold_classifier._memo.clear(),
+                                                             cold_classifier.parse_card(subject, text))[1],
+        "классификатор": warm_classifier.parse_card,
+    }
+
+    print(f"Корпус: {len(corpus)} карточек")
+    print(f"{'Разбор':<28} {'мкс/карточка':>13} {'точность':>9}")
+    all_errors = {}
+    for name, parse in parsers.items():
+        score, errors = accuracy(parse, corpus)
+        elapsed = speed(parse, corpus, args.iterations)
+        print(f"{name:<28} {elapsed:>13.1f} {score:>8.1%}")
+        all_errors[name] = errors
+
+    for name, errors in all_errors.items():
+        if errors:
+            print(f"\nОшибки ({name}):")
+            for error in errors:
+                print(f"  - {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Офлайн-бенчмарк бота с тестовым сервером МЭШ.
+
+Запускает тестовый сервер с записанными учебными днями (portal_stub.py) и измеряет:
+- получение и разбор расписания через MosregAPI (JSON);
+- получение и разбор расписания через MosregSchedule (Selenium, если установлен Chrome);
+- обработчики mosh_telegram_bot с поддельным Telegram Bot: календарь, расписание
+  (первый запрос и из кэша), список и карточка ДЗ, отметка ДЗ, обновление;
+- поведение кэшей, время по этапам (из трассировки) и потребление памяти.
+
+Все файлы бота (кэш, статусы ДЗ) создаются во временном каталоге.
+
+Запуск:
+    python benchmarks/bench_offline.py [--users N] [--iterations N] [--portal-latency S]
+                                       [--telegram-latency S] [--delay-scale K]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from portal_stub import PortalStub  # noqa: E402
+from fake_telegram import FakeBot, FakeContext, make_callback_update  # noqa: E402
+from schedule_diff import lesson_keys, lesson_token  # noqa: E402
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+def print_table(title, rows):
+    """
+    rows: список (название, список длительностей в секундах)
+    """
+    print(f"\n{title}")
+    print(f"  {'':<28} {'n':>5} {'среднее, мс':>12} {'p50, мс':>10} {'p95, мс':>10}")
+    for name, durations in rows:
+        if not durations:
+            print(f"  {name:<28} {0:>5} {'-':>12} {'-':>10} {'-':>10}")
+            continue
+        print(f"  {name:<28} {len(durations):>5} {statistics.mean(durations) * 1000:>12.2f} "
+              f"{percentile(durations, 0.5) * 1000:>10.2f} {percentile(durations, 0.95) * 1000:>10.2f}")
+
+
+def start_chrome():
+    """
+    Запускает Chrome в фоновом режиме (или возвращает None, если Chrome недоступен)
+    """
+    try:
+        from selenium import webdriver
+        options = webdriver.ChromeOptions()
+        for argument in ("--headless", "--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu", "--window-size=1920,1080"):
+            options.add_argument(argument)
+        return webdriver.Chrome(options=options)
+    except Exception as e:
+        print(f"  Chrome недоступен, этап Selenium пропущен: {str(e).splitlines()[0][:120]}")
+        return None
+
+
+def bench_api(stub, iterations):
+    from mosreg_schedule import MosregAPI
+    from lesson_model import lessons_from_dicts
+
+    api = MosregAPI(base_url=stub.base_url, token="benchmark")
+    api.request_delay = 0
+    fetch_times, parse_times = [], []
+    for _ in range(iterations):
+        for date_str in stub.days:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                lessons = api.get_schedule(date_str)
+            fetched = time.perf_counter()
+            lessons_from_dicts(lessons)
+            fetch_times.append(fetched - started)
+            parse_times.append(time.perf_counter() - fetched)
+    print_table("MosregAPI (JSON)", [("запрос и разбор JSON", fetch_times), ("преобразование в Lesson", parse_times)])
+
+
+def bench_selenium(stub, iterations, workdir):
+    from mosreg_schedule_selenium import MosregSchedule
+    import tracing
+
+    browser = start_chrome()
+    if browser is None:
+        return False
+
+    traces_file = os.path.join(workdir, "selenium_traces.jsonl")
+    tracing.tracer.configure(export_path=traces_file)
+    correct = total = 0
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            scheduler = MosregSchedule(browser=browser, base_url=stub.base_url,
+                                       cookies_file=os.path.join(workdir, "cookies.json"))
+        fetch_times = []
+        for _ in range(iterations):
+            for date_str, expected in stub.days.items():
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    lessons = scheduler.get_schedule(date_str) or []
+                fetch_times.append(time.perf_counter() - started)
+                expected_homework = {lesson["subject"]: lesson.get("homework") or "Не указано" for lesson in expected}
+                for lesson in lessons:
+                    total += 1
+                    correct += expected_homework.get(lesson["subject"]) == lesson["homework"]
+        scheduler.close()
+    finally:
+        tracing.tracer.configure()
+
+    stages = span_durations(traces_file)
+    print_table("MosregSchedule (Selenium)", [("get_schedule", fetch_times)] +
+                [(name, stages[name]) for name in sorted(stages) if name.startswith("portal.")])
+    if total:
+        print(f"  Совпадение ДЗ с записанными днями: {correct}/{total}")
+    return True
+
+
+def span_durations(path):
+    """
+    Собирает длительности span-ов по именам из файла трасс
+    """
+    result = defaultdict(list)
+    if not os.path.exists(path):
+        return result
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            trace = json.loads(line)
+            result[trace["name"]].append(trace["duration_ms"] / 1000)
+            for span in trace["spans"]:
+                if span["duration_ms"] is not None:
+                    result[span["name"]].append(span["duration_ms"] / 1000)
+    return result
+
+
+class ApiScheduler:
+    """
+    Замена MosregSchedule на основе MosregAPI (если Chrome недоступен)
+    """
+
+    def __init__(self, base_url):
+        from mosreg_schedule import MosregAPI
+        self.api = MosregAPI(base_url=base_url, token="benchmark")
+        self.api.request_delay = 0
+
+    def get_schedule(self, date):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.api.get_schedule(date)
+
+    def close(self):
+        pass
+
+
+async def run_bot_scenario(bot, stub, users, telegram_latency):
+    fake_bot = FakeBot(latency=telegram_latency)
+    contexts = {user_id: FakeContext(fake_bot) for user_id in users}
+    phases = defaultdict(list)
+
+    async def press(phase, user_id, data, message_text="📅 Календарь", buttons=None):
+        update = make_callback_update(fake_bot, data, user_id=user_id, message_text=message_text, buttons=buttons)
+        started = time.perf_counter()
+        await bot.calendar_callback(update, contexts[user_id])
+        phases[phase].append(time.perf_counter() - started)
+
+    dates = list(stub.days)
+    _, month, year = dates[0].split("-")
+    first_user, other_users = users[0], users[1:]
+
+    for user_id in users:
+        await press("календарь", user_id, f"calendar_{int(year)}_{int(month)}")
+    for date_str in dates:
+        await press("расписание (первый запрос)", first_user, f"date_{date_str}")
+    for user_id in other_users:
+        for date_str in dates:
+            await press("расписание (из кэша)", user_id, f"date_{date_str}")
+    for user_id in users:
+        for date_str in dates:
+            await press("список ДЗ", user_id, f"homework_{date_str}")
+            # Кнопки ДЗ задают урок кодом его идентификатора
+            token = lesson_token(lesson_keys(bot.schedule_cache[date_str].lessons)[0])
+            await press("карточка ДЗ", user_id, f"hw_subject_{date_str}_{token}")
+            await press("отметка ДЗ", user_id, f"hw_toggle_{date_str}_{token}_0")
+            await press("список ДЗ (после отметки)", user_id, f"homework_{date_str}")
+    # Одновременное обновление одной даты всеми пользователями
+    started = time.perf_counter()
+    refresh_data = f"refresh_{dates[0]}"
+    await asyncio.gather(*(press("обновление (одновременно)", user_id, refresh_data, buttons=[[("🔄 Обновить", refresh_data)]])
+                           for user_id in users))
+    phases["обновление: все пользователи"].append(time.perf_counter() - started)
+
+    return phases, fake_bot
+
+
+def bench_bot(stub, users, telegram_latency, workdir, use_selenium):
+    import mosh_telegram_bot as bot
+    import tracing
+
+    traces_file = os.path.join(workdir, "bot_traces.jsonl")
+    tracing.tracer.configure(export_path=traces_file)
+    bot.MOSREG_BASE_URL = stub.base_url
+    if not use_selenium:
+        scheduler = ApiScheduler(stub.base_url)
+
+        async def get_scheduler(account=None):
+            return scheduler
+        bot.get_scheduler = get_scheduler
+
+    rss_before = bot.get_rss_bytes()
+    tracemalloc.start()
+    phases, fake_bot = asyncio.run(run_bot_scenario(bot, stub, users, telegram_latency))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = bot.get_rss_bytes()
+    tracing.tracer.configure()
+
+    print_table(f"Обработчики бота ({len(users)} польз., источник: {'Selenium' if use_selenium else 'MosregAPI'})",
+                list(phases.items()))
+
+    stages = span_durations(traces_file)
+    stage_names = ("get_schedule", "get_scheduler", "load_schedule", "scrape", "save_cache",
+                   "save_last_update_times", "format_schedule", "telegram.edit_message")
+    print_table("Этапы (по трассировке)", [(name, stages.get(name, [])) for name in stage_names])
+
+    print("\nКэш")
+    for (source,), child in bot.SCHEDULE_REQUESTS.children():
+        print(f"  запросы расписания, {source:<10} {child.value:>5}")
+    render_total = bot.render_cache.hits + bot.render_cache.misses
+    if render_total:
+        print(f"  кэш сообщений: попаданий {bot.render_cache.hits}/{render_total} "
+              f"({bot.render_cache.hits / render_total * 100:.0f}%), записей {len(bot.render_cache)}")
+    print(f"  запросов к тестовому МЭШ: {sum(stub.requests.values())} "
+          f"({', '.join(f'{path} {count}' for path, count in sorted(stub.requests.items()))})")
+    print(f"  вызовов Telegram API: {dict(fake_bot.calls)}")
+
+    print("\nПамять")
+    print(f"  пик выделений Python за сценарий: {peak / 1024:.0f} КБ")
+    if rss_before is not None and rss_after is not None:
+        print(f"  RSS: {rss_before / 1024 / 1024:.1f} МБ -> {rss_after / 1024 / 1024:.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк бота с тестовым сервером МЭШ")
+    parser.add_argument("--users", type=int, default=3, help="число пользователей в сценарии бота")
+    parser.add_argument("--iterations", type=int, default=20, help="повторы для MosregAPI и Selenium")
+    parser.add_argument("--portal-latency", type=float, default=0.0, help="задержка ответа тестового МЭШ, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="задержка вызовов Telegram API, с")
+    parser.add_argument("--delay-scale", type=float, default=0.0,
+                        help="множитель пауз загрузки страниц в MosregSchedule (1 - как в работе)")
+    args = parser.parse_args()
+
+    # Сообщения бота и скрейпера не нужны в отчете
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    import mosreg_schedule_selenium
+    for key in mosreg_schedule_selenium.NAVIGATION_DELAYS:
+        mosreg_schedule_selenium.NAVIGATION_DELAYS[key] *= args.delay_scale
+
+    with tempfile.TemporaryDirectory() as workdir, PortalStub(latency=args.portal_latency) as stub:
+        os.chdir(workdir)
+        with open("cookies.json", "w", encoding="utf-8") as f:
+            json.dump([], f)
+        print(f"Тестовый МЭШ: {stub.base_url}, дней: {len(stub.days)}, рабочий каталог: {workdir}")
+
+        bench_api(stub, args.iterations)
+        use_selenium = bench_selenium(stub, max(1, args.iterations // 10), workdir)
+        stub.requests.clear()
+        users = [100500 + i for i in range(max(1, args.users))]
+        bench_bot(stub, users, args.telegram_latency, workdir, use_selenium)
+
+
+if __name__ == "__main__":
+    main()
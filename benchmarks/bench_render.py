@@ -0,0 +1,82 @@
+"""
+Микро-бенчмарк времени отрисовки представлений бота.
+
+Сравнивает время формирования сообщения и клавиатуры для календаря,
+расписания, списка ДЗ и карточки ДЗ без кэша и с кэшем готовых сообщений.
+
+Запуск:
+    python benchmarks/bench_render.py [--iterations N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mosh_telegram_bot as bot  # noqa: E402
+from hw_status_store import EMPTY_DAY_STATUS  # noqa: E402
+from lesson_model import lessons_from_dicts  # noqa: E402
+from schedule_diff import lesson_keys, lesson_token  # noqa: E402
+
+DATE_STR = "14-03-2025"
+USER_ID = "100500"
+
+SAMPLE_LESSONS = lessons_from_dicts([
+    {"subject": "Алгебра", "start_time": "08:30", "end_time": "09:15", "room": "201",
+     "teacher": "Иванова А.А.", "homework": "№ 345, 347, 351 (стр. 112)"},
+    {"subject": "Русский язык", "start_time": "09:25", "end_time": "10:10", "room": "305",
+     "teacher": "Петрова Е.В.", "homework": "Упражнение 214, выучить правило"},
+    {"subject": "Физическая культура", "start_time": "10:30", "end_time": "11:15", "room": "Спортзал",
+     "teacher": "Сидоров В.П.", "homework": "Не указано"},
+    {"subject": "Английский язык", "start_time": "11:35", "end_time": "12:20", "room": "112",
+     "teacher": "Smith J.", "homework": "Student's book p. 54 ex. 3"},
+    {"subject": "Группа 10А_РОВ", "start_time": "12:30", "end_time": "13:15", "room": "210",
+     "teacher": "Кузнецова О.И.", "homework": "без дз"},
+    {"subject": "Группа 10А_ЭК", "start_time": "13:25", "end_time": "14:10", "room": "211",
+     "teacher": "Орлова Т.Н.", "homework": "Не указано"},
+    {"subject": "История", "start_time": "14:20", "end_time": "15:05", "room": "401",
+     "teacher": "Волков С.С.", "homework": "Прочитать параграф 18, ответить на вопросы"},
+    {"subject": "Информатика", "start_time": "15:15", "end_time": "16:00", "room": "Не указано",
+     "teacher": "Не указано", "homework": "Решить задачи 1-5 на сайте"},
+])
+
+HW_STATUS = EMPTY_DAY_STATUS
+# Код второго урока (как в callback_data кнопок ДЗ)
+HW_TOKEN = lesson_token(lesson_keys(SAMPLE_LESSONS)[1])
+
+VIEWS = {
+    "calendar": lambda: bot.render_calendar(3, 2025),
+    "schedule": lambda: bot.render_schedule(SAMPLE_LESSONS, DATE_STR),
+    "homework": lambda: bot.render_homework_buttons(SAMPLE_LESSONS, DATE_STR, USER_ID, HW_STATUS),
+    "hw_detail": lambda: bot.render_homework_detail(SAMPLE_LESSONS, DATE_STR, HW_TOKEN, USER_ID, HW_STATUS),
+}
+
+
+def measure(func, iterations, clear_cache):
+    """
+    Возвращает среднее время одного вызова в микросекундах
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if clear_cache:
+            bot.render_cache.clear()
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк отрисовки представлений бота")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'Представление':<12} {'без кэша, мкс':>15} {'с кэшем, мкс':>15} {'ускорение':>10}")
+    for name, func in VIEWS.items():
+        cold = measure(func, args.iterations, clear_cache=True)
+        bot.render_cache.clear()
+        warm = measure(func, args.iterations, clear_cache=False)
+        print(f"{name:<12} {cold:>15.1f} {warm:>15.1f} {cold / warm:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
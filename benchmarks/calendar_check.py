@@ -0,0 +1,130 @@
+"""
+Проверка сводки по месяцам для календаря (calendar_index.py).
+
+Бот с заглушкой МЭШ (как в load_test.py) получает расписание на все учебные дни
+месяца, один будний день - без уроков (каникулы). Затем проверяется, что календарь:
+- показывает у дат число уроков, невыполненные ДЗ пользователя и дни без уроков
+  и совпадает с отметками, посчитанными заново по кэшу расписания;
+- отрисовывается без запросов к МЭШ и без перестроения сводки: отметка ДЗ
+  и новое расписание на дату учитываются по одному дню.
+
+Выводится время построения сводки месяца и время отметок календаря по готовой сводке.
+Код возврата 1, если проверка не пройдена.
+
+Запуск:
+    python benchmarks/calendar_check.py [--repeat N]
+"""
+import argparse
+import asyncio
+import calendar
+import os
+import sys
+import time
+from datetime import date
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from check_harness import run_bot_check  # noqa: E402
+from load_test import StubScraper  # noqa: E402
+from portal_stub import load_days  # noqa: E402
+
+
+def expected_days(bot, month, year, user_id_str):
+    """
+    Отметки дат, посчитанные заново по кэшу расписания и статусам ДЗ (без сводки)
+    """
+    from calendar_index import CalendarDay, summarize_day
+    from subject_classifier import get_classifier
+
+    classifier = get_classifier()
+    result = {}
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        date_str = f"{day:02d}-{month:02d}-{year}"
+        cached = bot.schedule_cache.get(date_str)
+        if cached is None:
+            continue
+        summary = summarize_day(date_str, cached.lessons, classifier)
+        status = bot.hw_status_store.day_status(user_id_str, date_str)
+        pending = sum(1 for key in summary.homework if not status.get(key))
+        if summary.lessons or summary.holiday:
+            result[day] = CalendarDay(summary.lessons, False, pending, summary.holiday)
+    return result
+
+
+async def run(bot, args, check):
+    from lesson_model import DaySchedule
+
+    scraper = StubScraper(load_days(), 0.0)
+
+    async def get_scheduler(account=None):
+        return scraper
+    bot.get_scheduler = get_scheduler
+
+    # Прошедший месяц: прогнозов нет, только полученное расписание
+    today = date.today()
+    month, year = (today.month - 1, today.year) if today.month > 1 else (12, today.year - 1)
+    school = [f"{day:02d}-{month:02d}-{year}" for day in range(1, calendar.monthrange(year, month)[1] + 1)
+              if date(year, month, day).weekday() < 5]
+    await asyncio.gather(*(bot.get_schedule(date_str) for date_str in school))
+    holiday = school[len(school) // 2]
+    bot.store_schedule(holiday, DaySchedule(holiday, (), time.time()))
+    user_id_str = "900001"
+
+    started = time.perf_counter()
+    marks = bot.calendar_days(month, year, user_id_str=user_id_str)
+    build_time = time.perf_counter() - started
+    calls = scraper.calls
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        bot.calendar_days(month, year, user_id_str=user_id_str)
+    marks_time = (time.perf_counter() - started) / args.repeat
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        bot.render_calendar(month, year, user_id_str=user_id_str)
+    render_time = (time.perf_counter() - started) / args.repeat
+    print(f"Месяц {month:02d}.{year}: {len(school)} учебных дней\n"
+          f"  построение сводки месяца {build_time * 1000:.2f} мс, отметки по сводке {marks_time * 1e6:.0f} мкс, "
+          f"календарь с кэшем отрисовки {render_time * 1e6:.0f} мкс\n")
+
+    holiday_day = int(holiday[:2])
+    check(marks == expected_days(bot, month, year, user_id_str), "отметки совпадают с посчитанными заново по кэшу")
+    check(marks[holiday_day].holiday, "день без уроков отмечен")
+    check(any(mark.pending for mark in marks.values()), "невыполненные ДЗ отмечены")
+    check(scraper.calls == calls, "календарь отрисован без запросов к МЭШ")
+
+    # Отметка ДЗ пользователя: меняется число невыполненных, сводка не перестраивается
+    builds = bot.calendar_index.builds
+    day_str = next(f"{day:02d}-{month:02d}-{year}" for day, mark in marks.items() if mark.pending)
+    day = int(day_str[:2])
+    lessons = bot.schedule_cache[day_str].lessons
+    from schedule_diff import lesson_keys
+    key = next(key for lesson, key in zip(lessons, lesson_keys(lessons)) if lesson.has_homework)
+    bot.hw_status_store.set(user_id_str, day_str, key, True)
+    after_toggle = bot.calendar_days(month, year, user_id_str=user_id_str)
+    check(after_toggle[day].pending == marks[day].pending - 1, "отметка ДЗ уменьшила число невыполненных")
+    header, _ = bot.render_calendar(month, year, user_id_str=user_id_str)
+    check("Невыполненных ДЗ" in header, "в заголовке календаря число невыполненных ДЗ")
+
+    # Новое расписание на дату учитывается по одному дню
+    changed = lessons[:-1]
+    bot.store_schedule(day_str, DaySchedule(day_str, changed, time.time()))
+    after_change = bot.calendar_days(month, year, user_id_str=user_id_str)
+    check(after_change == expected_days(bot, month, year, user_id_str), "изменение расписания учтено в отметках")
+    check(bot.calendar_index.builds == builds, "сводка не перестраивалась (обновлена по одному дню)")
+
+    # Удаление устаревших записей кэша убирает отметки
+    bot.clean_schedule_cache(time.time() + bot.CACHE_TTL * 3)
+    check(not bot.calendar_days(month, year, user_id_str=user_id_str), "после очистки кэша отметок нет")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка сводки по месяцам для календаря")
+    parser.add_argument("--repeat", type=int, default=1000, help="повторов замера")
+    args = parser.parse_args()
+    run_bot_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Общие части проверок (*_check.py, webhook_harness.py): учет проверок сценария
+и запуск сценария с ботом во временном рабочем каталоге.
+
+Сценарий - асинхронная функция run(bot, args, check) (без бота - run(args, check)),
+check(условие, описание) печатает ok/FAIL. Процесс завершается с кодом 1,
+если хотя бы одна проверка не пройдена.
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+
+class Checks:
+    """
+    Результаты проверок: check(condition, description) печатает строку ok/FAIL
+    и запоминает непройденные проверки
+    """
+
+    def __init__(self):
+        self.failures = []
+
+    def __call__(self, condition, description):
+        print(f"  {'ok  ' if condition else 'FAIL'} {description}")
+        if not condition:
+            self.failures.append(description)
+
+    @property
+    def ok(self):
+        return not self.failures
+
+
+def quiet_logging():
+    logging.basicConfig(level=logging.CRITICAL)
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+
+def run_check(scenario, args):
+    """
+    Выполняет сценарий scenario(args, check) и завершает процесс
+    """
+    quiet_logging()
+    check = Checks()
+    asyncio.run(scenario(args, check))
+    sys.exit(0 if check.ok else 1)
+
+
+def run_bot_check(scenario, args):
+    """
+    Выполняет сценарий scenario(bot, args, check) и завершает процесс. Бот импортируется
+    во временном рабочем каталоге: файлы кэша и настроек не попадают в репозиторий
+    """
+    quiet_logging()
+    check = Checks()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        import mosh_telegram_bot as bot
+        asyncio.run(scenario(bot, args, check))
+        bot.thread_pool.shutdown(wait=False)
+    sys.exit(0 if check.ok else 1)
@@ -0,0 +1,136 @@
+"""
+Поддельный Telegram Bot для бенчмарков: вместо запросов к Telegram API
+записывает вызовы и (по желанию) выдерживает задержку, имитирующую сеть.
+"""
+import asyncio
+import itertools
+import time
+from collections import Counter
+
+from telegram import Bot, Update, User
+
+_update_ids = itertools.count(1)
+
+
+class FakeBot(Bot):
+    """
+    Bot, который не обращается к Telegram API
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__("123456:BENCHMARK")
+        with self._unfrozen():
+            self.latency = latency
+            self.calls = Counter()
+            self.last_text = {}
+            self.call_durations = []
+            self.webhook = None
+            self.inline_answers = []
+
+    async def get_me(self, *args, **kwargs):
+        # Вызывается при Application.initialize(): возвращаем пользователя-бота без обращения к API
+        with self._unfrozen():
+            self._bot_user = User(id=123456, first_name="Benchmark", is_bot=True, username="benchmark_bot")
+        return self._bot_user
+
+    async def set_webhook(self, url, *args, **kwargs):
+        # Параметры последней установки webhook (адрес, secret_token, max_connections...)
+        with self._unfrozen():
+            self.webhook = dict(kwargs, url=url)
+        self.calls["set_webhook"] += 1
+        return True
+
+    async def delete_webhook(self, *args, **kwargs):
+        with self._unfrozen():
+            self.webhook = None
+        self.calls["delete_webhook"] += 1
+        return True
+
+    async def _record(self, method, chat_id=None, text=None):
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls[method] += 1
+        if text is not None:
+            self.last_text[chat_id] = text
+        self.call_durations.append(time.perf_counter() - started)
+        return True
+
+    async def answer_callback_query(self, callback_query_id, text=None, *args, **kwargs):
+        return await self._record("answer_callback_query")
+
+    async def answer_inline_query(self, inline_query_id, results, cache_time=None, is_personal=None, *args, **kwargs):
+        # Ответы на inline-запросы: (id запроса, результаты, cache_time, is_personal)
+        self.inline_answers.append((inline_query_id, list(results), cache_time, is_personal))
+        return await self._record("answer_inline_query")
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, *args, **kwargs):
+        return await self._record("edit_message_text", chat_id, text)
+
+    async def edit_message_reply_markup(self, chat_id=None, message_id=None, *args, **kwargs):
+        return await self._record("edit_message_reply_markup", chat_id)
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        return await self._record("send_message", chat_id, text)
+
+
+class FakeContext:
+    """
+    Минимальный контекст обработчика (bot и user_data)
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.user_data = {}
+        self.chat_data = {}
+
+
+def callback_update_data(data, user_id=100500, chat_id=None, message_text="📅 Календарь", buttons=None):
+    """
+    Возвращает словарь Update с callback-запросом (формат Telegram Bot API)
+    buttons - клавиатура сообщения, из которого пришел запрос: [[(текст, callback_data), ...], ...]
+    """
+    chat_id = chat_id if chat_id is not None else user_id
+    message = {
+        "message_id": 1,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private" if chat_id == user_id else "group"},
+        "text": message_text,
+    }
+    if buttons:
+        message["reply_markup"] = {
+            "inline_keyboard": [[{"text": text, "callback_data": callback} for text, callback in row] for row in buttons]
+        }
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Benchmark"},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": message,
+        },
+    }
+
+
+def make_callback_update(bot, data, user_id=100500, chat_id=None, message_text="📅 Календарь", buttons=None):
+    """
+    Создает Update с callback-запросом, привязанный к bot
+    """
+    return Update.de_json(callback_update_data(data, user_id, chat_id, message_text, buttons), bot)
+
+
+def make_inline_update(bot, query, user_id=100500):
+    """
+    Создает Update с inline-запросом (@бот query), привязанный к bot
+    """
+    data = {
+        "update_id": next(_update_ids),
+        "inline_query": {
+            "id": str(next(_update_ids)),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Benchmark"},
+            "query": query,
+            "offset": "",
+        },
+    }
+    return Update.de_json(data, bot)
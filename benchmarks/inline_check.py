@@ -0,0 +1,112 @@
+"""
+Проверка inline-режима (@бот завтра, @бот 15.03, @бот алгебра).
+
+Бот работает с заглушкой МЭШ с задержкой (как в load_test.py); в кэше - расписание
+прошлой недели (по нему строится прогноз). Сценарий:
+1. "завтра" без кэша - сразу прогноз с коротким cache_time, расписание загружается в фоне;
+   --users одновременных одинаковых запросов запускают одну загрузку;
+2. после загрузки - расписание из кэша с долгим cache_time, без новых запросов к МЭШ;
+3. дата ("15.03") и поиск предмета ("алгебра") - уроки из кэша и прогноза.
+
+Выводится время подготовки ответа. Проверяется, что ответ не ждет МЭШ (быстрее
+INLINE_BUDGET), а фоновые загрузки не повторяются. Код возврата 1, если проверка не пройдена.
+
+Запуск:
+    python benchmarks/inline_check.py [--scrape-latency S] [--users N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from check_harness import run_bot_check  # noqa: E402
+from fake_telegram import FakeBot, FakeContext, make_inline_update  # noqa: E402
+from load_test import StubScraper, percentile, school_days  # noqa: E402
+from portal_stub import load_days  # noqa: E402
+
+
+async def run(bot, args, check):
+    scraper = StubScraper(load_days(), args.scrape_latency)
+
+    async def get_scheduler(account=None):
+        return scraper
+    bot.get_scheduler = get_scheduler
+
+    fake_bot = FakeBot()
+    context = FakeContext(fake_bot)
+
+    async def ask(text, user_id=900100):
+        fake_bot.inline_answers.clear()
+        started = time.perf_counter()
+        await bot.inline_query(make_inline_update(fake_bot, text, user_id), context)
+        _, results, cache_time, is_personal = fake_bot.inline_answers[-1]
+        return time.perf_counter() - started, results, cache_time
+
+    # Разбор текста запроса
+    today = date(2025, 3, 12)  # среда
+    check(bot.parse_inline_date("завтра", today) == date(2025, 3, 13)
+          and bot.parse_inline_date("пятница", today) == date(2025, 3, 14)
+          and bot.parse_inline_date("пн", today) == date(2025, 3, 17)
+          and bot.parse_inline_date("15.03", today) == date(2025, 3, 15)
+          and bot.parse_inline_date("15.03.24", today) == date(2024, 3, 15)
+          and bot.parse_inline_date("алгебра", today) is None,
+          "даты в тексте запроса разобраны (завтра, пятница, пн, 15.03, 15.03.24)")
+
+    # Прошлая неделя в кэше - прогноз на любой учебный день
+    await asyncio.gather(*(bot.get_schedule(date_str) for date_str in school_days(5, datetime.now() - timedelta(days=7))))
+    tomorrow = date.today() + timedelta(days=1)
+    while tomorrow.weekday() >= 5:
+        tomorrow += timedelta(days=1)
+    query = "завтра" if tomorrow == date.today() + timedelta(days=1) else tomorrow.strftime("%d.%m")
+    calls = scraper.calls
+
+    # 1. Без кэша: одновременные запросы получают прогноз
+    answers = await asyncio.gather(*(ask(query, 900100 + user) for user in range(args.users)))
+    times = [elapsed for elapsed, _, _ in answers]
+    _, results, cache_time = answers[0]
+    print(f"Запрос к МЭШ {args.scrape_latency:g} с, {args.users} одновременных запросов \"{query}\": "
+          f"ответ p50 {percentile(times, 0.5) * 1000:.1f} мс, максимум {max(times) * 1000:.1f} мс\n")
+    check(max(times) < min(bot.INLINE_BUDGET, args.scrape_latency), "ответ не ждет МЭШ")
+    check(results and "Прогноз" in results[0].input_message_content.message_text, "без кэша ответ - прогноз с пометкой")
+    check(cache_time == bot.INLINE_MISS_CACHE_TIME, f"ответ с прогнозом кэшируется ненадолго ({cache_time} с)")
+    check(len(bot.prefetch_tasks) == 1, "одна фоновая загрузка на все одинаковые запросы")
+
+    # 2. После фоновой загрузки - расписание из кэша
+    await asyncio.gather(*bot.prefetch_tasks.values())
+    check(scraper.calls == calls + 1, f"расписание загружено один раз ({scraper.calls - calls})")
+    calls = scraper.calls
+    elapsed, results, cache_time = await ask(query)
+    check("Расписание на" in results[0].input_message_content.message_text, "после загрузки ответ из кэша")
+    check(cache_time == bot.INLINE_CACHE_TIME, f"ответ из кэша кэшируется надолго ({cache_time} с)")
+    check(scraper.calls == calls and not bot.prefetch_tasks, "повторный запрос не обращается к МЭШ")
+
+    # 3. Поиск предмета
+    elapsed, results, cache_time = await ask("алгебра")
+    titles = [result.title for result in results]
+    print(f"\n  \"алгебра\": {len(results)} уроков за {elapsed * 1000:.1f} мс")
+    for title in titles[:3]:
+        print(f"    {title}")
+    print()
+    check(results and all("Алгебра" in title for title in titles), "найдены уроки алгебры")
+    check(any(title.startswith("🔮") for title in titles), "уроки по прогнозу помечены")
+    check(len(bot.prefetch_tasks) <= bot.INLINE_PREFETCH_DAYS,
+          f"фоновых загрузок не больше {bot.INLINE_PREFETCH_DAYS} ({len(bot.prefetch_tasks)})")
+    await asyncio.gather(*bot.prefetch_tasks.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка inline-режима")
+    parser.add_argument("--scrape-latency", type=float, default=1.0, help="задержка запроса к МЭШ, с")
+    parser.add_argument("--users", type=int, default=50, help="одновременных inline-запросов")
+    args = parser.parse_args()
+    run_bot_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Нагрузочный тест бота: виртуальные пользователи нажимают кнопки календаря и ДЗ.
+
+Обновления (Update с CallbackQuery) подаются в очередь настоящего Application
+с обработчиками mosh_telegram_bot. Telegram API заменен поддельным Bot с задержкой
+(fake_telegram.py), получение расписания - заглушкой с задержкой, которая отдает
+записанные учебные дни (data/portal_days.json) по дням недели.
+
+Каждый пользователь работает по замкнутому циклу: нажатие -> ожидание ответа ->
+пауза (экспоненциальная, в среднем --think с). Смесь нажатий: выбор даты, список ДЗ,
+карточка ДЗ, отметка ДЗ, обновление, листание календаря. В середине каждой ступени
+всем тестовым группам одновременно рассылается расписание на завтра (как при
+совпадающем времени рассылки).
+
+Число пользователей растет ступенями (--levels). Для каждой ступени выводятся
+пропускная способность, задержки (p50/p95/p99, от постановки в очередь до завершения
+обработки), ошибки, задержка цикла событий (loop_monitor.py) и длительность рассылки.
+С --block-threshold в лог выводятся стеки кода, блокирующего цикл событий дольше порога. Предел - первая
+ступень, на которой p95 превышает --slo, есть ошибки или таймауты, либо пропускная
+способность ниже 80% от предлагаемой пользователями нагрузки.
+
+Все файлы бота создаются во временном каталоге.
+
+Запуск:
+    python benchmarks/load_test.py [--levels 10,50,100] [--duration S] [--think S]
+                                   [--scrape-latency S] [--telegram-latency S] [--groups N]
+                                   [--concurrent-updates N] [--slo S] [--block-threshold S]
+                                   [--cold] [--keep-going]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+
+from fake_telegram import FakeBot, callback_update_data  # noqa: E402
+from lesson_model import lessons_from_dicts  # noqa: E402
+from loop_monitor import LoopMonitor  # noqa: E402
+from portal_stub import load_days  # noqa: E402
+from schedule_diff import lesson_keys, lesson_token  # noqa: E402
+
+# Смесь нажатий: (вид, вес)
+ACTION_MIX = (
+    ("date", 40),
+    ("homework", 20),
+    ("hw_subject", 10),
+    ("hw_toggle", 15),
+    ("refresh", 10),
+    ("calendar", 5),
+)
+
+# Первый идентификатор виртуальных пользователей и тестовых групп
+FIRST_USER_ID = 500000
+FIRST_GROUP_ID = -100500000
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+def school_days(count, start=None):
+    """
+    Возвращает count ближайших будних дней (DD-MM-YYYY), начиная с start
+    """
+    day = start or datetime.now()
+    result = []
+    while len(result) < count:
+        if day.weekday() < 5:
+            result.append(day.strftime("%d-%m-%Y"))
+        day += timedelta(days=1)
+    return result
+
+
+class StubScraper:
+    """
+    Заглушка MosregSchedule: после задержки возвращает записанный учебный день
+    с тем же днем недели (так расписание есть на любую будущую дату)
+    """
+
+    def __init__(self, days, latency):
+        self.latency = latency
+        self.calls = 0
+        self.by_weekday = {}
+        for date_str, lessons in days.items():
+            weekday = datetime.strptime(date_str, "%d-%m-%Y").weekday()
+            self.by_weekday[weekday] = [dict(lesson, homework=lesson.get("homework") or "Не указано")
+                                        for lesson in lessons]
+
+    def get_schedule(self, date):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        weekday = datetime.strptime(date, "%d-%m-%Y").weekday()
+        return [dict(lesson) for lesson in self.by_weekday.get(weekday, [])]
+
+    def lesson_token(self, date, index):
+        """
+        Код урока index на дату для callback_data кнопок ДЗ (как на кнопках бота)
+        """
+        weekday = datetime.strptime(date, "%d-%m-%Y").weekday()
+        keys = lesson_keys(lessons_from_dicts(self.by_weekday.get(weekday, [])))
+        return lesson_token(keys[index % len(keys)]) if keys else "0"
+
+    def close(self):
+        pass
+
+
+class LoadTest:
+    def __init__(self, bot, application, fake_bot, scraper, args):
+        self.bot = bot
+        self.application = application
+        self.fake_bot = fake_bot
+        self.scraper = scraper
+        self.args = args
+        self.dates = school_days(10)
+        self.pending = {}
+        self.errors = 0
+        self.max_queue = 0
+        self.lag_monitor = LoopMonitor(interval=0.05, block_threshold=args.block_threshold)
+
+        # Завершение обработки отмечается обработчиком в отдельной группе:
+        # он срабатывает после обработчиков бота, в том числе после ошибки
+        application.add_handler(TypeHandler(Update, self._on_processed), group=1)
+        application.add_error_handler(self._on_error)
+
+    async def _on_processed(self, update, context):
+        future = self.pending.pop(update.update_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def _on_error(self, update, context):
+        self.errors += 1
+
+    def _next_action(self, rng, state):
+        kind = rng.choices([name for name, _ in ACTION_MIX], [weight for _, weight in ACTION_MIX])[0]
+        # Пользователь чаще возвращается к той же дате, чем выбирает новую
+        if kind == "date" or state.get("date") is None:
+            state["date"] = rng.choice(self.dates)
+            kind = "date"
+        date_str = state["date"]
+        buttons = None
+        if kind == "date":
+            data = f"date_{date_str}"
+        elif kind == "homework":
+            data = f"homework_{date_str}"
+        elif kind == "hw_subject":
+            data = f"hw_subject_{date_str}_{self.scraper.lesson_token(date_str, rng.randrange(4))}"
+        elif kind == "hw_toggle":
+            data = f"hw_toggle_{date_str}_{self.scraper.lesson_token(date_str, rng.randrange(4))}_{rng.randrange(2)}"
+        elif kind == "refresh":
+            data = f"refresh_{date_str}"
+            buttons = [[("🔄 Обновить", data)], [("📚 Домашние задания", f"homework_{date_str}")]]
+        else:
+            day = datetime.strptime(date_str, "%d-%m-%Y")
+            data = f"calendar_{day.year}_{day.month}"
+        return kind, data, buttons
+
+    async def _virtual_user(self, user_id, stop_at, result):
+        rng = random.Random(user_id)
+        state = {}
+        # Пользователи начинают не одновременно
+        await asyncio.sleep(min(rng.uniform(0, self.args.think), self.args.duration))
+        loop = asyncio.get_running_loop()
+        while time.perf_counter() < stop_at:
+            kind, data, buttons = self._next_action(rng, state)
+            update = Update.de_json(callback_update_data(data, user_id=user_id, buttons=buttons), self.fake_bot)
+            future = loop.create_future()
+            self.pending[update.update_id] = future
+            started = time.perf_counter()
+            await self.application.update_queue.put(update)
+            self.max_queue = max(self.max_queue, self.application.update_queue.qsize())
+            try:
+                finished = await asyncio.wait_for(future, self.args.timeout)
+                result["latencies"].append(finished - started)
+                result["actions"][kind] += 1
+            except asyncio.TimeoutError:
+                self.pending.pop(update.update_id, None)
+                result["timeouts"] += 1
+            think = rng.expovariate(1 / self.args.think) if self.args.think else 0
+            await asyncio.sleep(max(0.0, min(think, stop_at - time.perf_counter())))
+
+    async def _broadcast(self, groups):
+        """
+        Рассылка расписания на завтра во все группы одновременно (как check_group_schedules)
+        """
+        now = datetime.now()
+        today = now.strftime("%d.%m.%Y")
+        tomorrow = school_days(1, now + timedelta(days=1))[0]
+        tomorrow_readable = datetime.strptime(tomorrow, "%d-%m-%Y").strftime("%d.%m.%Y")
+        for chat_id in groups:
+            self.bot.group_subscriptions[str(chat_id)] = {"time": now.strftime("%H:%M")}
+        started = time.perf_counter()
+        await asyncio.gather(*(self.bot.send_schedule_to_group(self.fake_bot, chat_id, tomorrow, tomorrow_readable, today)
+                               for chat_id in groups))
+        return time.perf_counter() - started
+
+    async def run_level(self, users):
+        result = {"latencies": [], "timeouts": 0, "actions": Counter()}
+        errors_before = self.errors
+        scrapes_before = self.scraper.calls
+        telegram_before = sum(self.fake_bot.calls.values())
+        self.lag_monitor.reset()
+        self.max_queue = 0
+
+        started = time.perf_counter()
+        stop_at = started + self.args.duration
+        user_ids = range(FIRST_USER_ID, FIRST_USER_ID + users)
+        tasks = [asyncio.create_task(self._virtual_user(user_id, stop_at, result)) for user_id in user_ids]
+
+        broadcast_duration = None
+        if self.args.groups:
+            await asyncio.sleep(self.args.duration / 2)
+            groups = range(FIRST_GROUP_ID, FIRST_GROUP_ID - self.args.groups, -1)
+            broadcast_duration = await self._broadcast(groups)
+
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        latencies = result["latencies"]
+        # Без очереди каждый пользователь нажимает кнопку раз в (пауза + время ответа без ожидания)
+        offered = users / (self.args.think + self.args.telegram_latency * 2) if self.args.think else 0.0
+        return {
+            "users": users,
+            "completed": len(latencies),
+            "throughput": len(latencies) / elapsed,
+            "offered": offered,
+            "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies, default=0.0),
+            "errors": self.errors - errors_before,
+            "timeouts": result["timeouts"],
+            "lag_p99": percentile(self.lag_monitor.samples, 0.99),
+            "lag_max": self.lag_monitor.max_lag,
+            "blocks": self.lag_monitor.blocks,
+            "max_queue": self.max_queue,
+            "scrapes": self.scraper.calls - scrapes_before,
+            "telegram_calls": sum(self.fake_bot.calls.values()) - telegram_before,
+            "broadcast": broadcast_duration,
+            "actions": result["actions"],
+        }
+
+    def breaking_reason(self, level):
+        if level["p95"] > self.args.slo:
+            return f"p95 {level['p95']:.2f} с > {self.args.slo:.2f} с"
+        if level["errors"] or level["timeouts"]:
+            return f"ошибок {level['errors']}, таймаутов {level['timeouts']}"
+        if level["offered"] and level["throughput"] < 0.8 * level["offered"]:
+            return f"пропускная способность {level['throughput']:.1f}/с ниже 80% от предлагаемой"
+        return None
+
+    async def drain(self):
+        """
+        Дожидается обработки обновлений, оставшихся в очереди после ступени
+        """
+        started = time.perf_counter()
+        while self.pending or self.application.update_queue.qsize():
+            await asyncio.sleep(0.1)
+            if time.perf_counter() - started > self.args.timeout:
+                self.pending.clear()
+                break
+        return time.perf_counter() - started
+
+
+def print_level(level):
+    broadcast = f"{level['broadcast']:.2f}" if level["broadcast"] is not None else "-"
+    print(f"  {level['users']:>6} {level['completed']:>7} {level['throughput']:>8.1f} {level['offered']:>8.1f} "
+          f"{level['p50'] * 1000:>8.0f} {level['p95'] * 1000:>8.0f} {level['p99'] * 1000:>8.0f} "
+          f"{level['errors'] + level['timeouts']:>6} {level['lag_p99'] * 1000:>8.1f} {level['lag_max'] * 1000:>8.1f} "
+          f"{level['blocks']:>5} {level['max_queue']:>6} {level['scrapes']:>6} {broadcast:>9}")
+
+
+async def run(bot, args):
+    import tracing
+
+    tracing.tracer.configure()
+    fake_bot = FakeBot(latency=args.telegram_latency)
+    scraper = StubScraper(load_days(), args.scrape_latency)
+
+    async def get_scheduler(account=None):
+        return scraper
+    bot.get_scheduler = get_scheduler
+
+    concurrent_updates = args.concurrent_updates if args.concurrent_updates else None
+    application = bot.build_application(bot=fake_bot, concurrent_updates=concurrent_updates)
+    load_test = LoadTest(bot, application, fake_bot, scraper, args)
+
+    await application.initialize()
+    await application.start()
+    if not args.cold:
+        # Прогрев: расписание на все даты теста уже в кэше, как у работающего бота
+        await asyncio.gather(*(bot.get_schedule(date_str) for date_str in load_test.dates + school_days(1, datetime.now() + timedelta(days=1))))
+    load_test.lag_monitor.start()
+
+    print(f"Обработка обновлений: {'по одному' if not concurrent_updates else f'до {concurrent_updates} одновременно'}, "
+          f"Telegram {args.telegram_latency * 1000:.0f} мс, получение расписания {args.scrape_latency:.1f} с, "
+          f"пауза пользователя {args.think:.1f} с, ступень {args.duration:.0f} с, групп в рассылке {args.groups}, "
+          f"кэш {'пустой' if args.cold else 'прогрет'}")
+    print(f"\n  {'польз.':>6} {'ответов':>7} {'в сек':>8} {'предл.':>8} {'p50, мс':>8} {'p95, мс':>8} "
+          f"{'p99, мс':>8} {'ошиб.':>6} {'лаг p99':>8} {'лаг max':>8} {'блок.':>5} {'очер.':>6} {'скрейп':>6} {'рассылка':>9}")
+
+    breaking = None
+    actions = Counter()
+    try:
+        for users in args.levels:
+            level = await load_test.run_level(users)
+            actions.update(level["actions"])
+            print_level(level)
+            await load_test.drain()
+            reason = load_test.breaking_reason(level)
+            if reason and breaking is None:
+                breaking = (users, reason)
+                if not args.keep_going:
+                    break
+    finally:
+        await load_test.lag_monitor.stop()
+        await application.stop()
+        await application.shutdown()
+
+    print(f"\nНажатия: {', '.join(f'{name} {count}' for name, count in actions.most_common())}")
+    print(f"Вызовов Telegram API: {dict(fake_bot.calls)}")
+    rss = bot.get_rss_bytes()
+    if rss is not None:
+        print(f"RSS процесса: {rss / 1024 / 1024:.1f} МБ")
+    if breaking:
+        print(f"\nПредел: {breaking[0]} пользователей ({breaking[1]})")
+    else:
+        print("\nПредел не достигнут на заданных ступенях")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота")
+    parser.add_argument("--levels", default="10,25,50,100,250,500,1000,2000",
+                        help="число пользователей на ступенях через запятую")
+    parser.add_argument("--duration", type=float, default=20.0, help="длительность ступени, с")
+    parser.add_argument("--think", type=float, default=5.0, help="средняя пауза пользователя между нажатиями, с")
+    parser.add_argument("--scrape-latency", type=float, default=3.0, help="время получения расписания с портала, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="задержка вызовов Telegram API, с")
+    parser.add_argument("--groups", type=int, default=100, help="групп в рассылке в середине ступени (0 - без рассылки)")
+    parser.add_argument("--concurrent-updates", type=int, default=0,
+                        help="обрабатывать до N обновлений одновременно (0 - по одному, как в боте)")
+    parser.add_argument("--slo", type=float, default=2.0, help="допустимая p95 задержка ответа, с")
+    parser.add_argument("--timeout", type=float, default=60.0, help="таймаут ожидания ответа, с")
+    parser.add_argument("--block-threshold", type=float, default=None,
+                        help="записывать в лог стек при блокировке цикла событий дольше S секунд")
+    parser.add_argument("--cold", action="store_true", help="не прогревать кэш расписания перед тестом")
+    parser.add_argument("--keep-going", action="store_true", help="продолжать после достижения предела")
+    args = parser.parse_args()
+    args.levels = [int(value) for value in args.levels.split(",") if value.strip()]
+
+    # Сообщения бота не нужны в отчете
+    logging.basicConfig(level=logging.CRITICAL)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    if args.block_threshold:
+        # Блокировки цикла событий выводятся со стеком
+        logging.getLogger("loop_monitor").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        import mosh_telegram_bot as bot
+        asyncio.run(run(bot, args))
+        bot.thread_pool.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
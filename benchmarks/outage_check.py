@@ -0,0 +1,148 @@
+"""
+Проверка предохранителя запросов к МЭШ (circuit_breaker.py) при недоступном портале.
+
+Бот работает с заглушкой получения расписания (как в load_test.py), которую можно
+"уронить": в режиме сбоя каждый запрос зависает дольше таймаута. Сценарий:
+1. портал работает - расписание на несколько дней попадает в кэш;
+2. портал зависает - пользователи нажимают "Обновить" на разных датах. Первые нажатия
+   ждут таймаута, после срабатывания предохранителя ответ приходит сразу из сохраненного
+   расписания с пометкой о недоступности МЭШ, а к порталу запросы не отправляются;
+3. портал восстанавливается - после паузы пробный запрос закрывает предохранитель;
+   пробный запрос, отклоненный переполненной очередью процессов, не задерживает следующий.
+
+Выводится время ответа на нажатие до и после срабатывания. Код возврата 1, если проверка не пройдена.
+
+Запуск:
+    python benchmarks/outage_check.py [--timeout S] [--backoff S] [--clicks N]
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from check_harness import run_bot_check  # noqa: E402
+from fake_telegram import FakeBot, FakeContext, make_callback_update  # noqa: E402
+from load_test import StubScraper, percentile, school_days  # noqa: E402
+from portal_stub import load_days  # noqa: E402
+from scrape_workers import ScrapeQueueFull  # noqa: E402
+
+
+class FullQueuePool:
+    """
+    Пул процессов (scrape_workers.py), очередь которого заполнена
+    """
+
+    async def run(self, account, method, *args):
+        raise ScrapeQueueFull("очередь заданий переполнена")
+
+
+class OutageScraper(StubScraper):
+    """
+    Заглушка МЭШ, которая в режиме сбоя зависает на hang секунд
+    """
+
+    def __init__(self, days, hang):
+        super().__init__(days, 0.0)
+        self.hang = hang
+        self.down = False
+
+    def get_schedule(self, date):
+        if self.down:
+            self.calls += 1
+            time.sleep(self.hang)
+            raise TimeoutError("портал не ответил")
+        return super().get_schedule(date)
+
+
+async def run(bot, args, check):
+    from circuit_breaker import STATE_CLOSED, STATE_OPEN
+
+    bot.SCRAPE_TIMEOUT = args.timeout
+    # Каждое нажатие "Обновить" идет к порталу (без общих недавних обновлений)
+    bot.refresh_governor.share_window = 0
+    breaker = bot.portal_breaker
+    breaker.backoff = args.backoff
+    breaker.max_backoff = args.backoff * 4
+    scraper = OutageScraper(load_days(), args.timeout * 2)
+
+    async def get_scheduler(account=None):
+        return scraper
+    bot.get_scheduler = get_scheduler
+
+    fake_bot = FakeBot()
+    context = FakeContext(fake_bot)
+    user_id = 700001
+    dates = school_days(args.clicks)
+
+    async def refresh(date_str):
+        data = f"refresh_{date_str}"
+        update = make_callback_update(fake_bot, data, user_id=user_id, message_text="Получаю расписание",
+                                      buttons=[[("🔄 Обновить", data)]])
+        started = time.perf_counter()
+        await bot.show_schedule_for_date(update, context, date_str, force_refresh=True)
+        return time.perf_counter() - started, fake_bot.last_text.get(user_id, "")
+
+    # 1. Портал работает
+    await asyncio.gather(*(bot.get_schedule(date_str) for date_str in dates))
+    cached = {date_str: bot.schedule_cache[date_str].lessons for date_str in dates}
+    check(all(cached.values()), f"расписание на {len(dates)} дней в кэше")
+
+    # 2. Портал зависает
+    scraper.down = True
+    calls_when_tripped = None
+    slow, fast, texts = [], [], []
+    for date_str in dates:
+        tripped = breaker.state == STATE_OPEN
+        if tripped and calls_when_tripped is None:
+            calls_when_tripped = scraper.calls
+        elapsed, text = await refresh(date_str)
+        (fast if tripped else slow).append(elapsed)
+        if tripped:
+            texts.append(text)
+    # Окно запросов заполнено успешными - для срабатывания нужна доля ошибок от всего окна
+    expected_slow = max(bot.BREAKER_MIN_CALLS, math.ceil(bot.BREAKER_FAILURE_RATE * breaker.window))
+    print(f"\nПортал недоступен (таймаут {args.timeout:g} с): "
+          f"до срабатывания {len(slow)} нажатий, p50 {percentile(slow, 0.5):.2f} с; "
+          f"после - {len(fast)} нажатий, p50 {percentile(fast, 0.5) * 1000:.1f} мс, "
+          f"максимум {max(fast, default=0) * 1000:.1f} мс\n")
+    check(breaker.state == STATE_OPEN, "предохранитель сработал")
+    check(len(slow) == expected_slow, f"таймаута ждали только первые {expected_slow} нажатий")
+    check(scraper.calls == calls_when_tripped, "после срабатывания запросов к порталу нет")
+    check(fast and max(fast) < 0.1, "ответ при открытом предохранителе мгновенный (< 100 мс)")
+    check(all("не отвечает" in text for text in texts), "в ответе есть пометка о недоступности МЭШ")
+    check(all(bot.schedule_cache[date_str].lessons == cached[date_str] for date_str in dates),
+          "сохраненное расписание не заменено пустым")
+
+    # 3. Портал восстановился: ждем конца паузы, пробный запрос закрывает предохранитель
+    scraper.down = False
+    await asyncio.sleep(breaker.retry_after() + 0.1)
+    # Пробный запрос не попал в очередь процессов - следующий запрос снова пробный
+    bot.scrape_pool = FullQueuePool()
+    await refresh(dates[0])
+    bot.scrape_pool = None
+    check(breaker.state != STATE_OPEN and breaker.allow(),
+          "пробный запрос, отклоненный очередью, не задерживает следующий")
+    breaker.release_probe()
+    elapsed, text = await refresh(dates[0])
+    check(breaker.state == STATE_CLOSED, f"после паузы пробный запрос закрыл предохранитель ({elapsed:.2f} с)")
+    check("не отвечает" not in text, "пометка о недоступности исчезла")
+    print("\n" + bot.format_stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка предохранителя запросов к МЭШ")
+    parser.add_argument("--timeout", type=float, default=1.0, help="таймаут запроса к МЭШ, с")
+    parser.add_argument("--backoff", type=float, default=2.0, help="начальная пауза предохранителя, с")
+    parser.add_argument("--clicks", type=int, default=10, help="число нажатий при недоступном портале")
+    args = parser.parse_args()
+    run_bot_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
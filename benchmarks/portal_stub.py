@@ -0,0 +1,191 @@
+"""
+Тестовый сервер МЭШ для бенчмарков.
+
+Отдает записанные учебные дни (benchmarks/data/portal_days.json) в виде
+HTML-страниц расписания (как их видит MosregSchedule через Selenium)
+и в виде JSON (как их запрашивает MosregAPI).
+
+Запуск отдельно:
+    python benchmarks/portal_stub.py [--port 8000] [--latency 0.05]
+"""
+import argparse
+import html
+import json
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DAYS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "portal_days.json")
+
+NO_LESSONS_TEXT = "Уроков и мероприятий нет"
+
+# Школа и класс ученика на странице дневника (по ним бот определяет класс учетной записи)
+STUDENT_SCHOOL = "МБОУ «Средняя общеобразовательная школа № 1»"
+STUDENT_CLASS = "9 «А» класс"
+
+
+def load_days(path=DAYS_FILE):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["days"]
+
+
+def _room_text(room):
+    return room if not room.isdigit() else f"Кабинет {room}"
+
+
+def render_schedule_page(lessons):
+    """
+    Формирует HTML-страницу расписания на день.
+    Разметка карточки повторяет пути, по которым MosregSchedule ищет урок и ДЗ
+    (a > div[1] > h6 и a > div[1] > div[2] > div > div[2] > p)
+    """
+    if not lessons:
+        return f"<html><head><title>Расписание</title></head><body><main><p>{NO_LESSONS_TEXT}</p></main></body></html>"
+
+    cards = []
+    for lesson in lessons:
+        homework = lesson.get("homework")
+        homework_block = ""
+        if homework:
+            homework_block = (
+                "<div class=\"lesson-homework\"><div><div>ДЗ</div>"
+                f"<div><p>{html.escape(homework)}</p></div></div></div>"
+            )
+        cards.append(
+            f"<a class=\"lesson-card\" href=\"/diary/lessons/{lesson['lesson_id']}\"><div>"
+            f"<h6>{html.escape(lesson['subject'])}</h6>"
+            "<div class=\"lesson-meta\">"
+            f"<div>{lesson['start_time']} - {lesson['end_time']}</div>"
+            f"<div>{html.escape(_room_text(lesson['room']))}</div>"
+            f"<div>{html.escape(lesson['teacher'])}</div>"
+            "</div>"
+            f"{homework_block}"
+            "</div></a>"
+        )
+    return (
+        "<html><head><title>Расписание</title></head><body><main>"
+        "<div class=\"lessons-list\"><div><div>" + "".join(cards) + "</div></div></div>"
+        "</main></body></html>"
+    )
+
+
+def render_schedule_json(lessons):
+    """
+    Формирует ответ API расписания на день
+    """
+    return {
+        "lessons": [
+            {
+                "id": int(lesson["lesson_id"]),
+                "subject": {"name": lesson["subject"]},
+                "startTime": lesson["start_time"],
+                "endTime": lesson["end_time"],
+                "room": lesson["room"],
+                "teacher": {"name": lesson["teacher"]},
+                "homework": lesson.get("homework"),
+            }
+            for lesson in lessons
+        ]
+    }
+
+
+class PortalStub:
+    """
+    Тестовый сервер МЭШ в фоновом потоке.
+    latency - искусственная задержка ответа в секундах (имитация сети и сервера)
+    """
+
+    def __init__(self, days=None, latency=0.0, host="127.0.0.1", port=0):
+        self.days = days if days is not None else load_days()
+        self.latency = latency
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="portal-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def _handle(self, request):
+        parsed = urlparse(request.path)
+        path = parsed.path.rstrip("/") or "/"
+        wants_json = "Authorization" in request.headers
+
+        with self._lock:
+            self.requests[("json " if wants_json else "html ") + path] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if path == "/diary/schedules/schedule":
+            date = parse_qs(parsed.query).get("date", [""])[0]
+            lessons = self.days.get(date, [])
+            if wants_json:
+                self._send(request, json.dumps(render_schedule_json(lessons), ensure_ascii=False), "application/json")
+            else:
+                self._send(request, render_schedule_page(lessons), "text/html")
+        elif path in ("/", "/diary/schedules"):
+            self._send(request, "<html><head><title>Школьный портал</title></head><body><main>"
+                                f"<div class=\"student-info\"><p>{html.escape(STUDENT_SCHOOL)}</p><p>{html.escape(STUDENT_CLASS)}</p></div>"
+                                "Дневник</main></body></html>", "text/html")
+        else:
+            request.send_error(404)
+
+    @staticmethod
+    def _send(request, body, content_type):
+        data = body.encode("utf-8")
+        request.send_response(200)
+        request.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Тестовый сервер МЭШ с записанными учебными днями")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа в секундах")
+    args = parser.parse_args()
+
+    stub = PortalStub(latency=args.latency, port=args.port).start()
+    print(f"Тестовый сервер МЭШ: {stub.base_url} (дни: {', '.join(stub.days)})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Проверка очереди запросов к МЭШ с приоритетами (fetch_scheduler.py).
+
+Бот работает с заглушкой получения расписания с задержкой (как в load_test.py).
+Запускается массовая фоновая загрузка (--background дат, класс background) и рассылка
+(--broadcast дат, класс broadcast), а через мгновение пользователи нажимают даты
+(--taps запросов). Сценарий выполняется дважды: с приоритетами и с одним классом
+для всех запросов (очередь по порядку, как в пуле потоков). Выводится время ответа
+на нажатие и число отмененных фоновых запросов.
+
+Проверяется, что нажатия не ждут фоновой загрузки, фоновая работа не занимает больше
+своего лимита мест, а фоновые запросы, не дождавшиеся места, отменяются. Код возврата 1,
+если проверка не пройдена.
+
+Запуск:
+    python benchmarks/priority_check.py [--scrape-latency S] [--background N] [--broadcast N] [--taps N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from check_harness import run_bot_check  # noqa: E402
+from load_test import StubScraper, percentile, school_days  # noqa: E402
+from portal_stub import load_days  # noqa: E402
+
+
+async def scenario(bot, args, prioritized):
+    from fetch_scheduler import (FetchScheduler, fetch_priority, PRIORITY_INTERACTIVE, PRIORITY_BROADCAST,
+                                 PRIORITY_BACKGROUND)
+
+    bot.schedule_cache.clear()
+    bot.refresh_governor = bot.RefreshGovernor()
+    if prioritized:
+        bot.fetch_scheduler = FetchScheduler(
+            bot.FETCH_CONCURRENCY,
+            limits={PRIORITY_BROADCAST: bot.FETCH_BROADCAST_LIMIT, PRIORITY_BACKGROUND: bot.FETCH_BACKGROUND_LIMIT},
+            deadlines={PRIORITY_BACKGROUND: args.background_deadline},
+            jobs_counter=bot.FETCH_JOBS)
+        background_class, broadcast_class = PRIORITY_BACKGROUND, PRIORITY_BROADCAST
+    else:
+        bot.fetch_scheduler = FetchScheduler(bot.FETCH_CONCURRENCY)
+        background_class = broadcast_class = PRIORITY_INTERACTIVE
+    scheduler = bot.fetch_scheduler
+
+    # Разные даты для каждого вида запросов, чтобы они не объединялись
+    dates = school_days(args.background + args.broadcast + args.taps)
+    background_dates = dates[:args.background]
+    broadcast_dates = dates[args.background:args.background + args.broadcast]
+    tap_dates = dates[args.background + args.broadcast:]
+
+    max_background = 0
+
+    async def watch_running():
+        nonlocal max_background
+        while True:
+            max_background = max(max_background, scheduler.running["background"])
+            await asyncio.sleep(0.01)
+
+    async def timed(date_str):
+        started = time.perf_counter()
+        lessons, source = await bot.fetch_schedule(date_str)
+        return time.perf_counter() - started, source
+
+    watcher = asyncio.ensure_future(watch_running())
+    with fetch_priority(background_class):
+        background = [asyncio.ensure_future(timed(date_str)) for date_str in background_dates]
+    with fetch_priority(broadcast_class):
+        broadcast = [asyncio.ensure_future(timed(date_str)) for date_str in broadcast_dates]
+    await asyncio.sleep(0.05)
+    taps = await asyncio.gather(*(timed(date_str) for date_str in tap_dates))
+    background = await asyncio.gather(*background)
+    broadcast = await asyncio.gather(*broadcast)
+    watcher.cancel()
+
+    tap_times = [elapsed for elapsed, _ in taps]
+    return {
+        "taps_p50": percentile(tap_times, 0.5),
+        "taps_max": max(tap_times),
+        "broadcast_max": max(elapsed for elapsed, _ in broadcast),
+        "dropped": sum(1 for _, source in background if source == bot.SOURCE_DROPPED),
+        "max_background": max_background,
+    }
+
+
+async def run(bot, args, check):
+    scraper = StubScraper(load_days(), args.scrape_latency)
+
+    async def get_scheduler(account=None):
+        return scraper
+    bot.get_scheduler = get_scheduler
+
+    fifo = await scenario(bot, args, prioritized=False)
+    prioritized = await scenario(bot, args, prioritized=True)
+
+    print(f"Фоновых запросов {args.background}, рассылка {args.broadcast}, нажатий {args.taps}, "
+          f"запрос к МЭШ {args.scrape_latency:g} с, мест {bot.FETCH_CONCURRENCY}\n")
+    for title, result in (("по порядку", fifo), ("с приоритетами", prioritized)):
+        print(f"  {title:15} нажатие: p50 {result['taps_p50']:.2f} с, максимум {result['taps_max']:.2f} с; "
+              f"рассылка: максимум {result['broadcast_max']:.2f} с; фоновых отменено {result['dropped']}")
+    print()
+
+    # Один браузер учетной записи выполняет запросы по одному: нажатие ждет не больше
+    # уже начатых запросов и других нажатий
+    bound = (bot.FETCH_CONCURRENCY + args.taps) * args.scrape_latency + 0.3
+    check(prioritized["taps_max"] <= bound, f"нажатие ждет только начатых запросов и других нажатий (≤ {bound:.1f} с)")
+    check(prioritized["taps_max"] < fifo["taps_max"] / 2, "нажатие быстрее, чем в очереди по порядку")
+    check(prioritized["max_background"] <= bot.FETCH_BACKGROUND_LIMIT,
+          f"фоновая работа занимает не больше {bot.FETCH_BACKGROUND_LIMIT} мест ({prioritized['max_background']})")
+    check(prioritized["dropped"] > 0, "фоновые запросы, не дождавшиеся места, отменены")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка очереди запросов к МЭШ с приоритетами")
+    parser.add_argument("--scrape-latency", type=float, default=0.2, help="задержка запроса к МЭШ, с")
+    parser.add_argument("--background", type=int, default=40, help="фоновых запросов")
+    parser.add_argument("--broadcast", type=int, default=10, help="запросов рассылки")
+    parser.add_argument("--taps", type=int, default=5, help="нажатий пользователей")
+    parser.add_argument("--background-deadline", type=float, default=3.0, help="крайний срок фонового запроса, с")
+    args = parser.parse_args()
+    run_bot_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Проверка постепенного ответа на нажатие даты (progressive.py).
+
+Заглушка МЭШ (как в load_test.py) имитирует работу скрейпера: открытие страницы дня
+(--page-latency) и разбор карточек уроков по одной (--card-latency на карточку),
+сообщая об уже разобранных уроках. Поддельный Telegram записывает все изменения сообщения.
+Сценарии нажатия даты:
+1. в кэше ничего нет - сначала "Получаю расписание", затем уже разобранные уроки, затем итог;
+2. в кэше есть тот же день недели неделей раньше - сразу прогноз по недельному шаблону;
+3. в кэше есть устаревшее расписание этой даты - сразу оно с пометкой об обновлении.
+
+Выводится время до первого содержательного ответа и до итогового. Проверяется, что
+предварительный ответ приходит за время ответа Telegram, промежуточные изменения
+не чаще PROGRESSIVE_EDIT_INTERVAL, а итоговое сообщение совпадает с ответом без
+постепенного режима. Код возврата 1, если проверка не пройдена.
+
+Запуск:
+    python benchmarks/progressive_check.py [--page-latency S] [--card-latency S] [--interval S]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from check_harness import run_bot_check  # noqa: E402
+from fake_telegram import FakeBot, FakeContext, make_callback_update  # noqa: E402
+from load_test import StubScraper, school_days  # noqa: E402
+from portal_stub import load_days  # noqa: E402
+
+
+class TimelineBot(FakeBot):
+    """
+    Поддельный Telegram, записывающий время и текст каждого изменения сообщения
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        with self._unfrozen():
+            self.edits = []
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, *args, **kwargs):
+        result = await super().edit_message_text(text, chat_id, message_id, *args, **kwargs)
+        self.edits.append((time.perf_counter(), text))
+        return result
+
+
+class ParsingScraper(StubScraper):
+    """
+    Заглушка МЭШ, разбирающая карточки уроков по одной
+    """
+
+    def __init__(self, days, page_latency, card_latency):
+        super().__init__(days, 0.0)
+        self.page_latency = page_latency
+        self.card_latency = card_latency
+
+    def get_schedule(self, date):
+        from progressive import report_partial
+
+        cards = super().get_schedule(date)
+        time.sleep(self.page_latency)
+        lessons = []
+        for card in cards:
+            time.sleep(self.card_latency)
+            lessons.append(card)
+            report_partial(lessons)
+        return lessons
+
+
+async def run(bot, args, check):
+    bot.PROGRESSIVE_EDIT_INTERVAL = args.interval
+    scraper = ParsingScraper(load_days(), args.page_latency, args.card_latency)
+
+    async def get_scheduler(account=None):
+        return scraper
+    bot.get_scheduler = get_scheduler
+
+    fake_bot = TimelineBot(args.telegram_latency)
+    context = FakeContext(fake_bot)
+    user_id = 800001
+
+    async def tap(date_str):
+        fake_bot.edits.clear()
+        update = make_callback_update(fake_bot, f"date_{date_str}", user_id=user_id)
+        started = time.perf_counter()
+        await bot.show_schedule_for_date(update, context, date_str)
+        return started, [(at - started, text) for at, text in fake_bot.edits]
+
+    def first_content(edits):
+        return next((elapsed for elapsed, text in edits if not text.startswith("Получаю расписание")), None)
+
+    def report(title, edits):
+        total = edits[-1][0] if edits else 0
+        first = first_content(edits)
+        print(f"  {title:28} изменений {len(edits)}, первый ответ {first:.2f} с, итог {total:.2f} с")
+
+    # Эталон: итоговые сообщения без постепенного режима
+    dates = school_days(3, datetime.now() + timedelta(days=14))
+    expected = {}
+    bot.PROGRESSIVE_EDIT_INTERVAL = 0
+    for date_str in dates:
+        _, edits = await tap(date_str)
+        expected[date_str] = edits[-1][1]
+    bot.schedule_cache.clear()
+    bot.timetable.load({})
+    bot.last_update_times.clear()
+    bot.render_cache.clear()
+    bot.PROGRESSIVE_EDIT_INTERVAL = args.interval
+    cards = len(scraper.get_schedule(dates[0]))
+    scrape_time = args.page_latency + cards * args.card_latency
+
+    print(f"Запрос к МЭШ: страница {args.page_latency:g} с + {cards} карточек по {args.card_latency:g} с, "
+          f"ответ Telegram {args.telegram_latency * 1000:.0f} мс, интервал изменений {args.interval:g} с\n")
+    results = []
+
+    # 1. Пустой кэш
+    _, cold = await tap(dates[0])
+    report("пустой кэш", cold)
+    partial = [text for _, text in cold if "Загружено уроков" in text]
+    results.append(("пустой кэш", cold, dates[0]))
+
+    # 2. Тот же день недели неделей раньше
+    week_before = (datetime.strptime(dates[1], "%d-%m-%Y") - timedelta(days=7)).strftime("%d-%m-%Y")
+    await bot.get_schedule(week_before)
+    _, weekday = await tap(dates[1])
+    report("день недели неделей раньше", weekday)
+    results.append(("день недели", weekday, dates[1]))
+
+    # 3. Устаревшее расписание этой даты
+    await bot.get_schedule(dates[2])
+    key = bot.schedule_key(dates[2])
+    bot.schedule_cache[key] = bot.schedule_cache[key]._replace(timestamp=time.time() - bot.CACHE_TTL - 1)
+    _, stale = await tap(dates[2])
+    report("устаревшее расписание даты", stale)
+    results.append(("устаревшее расписание", stale, dates[2]))
+    print()
+
+    fast = 2 * args.telegram_latency + 0.05
+    check(partial and first_content(cold) < scrape_time,
+          f"без кэша разобранные уроки показаны до конца загрузки ({len(partial)} промежуточных)")
+    check("Прогноз расписания" in weekday[0][1] and weekday[0][0] < fast,
+          f"прогноз по недельному шаблону показан сразу (< {fast * 1000:.0f} мс)")
+    check("Обновляю расписание" in stale[0][1] and stale[0][0] < fast,
+          f"устаревшее расписание показано сразу (< {fast * 1000:.0f} мс)")
+    intermediate = [elapsed for elapsed, _ in cold[:-1]]
+    gaps = [b - a for a, b in zip(intermediate, intermediate[1:])]
+    check(all(gap >= args.interval - 0.05 for gap in gaps),
+          f"промежуточные изменения не чаще раза в {args.interval:g} с")
+    # Время обновления (с точностью до минуты) в сравнении не участвует
+    def schedule_part(text):
+        return text.split("\n\n🔄")[0]
+    for title, edits, date_str in results:
+        check(schedule_part(edits[-1][1]) == schedule_part(expected[date_str]), f"{title}: итоговое сообщение совпадает с обычным ответом")
+        check(edits[-1][0] < scrape_time + args.interval + 0.3, f"{title}: итог не задерживается")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка постепенного ответа на нажатие даты")
+    parser.add_argument("--page-latency", type=float, default=1.0, help="открытие страницы дня в МЭШ, с")
+    parser.add_argument("--card-latency", type=float, default=0.4, help="разбор одной карточки урока, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="задержка ответа Telegram, с")
+    parser.add_argument("--interval", type=float, default=1.0, help="PROGRESSIVE_EDIT_INTERVAL, с")
+    args = parser.parse_args()
+    run_bot_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
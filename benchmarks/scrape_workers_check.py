@@ -0,0 +1,171 @@
+"""
+Проверка пула процессов получения расписания (scrape_workers.py) без браузера.
+
+Вместо Chrome процесс-исполнитель запускает заглушку: она порождает дочерний процесс
+("браузер", sleep) и по дате отвечает уроками, зависает, падает или бросает исключение.
+Проверяется, что:
+- зависшее задание завершается через таймаут, процесс перезапускается, а его "браузер"
+  завершается вместе с ним;
+- после зависаний всех процессов пул снова выполняет задания (место освобождается);
+- падение процесса во время задания дает ошибку и перезапуск, а его "браузер" завершается;
+- ошибка задания не перезапускает процесс;
+- переполнение очереди сразу отклоняет задание;
+- задания учетной записи попадают в процесс, где уже открыт ее браузер.
+
+Код возврата 1, если проверка не пройдена.
+
+Запуск:
+    python benchmarks/scrape_workers_check.py [--timeout S]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from accounts import Account  # noqa: E402
+from check_harness import run_check  # noqa: E402
+from scrape_workers import ScrapeWorkerPool, ScrapeWorkerError, ScrapeTimeout, ScrapeQueueFull  # noqa: E402
+
+
+class FakeScheduler:
+    """
+    Заглушка MosregSchedule: "браузер" - дочерний процесс sleep
+    """
+
+    def __init__(self, account):
+        self.account = account
+        self.browser = subprocess.Popen(["sleep", "1000"])
+
+    def get_schedule(self, date):
+        if date == "hang":
+            time.sleep(1000)
+        if date == "crash":
+            os._exit(1)
+        if date == "error":
+            raise RuntimeError("страница не загрузилась")
+        if date.startswith("slow"):
+            time.sleep(float(date[4:]))
+        return [{"subject": "Математика", "date": date, "browser_pid": self.browser.pid}]
+
+    def get_class_info(self):
+        return {"school": "МБОУ СОШ №1", "class": self.account.name}
+
+    def close(self):
+        self.browser.kill()
+        self.browser.wait()
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # Завершенный, но не собранный процесс считаем завершенным
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(") ")[1][0] != "Z"
+    except OSError:
+        return True
+
+
+async def run(args, check):
+    first, second = Account("9a", None), Account("10b", None)
+    restarts = []
+    pool = ScrapeWorkerPool(2, FakeScheduler, timeout=args.timeout, max_queue=2,
+                            on_restart=restarts.append).start()
+    try:
+        lessons = await pool.run(first, "get_schedule", "01-09-2025")
+        check(lessons and lessons[0]["date"] == "01-09-2025", "задание выполнено в процессе-исполнителе")
+        browser_pid = lessons[0]["browser_pid"]
+        info = await pool.run(first, "get_class_info")
+        check(info == {"school": "МБОУ СОШ №1", "class": "9a"}, "get_class_info выполнен тем же способом")
+
+        # Зависание: таймаут, перезапуск, "браузер" завершен вместе с процессом
+        worker_pid = next(w["pid"] for w in pool.health() if w["account"] == first.name)
+        started = time.perf_counter()
+        try:
+            await pool.run(first, "get_schedule", "hang")
+            check(False, "зависшее задание прервано по таймауту")
+        except ScrapeTimeout:
+            elapsed = time.perf_counter() - started
+            check(elapsed < args.timeout + 2, f"зависшее задание прервано по таймауту ({elapsed:.1f} с)")
+        await asyncio.sleep(0.2)
+        check(not pid_alive(worker_pid), "зависший процесс завершен")
+        check(not pid_alive(browser_pid), "браузер зависшего процесса завершен")
+        check(restarts == ["timeout"], f"процесс перезапущен (причины: {restarts})")
+        check(pool.alive_count() == 2, "в пуле снова 2 процесса")
+
+        # Зависают все процессы сразу - после таймаута пул снова работает
+        results = await asyncio.gather(*(pool.run(account, "get_schedule", "hang") for account in (first, second)),
+                                       return_exceptions=True)
+        check(all(isinstance(result, ScrapeTimeout) for result in results), "оба зависших задания прерваны")
+        started = time.perf_counter()
+        results = await asyncio.gather(*(pool.run(first, "get_schedule", f"0{i}-09-2025") for i in range(1, 5)))
+        check(len(results) == 4 and all(results), "после зависаний пул выполняет задания "
+                                                  f"({time.perf_counter() - started:.1f} с)")
+
+        # Падение процесса: браузер упавшего процесса тоже завершается
+        lessons = await pool.run(second, "get_schedule", "01-09-2025")
+        browser_pid = lessons[0]["browser_pid"]
+        try:
+            await pool.run(second, "get_schedule", "crash")
+            check(False, "падение процесса дает ошибку")
+        except ScrapeWorkerError as e:
+            check(not isinstance(e, ScrapeTimeout), f"падение процесса дает ошибку ({e})")
+        check(restarts.count("crash") == 1, "упавший процесс перезапущен")
+        await asyncio.sleep(0.2)
+        check(not pid_alive(browser_pid), "браузер упавшего процесса завершен")
+
+        # Ошибка задания: процесс не перезапускается
+        before = pool.restarts()
+        try:
+            await pool.run(second, "get_schedule", "error")
+            check(False, "ошибка задания передается вызывающему")
+        except ScrapeWorkerError as e:
+            check("страница не загрузилась" in str(e), "ошибка задания передается вызывающему")
+        check(pool.restarts() == before, "после ошибки задания процесс не перезапущен")
+
+        # Привязка к учетной записи
+        await pool.run(first, "get_schedule", "01-09-2025")
+        await pool.run(second, "get_schedule", "01-09-2025")
+        worker_first = next(w["worker"] for w in pool.health() if w["account"] == first.name)
+        await pool.run(second, "get_schedule", "02-09-2025")
+        await pool.run(first, "get_schedule", "02-09-2025")
+        check(next(w["worker"] for w in pool.health() if w["account"] == first.name) == worker_first,
+              "задание учетной записи выполнено в процессе с ее браузером")
+
+        # Очередь: 2 выполняются, 2 ждут, пятое отклоняется сразу
+        slow = [asyncio.ensure_future(pool.run(first, "get_schedule", "slow0.5")) for _ in range(4)]
+        await asyncio.sleep(0.05)
+        check(pool.queue_depth == 2, f"в очереди 2 задания ({pool.queue_depth})")
+        started = time.perf_counter()
+        try:
+            await pool.run(first, "get_schedule", "01-09-2025")
+            check(False, "переполнение очереди отклоняет задание")
+        except ScrapeQueueFull:
+            check(time.perf_counter() - started < 0.1, "переполнение очереди сразу отклоняет задание")
+        results = await asyncio.gather(*slow)
+        check(all(results) and pool.queue_depth == 0, "задания из очереди выполнены")
+
+        health = pool.health()
+        print("\n  " + "\n  ".join(
+            f"процесс {w['worker']}: pid {w['pid']}, заданий {w['jobs']}, ошибок {w['failures']}, "
+            f"перезапусков {w['restarts']}, последняя ошибка: {w['last_error']}" for w in health))
+    finally:
+        pool.stop()
+    check(pool.alive_count() == 0, "процессы остановлены")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка пула процессов получения расписания")
+    parser.add_argument("--timeout", type=float, default=1.0, help="таймаут задания, с")
+    args = parser.parse_args()
+    run_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Проверка недельного шаблона расписания (timetable_model.py).
+
+По записанной учебной неделе (data/portal_days.json) строятся --weeks недель расписания
+с разовыми заменами: с вероятностью --noise урок заменяется другим предметом, а
+в неделе --holiday нет уроков (каникулы). Недели по очереди учитываются шаблоном;
+перед каждым днем его уроки предсказываются. Выводится доля верно предсказанных
+уроков (предмет на своем месте) и верного числа уроков в сравнении с простым
+прогнозом "как неделю назад".
+
+Затем бот с заглушкой МЭШ проверяется целиком: нажатие даты, которой нет в кэше, сразу
+показывает прогноз, а календарь - число уроков у дат. Код возврата 1, если проверка не пройдена.
+
+Запуск:
+    python benchmarks/timetable_check.py [--weeks N] [--noise P] [--holiday N] [--seed N]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from check_harness import run_bot_check  # noqa: E402
+from fake_telegram import FakeContext, make_callback_update  # noqa: E402
+from load_test import school_days  # noqa: E402
+from portal_stub import load_days  # noqa: E402
+from progressive_check import ParsingScraper, TimelineBot  # noqa: E402
+
+
+def build_weeks(days, weeks, noise, holiday, rng):
+    """
+    Возвращает список недель: [(дата, уроки Lesson)] по дням записанной недели
+    """
+    from lesson_model import lessons_from_dicts
+
+    base = {datetime.strptime(date_str, "%d-%m-%Y"): lessons_from_dicts(lessons) for date_str, lessons in days.items()}
+    subjects = sorted({lesson.subject for lessons in base.values() for lesson in lessons})
+    result = []
+    for week in range(weeks):
+        days_of_week = []
+        for day, lessons in sorted(base.items()):
+            date_str = (day + timedelta(weeks=week)).strftime("%d-%m-%Y")
+            if week == holiday:
+                days_of_week.append((date_str, ()))
+                continue
+            lessons = tuple(lesson._replace(subject=rng.choice(subjects)) if rng.random() < noise else lesson
+                            for lesson in lessons)
+            days_of_week.append((date_str, lessons))
+        result.append(days_of_week)
+    return result
+
+
+def accuracy(predicted, actual):
+    """
+    Доля уроков дня, предмет которых предсказан на своем месте
+    """
+    if not actual:
+        return None
+    hits = sum(1 for index, lesson in enumerate(actual)
+               if index < len(predicted) and predicted[index].subject == lesson.subject)
+    return hits / max(len(actual), len(predicted))
+
+
+def model_check(args, check):
+    from timetable_model import WeeklyTimetable
+
+    rng = random.Random(args.seed)
+    weeks = build_weeks(load_days(), args.weeks, args.noise, args.holiday, rng)
+    model = WeeklyTimetable(weeks=4)
+    last_week = {}
+    scores = {"шаблон": [], "неделю назад": []}
+    counts = {"шаблон": [], "неделю назад": []}
+    for days_of_week in weeks:
+        for date_str, lessons in days_of_week:
+            weekday = datetime.strptime(date_str, "%d-%m-%Y").weekday()
+            prediction = model.predict(None, date_str)
+            if lessons and prediction is not None and weekday in last_week:
+                for name, predicted in (("шаблон", prediction.lessons), ("неделю назад", last_week[weekday])):
+                    scores[name].append(accuracy(predicted, lessons))
+                    counts[name].append(len(predicted) == len(lessons))
+            model.observe(None, date_str, lessons)
+            if lessons:
+                last_week[weekday] = lessons
+
+    print(f"Недель {args.weeks}, замен {args.noise:.0%}, каникулы на неделе {args.holiday + 1}, "
+          f"прогнозов {len(scores['шаблон'])}\n")
+    for name in scores:
+        print(f"  {name:14} уроки на своем месте {sum(scores[name]) / len(scores[name]):.0%}, "
+              f"верное число уроков {sum(counts[name]) / len(counts[name]):.0%}")
+    print()
+    template = sum(scores["шаблон"]) / len(scores["шаблон"])
+    baseline = sum(scores["неделю назад"]) / len(scores["неделю назад"])
+    check(template >= baseline, f"шаблон точнее прогноза \"как неделю назад\" ({template:.0%} и {baseline:.0%})")
+    check(template >= 0.9, "шаблон верно предсказывает не меньше 90% уроков")
+
+
+async def bot_check(bot, args, check):
+    scraper = ParsingScraper(load_days(), args.scrape_latency, 0.0)
+
+    async def get_scheduler(account=None):
+        return scraper
+    bot.get_scheduler = get_scheduler
+
+    fake_bot = TimelineBot(0.05)
+    context = FakeContext(fake_bot)
+    user_id = 800002
+
+    # Неделя расписания в кэше, затем нажатие даты через две недели
+    start = datetime.now() - timedelta(days=7)
+    learned = school_days(5, start)
+    await asyncio.gather(*(bot.get_schedule(date_str) for date_str in learned))
+    target = (datetime.strptime(learned[2], "%d-%m-%Y") + timedelta(weeks=2)).strftime("%d-%m-%Y")
+
+    update = make_callback_update(fake_bot, f"date_{target}", user_id=user_id)
+    started = time.perf_counter()
+    await bot.show_schedule_for_date(update, context, target)
+    first_at, first_text = fake_bot.edits[0]
+    first = first_at - started
+    final = fake_bot.edits[-1][1]
+    print(f"Нажатие даты без кэша: прогноз через {first * 1000:.0f} мс, "
+          f"расписание через {fake_bot.edits[-1][0] - started:.2f} с\n")
+    check("Прогноз расписания" in first_text and first < 0.2, "прогноз показан сразу и помечен как прогноз")
+    check("Прогноз" not in final and "Расписание на" in final, "итоговое сообщение - полученное расписание")
+
+    # Календарь следующего месяца: прогноз числа уроков для будних дней
+    next_month = (datetime.now().replace(day=1) + timedelta(days=32)).replace(day=1)
+    counts = bot.calendar_days(next_month.month, next_month.year)
+    weekdays = sum(1 for day in counts if next_month.replace(day=day).weekday() < 5)
+    check(counts and all(mark.predicted for mark in counts.values()),
+          f"в календаре следующего месяца число уроков по прогнозу ({len(counts)} дат)")
+    check(weekdays == len(counts), "прогноз только для учебных дней недели")
+    header, markup = bot.render_calendar(next_month.month, next_month.year)
+    labels = [button.text for row in markup.inline_keyboard for button in row]
+    check(any(label[-1] in "₀₁₂₃₄₅₆₇₈₉" for label in labels), "у дат календаря показано число уроков")
+
+
+async def run(bot, args, check):
+    model_check(args, check)
+    print()
+    await bot_check(bot, args, check)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка недельного шаблона расписания")
+    parser.add_argument("--weeks", type=int, default=12, help="недель расписания")
+    parser.add_argument("--noise", type=float, default=0.05, help="доля разовых замен уроков")
+    parser.add_argument("--holiday", type=int, default=6, help="номер недели каникул (с 0)")
+    parser.add_argument("--scrape-latency", type=float, default=0.5, help="задержка запроса к МЭШ, с")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    run_bot_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
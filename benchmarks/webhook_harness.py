@@ -0,0 +1,141 @@
+"""
+Локальная проверка режима webhook.
+
+Запускает настоящий Application с обработчиками mosh_telegram_bot и встроенным
+webhook-сервером на 127.0.0.1 (поддельный Telegram Bot, заглушка получения
+расписания, как в load_test.py) и проверяет:
+- установку webhook с secret_token и max_connections;
+- отказ (403) на запросы без секрета и с неверным секретом;
+- обработку пачки одновременных POST-запросов с callback-нажатиями: время ответа
+  сервера и время от отправки до завершения обработчика (p50/p95), пропускную способность.
+
+Все файлы бота создаются во временном каталоге. Код возврата 1, если проверка не пройдена.
+
+Запуск:
+    python benchmarks/webhook_harness.py [--requests N] [--concurrency N]
+                                         [--concurrent-updates N] [--telegram-latency S]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import httpx  # noqa: E402
+from telegram import Update  # noqa: E402
+from telegram.ext import TypeHandler  # noqa: E402
+
+from check_harness import run_bot_check  # noqa: E402
+from fake_telegram import FakeBot, callback_update_data  # noqa: E402
+from load_test import StubScraper, percentile, school_days  # noqa: E402
+from portal_stub import load_days  # noqa: E402
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(bot, args, check):
+    import tracing
+
+    tracing.tracer.configure()
+    fake_bot = FakeBot(latency=args.telegram_latency)
+    scraper = StubScraper(load_days(), 0.0)
+
+    async def get_scheduler(account=None):
+        return scraper
+    bot.get_scheduler = get_scheduler
+
+    application = bot.build_application(bot=fake_bot, concurrent_updates=args.concurrent_updates or None)
+    finished = {}
+
+    async def on_processed(update, context):
+        finished[update.update_id] = time.perf_counter()
+    application.add_handler(TypeHandler(Update, on_processed), group=1)
+
+    port = free_port()
+    options = bot.webhook_options(listen="127.0.0.1", port=port,
+                                  webhook_url=f"http://127.0.0.1:{port}/{bot.WEBHOOK_PATH}")
+    url = options["webhook_url"]
+    dates = school_days(5)
+    await application.initialize()
+    await application.start()
+    try:
+        await application.updater.start_webhook(**options)
+        await asyncio.gather(*(bot.get_schedule(date_str) for date_str in dates))
+        print(f"Webhook: {url}, обновлений одновременно: {args.concurrent_updates or 1}, "
+              f"Telegram {args.telegram_latency * 1000:.0f} мс")
+        webhook = fake_bot.webhook or {}
+        check(webhook.get("url") == url, "setWebhook вызван с адресом webhook")
+        check(webhook.get("secret_token") == bot.WEBHOOK_SECRET, "setWebhook передает secret_token")
+        check(webhook.get("max_connections") == bot.WEBHOOK_MAX_CONNECTIONS,
+              f"setWebhook передает max_connections={bot.WEBHOOK_MAX_CONNECTIONS}")
+
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            probe = json.dumps(callback_update_data("ignore"))
+            headers = {"Content-Type": "application/json"}
+            response = await client.post(url, content=probe, headers=headers)
+            check(response.status_code == 403, f"запрос без секрета отклонен ({response.status_code})")
+            response = await client.post(url, content=probe, headers=dict(headers, **{SECRET_HEADER: "wrong"}))
+            check(response.status_code == 403, f"запрос с неверным секретом отклонен ({response.status_code})")
+
+            headers[SECRET_HEADER] = bot.WEBHOOK_SECRET
+            semaphore = asyncio.Semaphore(args.concurrency)
+            sent, statuses, response_times = {}, [], []
+
+            async def post(i):
+                date_str = dates[i % len(dates)]
+                data = (f"date_{date_str}", f"homework_{date_str}", f"hw_toggle_{date_str}_{scraper.lesson_token(date_str, i)}_0")[i % 3]
+                payload = callback_update_data(data, user_id=700000 + i)
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(url, content=json.dumps(payload), headers=headers)
+                    response_times.append(time.perf_counter() - started)
+                sent[payload["update_id"]] = started
+                statuses.append(response.status_code)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(post(i) for i in range(args.requests)))
+            deadline = time.perf_counter() + 60
+            while len(set(sent) & set(finished)) < len(sent) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - started
+
+        check(all(status == 200 for status in statuses), f"все {args.requests} обновлений приняты (200)")
+        latencies = [finished[update_id] - sent_at for update_id, sent_at in sent.items() if update_id in finished]
+        check(len(latencies) == len(sent), f"обработано {len(latencies)} из {len(sent)} обновлений")
+        print(f"\n  ответ сервера: p50 {percentile(response_times, 0.5) * 1000:.1f} мс, "
+              f"p95 {percentile(response_times, 0.95) * 1000:.1f} мс")
+        print(f"  до завершения обработки: p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f} мс")
+        print(f"  пропускная способность: {len(latencies) / elapsed:.1f} обновлений/с")
+    finally:
+        if application.updater.running:
+            await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная проверка режима webhook")
+    parser.add_argument("--requests", type=int, default=500, help="число обновлений в пачке")
+    parser.add_argument("--concurrency", type=int, default=40, help="одновременных HTTP-соединений (как max_connections)")
+    parser.add_argument("--concurrent-updates", type=int, default=64,
+                        help="обрабатывать до N обновлений одновременно (0 - по одному)")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="задержка вызовов Telegram API, с")
+    args = parser.parse_args()
+    run_bot_check(run, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import calendar
+import logging
+from collections import OrderedDict
+from datetime import date
+from typing import NamedTuple, Optional, Tuple
+
+from schedule_diff import lesson_keys
+
+logger = logging.getLogger(__name__)
+
+
+class DaySummary(NamedTuple):
+    """
+    Сводка по дню для календаря (по полученному расписанию)
+    """
+    # Уроки, не входящие в список игнорируемых
+    lessons: int
+    # Идентификаторы таких уроков с домашним заданием
+    homework: Tuple[str, ...]
+    # Будний день без уроков (каникулы, праздник)
+    holiday: bool
+
+
+class CalendarDay(NamedTuple):
+    """
+    Отметки даты в календаре пользователя
+    """
+    lessons: int
+    # Число уроков - прогноз по недельному шаблону (расписания на дату еще нет)
+    predicted: bool
+    # Невыполненные домашние задания пользователя
+    pending: int
+    holiday: bool
+
+
+def summarize_day(date_str, lessons, classifier):
+    """
+    Сводка по дню: уроки без игнорируемых и их ДЗ (идентификаторы - как у статусов ДЗ)
+    """
+    if not lessons:
+        day, month, year = (int(part) for part in date_str.split("-"))
+        return DaySummary(0, (), date(year, month, day).weekday() < 5)
+    count = 0
+    homework = []
+    for lesson, key in zip(lessons, lesson_keys(lessons)):
+        if classifier.classify(lesson.subject).ignored:
+            continue
+        count += 1
+        if lesson.has_homework:
+            homework.append(key)
+    return DaySummary(count, tuple(homework), False)
+
+
+class CalendarIndex:
+    """
+    Сводка по месяцам для календаря: для класса (partition), набора правил игнорирования
+    (классификатора) и месяца - словарь {день: DaySummary} по кэшу расписания.
+
+    Месяц строится при первом показе календаря (lookup(date) - уроки из кэша или None)
+    и дальше обновляется по одному дню при каждом изменении кэша (update), поэтому
+    календарь отрисовывается за один проход по дням месяца без обращения к МЭШ.
+    Число уроков по прогнозу (predicted_count) запоминается для дня недели и сбрасывается
+    вместе с изменением расписания класса. Хранится не больше max_months месяцев.
+    """
+
+    def __init__(self, max_months=256):
+        self.max_months = max_months
+        # (partition, classifier.key, "MM-YYYY") -> {день: DaySummary}
+        self._months = OrderedDict()
+        self._classifiers = {}
+        # (partition, classifier.key, день недели) -> число уроков по прогнозу (или None)
+        self._predicted = {}
+        self.builds = 0
+        self.updates = 0
+
+    def month(self, partition, month, year, classifier, lookup):
+        """
+        Сводка по дням месяца {день: DaySummary} (только дни, расписание которых есть в кэше)
+        """
+        key = (partition, classifier.key, f"{month:02d}-{year}")
+        days = self._months.get(key)
+        if days is not None:
+            self._months.move_to_end(key)
+            return days
+        self._classifiers[classifier.key] = classifier
+        days = {}
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            date_str = f"{day:02d}-{month:02d}-{year}"
+            lessons = lookup(date_str)
+            if lessons is not None:
+                days[day] = summarize_day(date_str, lessons, classifier)
+        self._months[key] = days
+        self.builds += 1
+        while len(self._months) > self.max_months:
+            self._months.popitem(last=False)
+        return days
+
+    def update(self, partition, date_str, lessons):
+        """
+        Учитывает изменение кэша расписания на дату (lessons=None - дата удалена из кэша)
+        """
+        try:
+            day, month, year = (int(part) for part in date_str.split("-"))
+        except ValueError:
+            return
+        month_key = f"{month:02d}-{year}"
+        for (key_partition, classifier_key, key_month), days in self._months.items():
+            if key_partition != partition or key_month != month_key:
+                continue
+            if lessons is None:
+                days.pop(day, None)
+            else:
+                days[day] = summarize_day(date_str, lessons, self._classifiers[classifier_key])
+            self.updates += 1
+        # Недельный шаблон класса мог измениться
+        for key in [key for key in self._predicted if key[0] == partition]:
+            del self._predicted[key]
+
+    def predicted_count(self, partition, weekday, classifier, predict) -> Optional[int]:
+        """
+        Число уроков по прогнозу для дня недели; predict() - уроки прогноза или None
+        """
+        key = (partition, classifier.key, weekday)
+        if key not in self._predicted:
+            lessons = predict()
+            self._predicted[key] = None if lessons is None else sum(
+                1 for lesson in lessons if not classifier.classify(lesson.subject).ignored)
+        return self._predicted[key]
+
+    def clear(self):
+        self._months.clear()
+        self._predicted.clear()
+
+    def __len__(self):
+        return len(self._months)
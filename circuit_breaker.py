@@ -0,0 +1,149 @@
+import logging
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Состояния предохранителя
+STATE_CLOSED = "closed"        # запросы идут к источнику
+STATE_OPEN = "open"            # источник недоступен, запросы не отправляются до конца паузы
+STATE_HALF_OPEN = "half_open"  # пауза закончилась, одна пробная попытка решает, закрыться или снова открыться
+
+
+class CircuitOpenError(Exception):
+    """
+    Запрос не отправлен: предохранитель источника открыт
+    """
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name}: источник недоступен, повтор через {retry_after:.0f} с")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для медленного или недоступного источника данных (МЭШ, сервис расписания).
+
+    Хранит результаты последних window запросов; если среди них не меньше min_calls
+    и доля ошибок достигает failure_rate, предохранитель открывается на паузу.
+    Пауза растет вдвое при каждом повторном открытии подряд (от backoff до max_backoff)
+    и случайно сокращается до jitter своей длины, чтобы несколько процессов не повторяли
+    попытки одновременно. После паузы пропускается одна пробная попытка (не чаще раза
+    в probe_timeout секунд): успех закрывает предохранитель, ошибка открывает снова.
+
+    allow() - можно ли обращаться к источнику; результат обращения сообщается
+    через record_success() / record_failure(); если обращение не состоялось
+    (например, очередь запросов заполнена) - release_probe().
+    """
+
+    def __init__(self, name, failure_rate=0.5, min_calls=4, window=10, backoff=30, max_backoff=600,
+                 jitter=0.5, probe_timeout=60, on_state_change=None, clock=time.monotonic, rng=random.random):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.probe_timeout = probe_timeout
+        self.on_state_change = on_state_change
+        self._clock = clock
+        self._rng = rng
+        self._results = deque(maxlen=window)
+        self.state = STATE_CLOSED
+        self._open_until = 0
+        # Сколько раз подряд предохранитель открывался без успешного запроса
+        self._consecutive_opens = 0
+        self._probe_started = None
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self):
+        """
+        Проверяет, можно ли сейчас обратиться к источнику
+        (в полуоткрытом состоянии разрешает одну пробную попытку)
+        """
+        if self.state == STATE_CLOSED:
+            return True
+        now = self._clock()
+        if self.state == STATE_OPEN:
+            if now < self._open_until:
+                self.rejected += 1
+                return False
+            self._set_state(STATE_HALF_OPEN)
+        if self._probe_started is not None and now - self._probe_started < self.probe_timeout:
+            self.rejected += 1
+            return False
+        self._probe_started = now
+        return True
+
+    def check(self):
+        """
+        Как allow(), но при открытом предохранителе бросает CircuitOpenError
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self):
+        self._results.append(True)
+        if self.state != STATE_CLOSED:
+            logger.info(f"Источник {self.name} снова доступен")
+            self._results.clear()
+            self._consecutive_opens = 0
+            self._probe_started = None
+            self._set_state(STATE_CLOSED)
+
+    def record_failure(self):
+        self._results.append(False)
+        if self.state == STATE_HALF_OPEN:
+            self._trip()
+        elif self.state == STATE_CLOSED and len(self._results) >= self.min_calls:
+            failures = self._results.count(False)
+            if failures / len(self._results) >= self.failure_rate:
+                self._trip()
+
+    def release_probe(self):
+        """
+        Отменяет пробную попытку, которая не дошла до источника: результат не учитывается,
+        следующий запрос снова может стать пробным
+        """
+        self._probe_started = None
+
+    def is_open(self):
+        """
+        Открыт ли предохранитель (без пробной попытки, в отличие от allow)
+        """
+        return self.state == STATE_OPEN and self._clock() < self._open_until
+
+    def retry_after(self):
+        """
+        Через сколько секунд закончится пауза (0, если предохранитель не открыт)
+        """
+        if self.state != STATE_OPEN:
+            return 0
+        return max(0.0, self._open_until - self._clock())
+
+    def failure_ratio(self):
+        if not self._results:
+            return 0.0
+        return self._results.count(False) / len(self._results)
+
+    def _trip(self):
+        self._consecutive_opens += 1
+        delay = min(self.max_backoff, self.backoff * 2 ** (self._consecutive_opens - 1))
+        delay *= 1 - self.jitter * self._rng()
+        self._open_until = self._clock() + delay
+        self._probe_started = None
+        self.opens += 1
+        logger.warning(f"Источник {self.name} недоступен (ошибок {self.failure_ratio():.0%}), "
+                       f"запросы приостановлены на {delay:.0f} с")
+        self._set_state(STATE_OPEN)
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        if self.on_state_change is not None:
+            self.on_state_change(self.name, state)
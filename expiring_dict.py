@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+
+
+class ExpiringDict:
+    """
+    Словарь с ограниченным размером и временем жизни записей.
+
+    Все записи живут одинаковое время (ttl секунд с момента последней записи),
+    поэтому порядок вставки совпадает с порядком истечения: устаревшие записи
+    удаляются с начала при каждой записи, а при превышении max_entries
+    вытесняются самые старые.
+    """
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Ключ -> (значение, время истечения)
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None, now=None):
+        """
+        Возвращает значение, если запись существует и не устарела, иначе default
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if now is None:
+            now = time.time()
+        value, expires_at = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return default
+        return value
+
+    def set(self, key, value, now=None):
+        """
+        Сохраняет значение и удаляет устаревшие записи
+        """
+        if now is None:
+            now = time.time()
+        self._entries[key] = (value, now + self.ttl)
+        self._entries.move_to_end(key)
+        self.purge(now)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge(self, now=None):
+        """
+        Удаляет устаревшие записи, возвращает их количество
+        """
+        if now is None:
+            now = time.time()
+        removed = 0
+        while self._entries:
+            _, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._entries.popitem(last=False)
+            removed += 1
+        return removed
+
+    def __getitem__(self, key):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __contains__(self, key):
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def __len__(self):
+        return len(self._entries)
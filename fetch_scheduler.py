@@ -0,0 +1,176 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Классы запросов к МЭШ в порядке приоритета
+PRIORITY_INTERACTIVE = "interactive"  # пользователь ждет ответа (нажатие даты, обновление)
+PRIORITY_BROADCAST = "broadcast"      # рассылка, время которой наступило
+PRIORITY_BACKGROUND = "background"    # фоновые проверки и предварительная загрузка
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BROADCAST, PRIORITY_BACKGROUND)
+
+# Класс запроса задается вызывающим кодом (рассылкой, фоновой задачей) и наследуется задачами asyncio
+_current_priority = contextvars.ContextVar("fetch_priority", default=PRIORITY_INTERACTIVE)
+
+
+class FetchDropped(Exception):
+    """
+    Запрос снят с очереди: не дождался свободного места до крайнего срока
+    или очередь его класса заполнена
+    """
+
+
+def current_priority():
+    return _current_priority.get()
+
+
+@contextlib.contextmanager
+def fetch_priority(priority):
+    """
+    Задает класс запросов к МЭШ для кода внутри блока
+    """
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("priority", "key", "future", "enqueued")
+
+    def __init__(self, priority, key, future, enqueued):
+        self.priority = priority
+        self.key = key
+        self.future = future
+        self.enqueued = enqueued
+
+
+class FetchScheduler:
+    """
+    Очередь запросов к МЭШ с приоритетами.
+
+    Одновременно выполняется не больше concurrency запросов; класс может занимать
+    не больше limits[класс] мест, поэтому фоновая работа никогда не занимает все места.
+    Освободившееся место получает самый приоритетный ожидающий запрос (внутри класса - по очереди).
+
+    Запрос класса с крайним сроком (deadlines[класс], секунды ожидания) снимается с очереди,
+    если не начался за это время; при заполненной очереди класса (queue_limits) - сразу.
+    Запрос с ключом (key) повышается в классе, если тот же ключ нужен более приоритетному
+    запросу (promote) - пользователь не ждет фоновой проверки той же даты.
+    """
+
+    def __init__(self, concurrency=4, limits=None, deadlines=None, queue_limits=None,
+                 wait_histogram=None, jobs_counter=None, clock=time.monotonic):
+        self.concurrency = concurrency
+        self.limits = {priority: concurrency for priority in PRIORITIES}
+        self.limits.update(limits or {})
+        self.deadlines = dict(deadlines or {})
+        self.queue_limits = dict(queue_limits or {})
+        self.wait_histogram = wait_histogram
+        self.jobs_counter = jobs_counter
+        self._clock = clock
+        self.running = {priority: 0 for priority in PRIORITIES}
+        self._queues = {priority: deque() for priority in PRIORITIES}
+
+    def queue_depth(self, priority=None):
+        """
+        Сколько запросов ждет места (всего или в классе)
+        """
+        if priority is not None:
+            return len(self._queues[priority])
+        return sum(len(queue) for queue in self._queues.values())
+
+    def running_total(self):
+        return sum(self.running.values())
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority=None, key=None):
+        """
+        Ждет места для запроса класса priority (по умолчанию - заданного fetch_priority)
+        и занимает его на время блока. Бросает FetchDropped, если запрос снят с очереди
+        """
+        priority = await self._acquire(priority or current_priority(), key)
+        try:
+            yield priority
+        finally:
+            self.running[priority] -= 1
+            self._wake()
+
+    def promote(self, key, priority=None):
+        """
+        Переносит ожидающий запрос с ключом key в класс priority, если тот приоритетнее
+        """
+        priority = priority or current_priority()
+        rank = PRIORITIES.index(priority)
+        for lower in PRIORITIES[rank + 1:]:
+            for waiter in list(self._queues[lower]):
+                if waiter.key == key and not waiter.future.done():
+                    self._queues[lower].remove(waiter)
+                    waiter.priority = priority
+                    self._queues[priority].append(waiter)
+                    self._count(priority, "promoted")
+                    logger.info(f"Запрос {key} повышен из {lower} в {priority}")
+        self._wake()
+
+    async def _acquire(self, priority, key):
+        queue = self._queues[priority]
+        queue_limit = self.queue_limits.get(priority)
+        if queue_limit is not None and len(queue) >= queue_limit:
+            self._count(priority, "dropped")
+            raise FetchDropped(f"очередь запросов {priority} заполнена ({queue_limit})")
+
+        waiter = _Waiter(priority, key, asyncio.get_running_loop().create_future(), self._clock())
+        queue.append(waiter)
+        self._wake()
+        while not waiter.future.done():
+            # Крайний срок - по текущему классу (повышенный запрос может его не иметь)
+            deadline = self.deadlines.get(waiter.priority)
+            remaining = None if deadline is None else deadline - (self._clock() - waiter.enqueued)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), remaining)
+            except asyncio.TimeoutError:
+                deadline = self.deadlines.get(waiter.priority)
+                if waiter.future.done() or deadline is None or self._clock() - waiter.enqueued < deadline:
+                    continue
+                self._queues[waiter.priority].remove(waiter)
+                waiter.future.cancel()
+                self._count(waiter.priority, "dropped")
+                raise FetchDropped(f"запрос {key or ''} не дождался места за {deadline:g} с ({waiter.priority})") from None
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Место уже выделено - освобождаем
+                    self.running[waiter.future.result()] -= 1
+                    self._wake()
+                else:
+                    self._queues[waiter.priority].remove(waiter)
+                    waiter.future.cancel()
+                raise
+        granted = waiter.future.result()
+        if self.wait_histogram is not None:
+            self.wait_histogram.labels(granted).observe(self._clock() - waiter.enqueued)
+        self._count(granted, "started")
+        return granted
+
+    def _wake(self):
+        """
+        Отдает свободные места ожидающим запросам в порядке приоритета
+        """
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self.running_total() < self.concurrency and self.running[priority] < self.limits[priority]:
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    continue
+                self.running[priority] += 1
+                waiter.future.set_result(priority)
+            if queue and self.running_total() >= self.concurrency:
+                return
+
+    def _count(self, priority, event):
+        if self.jobs_counter is not None:
+            self.jobs_counter.labels(priority, event).inc()
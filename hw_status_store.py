@@ -0,0 +1,383 @@
+import json
+import logging
+import os
+import pickle
+from typing import Dict, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Версия формата снимка хранилища
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Ключ маски: (номер пользователя << DATE_BITS) | номер даты
+DATE_BITS = 32
+
+
+class DayStatus(NamedTuple):
+    """
+    Статусы ДЗ пользователя на один день: битовая маска и общая для даты
+    таблица "идентификатор урока -> номер бита"
+    """
+    mask: int
+    slots: Dict[str, int]
+
+    def get(self, lesson_key, default=False):
+        """
+        Возвращает True, если ДЗ урока отмечено как выполненное
+        """
+        bit = self.slots.get(lesson_key)
+        if bit is None:
+            return default
+        return bool(self.mask >> bit & 1)
+
+    def __len__(self):
+        return bin(self.mask).count("1")
+
+
+EMPTY_DAY_STATUS = DayStatus(0, {})
+
+
+class HomeworkStatusStore:
+    """
+    Компактное хранилище статусов ДЗ.
+
+    Пользователи и даты заменяются целыми номерами, статусы уроков одного дня
+    хранятся в одном целом числе (бит на урок). Номер бита закрепляется за
+    идентификатором урока для каждой даты и одинаков для всех пользователей.
+
+    Изменения дописываются в журнал по одной строке, полный снимок
+    записывается при compact() (и автоматически, когда журнал разрастается).
+
+    Если задан backend (storage.SqliteStorage), файлы не используются: изменения
+    записываются в общее хранилище, а перед чтением подтягиваются изменения,
+    сделанные другими процессами.
+    """
+
+    def __init__(self, path, journal_path, compact_after=1000, backend=None):
+        self.path = path
+        self.journal_path = journal_path
+        self.compact_after = compact_after
+        self.backend = backend
+        self._backend_seq = 0
+        self._user_ids = {}
+        self._date_ids = {}
+        self._dates = []
+        self._slots = {}
+        self._masks = {}
+        self._journal_records = 0
+
+    # --- Номера пользователей и дат ---
+
+    def _user_id(self, user, create=False):
+        user_id = self._user_ids.get(user)
+        if user_id is None and create:
+            user_id = len(self._user_ids)
+            self._user_ids[user] = user_id
+        return user_id
+
+    def _date_id(self, date_str, create=False):
+        date_id = self._date_ids.get(date_str)
+        if date_id is None and create:
+            date_id = len(self._dates)
+            self._dates.append(date_str)
+            self._date_ids[date_str] = date_id
+        return date_id
+
+    def _mask_key(self, user, date_str, create=False):
+        user_id = self._user_id(user, create)
+        date_id = self._date_id(date_str, create)
+        if user_id is None or date_id is None:
+            return None, None
+        return (user_id << DATE_BITS) | date_id, date_id
+
+    # --- Чтение ---
+
+    def day_status(self, user, date_str):
+        """
+        Возвращает DayStatus пользователя на дату
+        """
+        if self.backend is not None:
+            self.sync()
+        key, date_id = self._mask_key(user, date_str)
+        if key is None:
+            return EMPTY_DAY_STATUS
+        return DayStatus(self._masks.get(key, 0), self._slots.get(date_id, {}))
+
+    def days_status(self, user, dates):
+        """
+        Возвращает словарь {дата: DayStatus} пользователя для нескольких дат
+        (изменения других процессов подтягиваются один раз)
+        """
+        if self.backend is not None:
+            self.sync()
+        user_id = self._user_id(user)
+        result = {}
+        for date_str in dates:
+            date_id = self._date_id(date_str)
+            if user_id is None or date_id is None:
+                result[date_str] = EMPTY_DAY_STATUS
+            else:
+                result[date_str] = DayStatus(self._masks.get((user_id << DATE_BITS) | date_id, 0),
+                                             self._slots.get(date_id, {}))
+        return result
+
+    def date_keys(self, date_str):
+        """
+        Возвращает идентификаторы уроков, для которых на дату есть (или были) отметки
+        """
+        date_id = self._date_id(date_str)
+        return list(self._slots.get(date_id, {})) if date_id is not None else []
+
+    def is_done(self, user, date_str, lesson_key):
+        return self.day_status(user, date_str).get(lesson_key)
+
+    def dates(self):
+        """
+        Возвращает список дат, для которых есть статусы
+        """
+        return list(self._date_ids)
+
+    def users_count(self):
+        return len({key >> DATE_BITS for key in self._masks})
+
+    def records_count(self):
+        return sum(bin(mask).count("1") for mask in self._masks.values())
+
+    def __len__(self):
+        return len(self._masks)
+
+    # --- Изменение ---
+
+    def _apply(self, user, date_str, lesson_key, done):
+        """
+        Изменяет статус в памяти, возвращает True, если он изменился
+        """
+        key, date_id = self._mask_key(user, date_str, create=done)
+        if key is None:
+            return False
+
+        slots = self._slots.setdefault(date_id, {})
+        bit = slots.get(lesson_key)
+        if bit is None:
+            if not done:
+                return False
+            bit = len(slots)
+            slots[lesson_key] = bit
+
+        mask = self._masks.get(key, 0)
+        new_mask = mask | (1 << bit) if done else mask & ~(1 << bit)
+        if new_mask == mask:
+            return False
+        if new_mask:
+            self._masks[key] = new_mask
+        else:
+            del self._masks[key]
+        return True
+
+    def set(self, user, date_str, lesson_key, done):
+        """
+        Устанавливает статус ДЗ урока и дописывает изменение в журнал
+        Возвращает True, если статус изменился
+        """
+        done = bool(done)
+        if self.backend is not None:
+            self.sync()
+        if not self._apply(user, date_str, lesson_key, done):
+            return False
+        if self.backend is not None:
+            self.backend.put_homework_status(user, date_str, lesson_key, done)
+        else:
+            self._append_journal(user, date_str, lesson_key, done)
+        return True
+
+    def sync(self):
+        """
+        Применяет изменения, записанные в общее хранилище другими процессами
+        """
+        for user, date_str, lesson_key, done, seq in self.backend.homework_changes(self._backend_seq):
+            self._apply(user, date_str, lesson_key, bool(done))
+            self._backend_seq = seq
+
+    def rename_keys(self, date_str, renames):
+        """
+        Переносит отметки всех пользователей на дату со старых идентификаторов уроков
+        на новые ({старый: новый}; None - отметка удаляется)
+        Возвращает кортеж (перенесено, удалено)
+        """
+        if self.backend is not None:
+            self.sync()
+        date_id = self._date_id(date_str)
+        if date_id is None:
+            return 0, 0
+        slots = self._slots.get(date_id, {})
+        date_mask = (1 << DATE_BITS) - 1
+        users = {user_id: user for user, user_id in self._user_ids.items()}
+        moved = removed = 0
+        for old_key, new_key in renames.items():
+            bit = slots.get(old_key)
+            if bit is None:
+                continue
+            marked = [users[key >> DATE_BITS] for key, mask in self._masks.items()
+                      if key & date_mask == date_id and mask >> bit & 1]
+            for user in marked:
+                if new_key is not None:
+                    self.set(user, date_str, new_key, True)
+                    moved += 1
+                else:
+                    removed += 1
+                self.set(user, date_str, old_key, False)
+        return moved, removed
+
+    def toggle(self, user, date_str, lesson_key):
+        """
+        Переключает статус ДЗ урока, возвращает новый статус
+        """
+        done = not self.is_done(user, date_str, lesson_key)
+        self.set(user, date_str, lesson_key, done)
+        return done
+
+    def remove_dates(self, dates):
+        """
+        Удаляет все статусы для указанных дат, возвращает число удаленных масок
+        """
+        if self.backend is not None:
+            self.backend.remove_homework_dates(dates)
+        date_ids = {self._date_ids.pop(date_str) for date_str in dates if date_str in self._date_ids}
+        if not date_ids:
+            return 0
+        for date_id in date_ids:
+            self._slots.pop(date_id, None)
+            self._dates[date_id] = None
+        removed_keys = [key for key in self._masks if key & ((1 << DATE_BITS) - 1) in date_ids]
+        for key in removed_keys:
+            del self._masks[key]
+        return len(removed_keys)
+
+    # --- Перенос из старого формата ---
+
+    def export_records(self):
+        """
+        Возвращает все отметки в виде [(user, date, lesson_key, True), ...] (для переноса в общее хранилище)
+        """
+        users = {user_id: user for user, user_id in self._user_ids.items()}
+        date_mask = (1 << DATE_BITS) - 1
+        records = []
+        for key, mask in self._masks.items():
+            date_id = key & date_mask
+            date_str = self._dates[date_id]
+            for lesson_key, bit in self._slots.get(date_id, {}).items():
+                if mask >> bit & 1:
+                    records.append((users[key >> DATE_BITS], date_str, lesson_key, True))
+        return records
+
+    def import_legacy(self, legacy_data):
+        """
+        Загружает статусы из старого формата {user: {date: {lesson_key: bool}}}
+        Возвращает число перенесенных отметок
+        """
+        imported = 0
+        for user, dates in legacy_data.items():
+            for date_str, statuses in dates.items():
+                for lesson_key, done in statuses.items():
+                    if done and self._apply(str(user), date_str, lesson_key, True):
+                        imported += 1
+        return imported
+
+    # --- Сохранение ---
+
+    def _append_journal(self, user, date_str, lesson_key, done):
+        try:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps([user, date_str, lesson_key, int(done)], ensure_ascii=False) + "\n")
+            self._journal_records += 1
+        except Exception as e:
+            logger.error(f"Ошибка при записи журнала статусов ДЗ: {e}")
+            return
+        if self._journal_records >= self.compact_after:
+            self.compact()
+
+    def _renumber_dates(self):
+        """
+        Перенумеровывает даты подряд, освобождая номера удаленных дат
+        """
+        date_mask = (1 << DATE_BITS) - 1
+        remap = {}
+        dates = []
+        for date_str in self._dates:
+            if date_str is not None:
+                remap[self._date_ids[date_str]] = len(dates)
+                dates.append(date_str)
+        self._dates = dates
+        self._date_ids = {date_str: date_id for date_id, date_str in enumerate(dates)}
+        self._slots = {remap[date_id]: slots for date_id, slots in self._slots.items() if date_id in remap}
+        self._masks = {
+            (key & ~date_mask) | remap[key & date_mask]: mask
+            for key, mask in self._masks.items() if key & date_mask in remap
+        }
+
+    def compact(self):
+        """
+        Записывает полный снимок хранилища и очищает журнал
+        """
+        if len(self._date_ids) < len(self._dates):
+            self._renumber_dates()
+        if self.backend is not None:
+            # Общее хранилище записывается при каждом изменении, снимок не нужен
+            return
+        users = [None] * len(self._user_ids)
+        for user, user_id in self._user_ids.items():
+            users[user_id] = user
+        snapshot = {
+            'version': SNAPSHOT_FORMAT_VERSION,
+            'users': users,
+            'dates': self._dates,
+            'slots': self._slots,
+            'masks': self._masks,
+        }
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+            # Журнал очищается только после успешной записи снимка
+            open(self.journal_path, 'w').close()
+            self._journal_records = 0
+            logger.info(f"Сохранен снимок статусов ДЗ: {len(self._masks)} дней, {self.records_count()} отметок")
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении статусов ДЗ: {e}")
+
+    def load(self):
+        """
+        Загружает снимок и применяет журнал
+        Возвращает False, если ни снимка, ни журнала нет
+        """
+        if self.backend is not None:
+            self.sync()
+            return self._backend_seq > 0
+
+        if not os.path.exists(self.path) and not os.path.exists(self.journal_path):
+            return False
+
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                snapshot = pickle.load(f)
+            if snapshot.get('version') != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(f"Неподдерживаемая версия формата статусов ДЗ: {snapshot.get('version')}")
+            self._user_ids = {user: user_id for user_id, user in enumerate(snapshot['users'])}
+            self._dates = snapshot['dates']
+            self._date_ids = {date_str: date_id for date_id, date_str in enumerate(self._dates) if date_str is not None}
+            self._slots = snapshot['slots']
+            self._masks = snapshot['masks']
+
+        self._journal_records = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        user, date_str, lesson_key, done = json.loads(line)
+                    except ValueError:
+                        # Недописанная последняя строка (например, после аварийного завершения)
+                        continue
+                    self._apply(user, date_str, lesson_key, bool(done))
+                    self._journal_records += 1
+        return True
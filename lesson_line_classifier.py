@@ -0,0 +1,178 @@
+import re
+from typing import NamedTuple, Optional
+
+# Типы строк карточки урока
+LINE_TIME = "time"
+LINE_ROOM = "room"
+LINE_TEACHER = "teacher"
+LINE_HOMEWORK = "homework"
+LINE_NOISE = "noise"
+
+NOT_SPECIFIED = "Не указано"
+
+# Типичные фразы, указывающие на домашнее задание
+HOMEWORK_INDICATORS = (
+    "дз:", "домашнее задание:", "задание:", "выполнить:", "учить", "прочитать",
+    "выучить", "сделать", "подготовить", "параграф", "упражнение", "ex.", "exercise",
+    "activity", "student's book", "workbook", "п.", "стр.", "с.", "записать", "решить"
+)
+
+# Типичные указания на учителя
+TEACHER_INDICATORS = (
+    "преподаватель:", "учитель:", "внеурочная деятельность", "элективный курс"
+)
+
+# Слова, которые указывают на то, что это не урок, а элемент интерфейса
+INTERFACE_ELEMENTS = (
+    "дневник", "библиотека", "портфолио", "справка", "учащийся",
+    "расписание", "задания", "оценки", "создать",
+    "учёба", "школа", "олимпиады", "версия", "написать нам"
+)
+
+# Префиксы, которые отрезаются от текста домашнего задания и имени учителя
+HOMEWORK_PREFIXES = ("дз:", "домашнее задание:", "задание:")
+TEACHER_PREFIXES = ("учитель:", "преподаватель:")
+
+# Максимальное число запомненных строк
+MAX_MEMO_SIZE = 8192
+
+
+class LineVerdict(NamedTuple):
+    kind: str
+    value: Optional[str] = None
+    # Для строк со временем - время окончания урока
+    extra: Optional[str] = None
+
+
+def _alternation(words):
+    return re.compile("|".join(re.escape(word) for word in words))
+
+
+def _strip_prefixes(text, prefixes):
+    for prefix in prefixes:
+        if text.lower().startswith(prefix):
+            text = text[len(prefix):].strip()
+    return text
+
+
+class LessonLineClassifier:
+    """
+    Классификатор строк карточки урока.
+
+    Каждая строка разбирается один раз: наборы индикаторов домашнего задания,
+    учителя и элементов интерфейса собраны в скомпилированные регулярные выражения,
+    а вердикты для повторяющихся строк запоминаются.
+    """
+
+    def __init__(self, homework_indicators=HOMEWORK_INDICATORS, teacher_indicators=TEACHER_INDICATORS,
+                 interface_elements=INTERFACE_ELEMENTS):
+        self._homework_re = _alternation(word.lower() for word in homework_indicators)
+        self._teacher_re = _alternation(word.lower() for word in teacher_indicators)
+        self._interface_re = _alternation(word.lower() for word in interface_elements)
+        self._digit_re = re.compile(r"\d")
+        self._memo = {}
+
+    def is_interface(self, text):
+        """
+        Проверяет, похож ли текст на элемент интерфейса
+        """
+        return self._interface_re.search(text.lower()) is not None
+
+    def classify(self, line):
+        """
+        Классифицирует строку карточки урока (строка должна быть без пробелов по краям)
+        Возвращает LineVerdict с типом строки и извлеченным значением
+        """
+        verdict = self._memo.get(line)
+        if verdict is None:
+            verdict = self._classify(line)
+            if len(self._memo) >= MAX_MEMO_SIZE:
+                self._memo.clear()
+            self._memo[line] = verdict
+        return verdict
+
+    def _classify(self, line):
+        length = len(line)
+        has_colon = ":" in line
+
+        # Время (содержит двоеточие и обычно короткая строка)
+        if has_colon and length < 20:
+            if "-" in line:
+                parts = line.split("-")
+                return LineVerdict(LINE_TIME, parts[0].strip(), parts[1].strip())
+            return LineVerdict(LINE_TIME, line)
+
+        line_lower = line.lower()
+
+        # Кабинет (обычно короткая строка с цифрами)
+        if length < 15 and not has_colon and self._digit_re.search(line):
+            if self._interface_re.search(line_lower):
+                return LineVerdict(LINE_NOISE)
+            # Если в строке есть слово "Кабинет", извлекаем только номер
+            position = line_lower.find("кабинет")
+            if position != -1:
+                return LineVerdict(LINE_ROOM, line[position + len("кабинет"):].strip())
+            return LineVerdict(LINE_ROOM, line)
+
+        if length <= 3:
+            return LineVerdict(LINE_NOISE)
+
+        # Явные индикаторы домашнего задания и учителя
+        is_homework = self._homework_re.search(line_lower) is not None
+        is_teacher = self._teacher_re.search(line_lower) is not None
+
+        if is_homework or (length > 30 and not is_teacher):
+            # Если это явно домашнее задание или длинный текст (не учитель)
+            return LineVerdict(LINE_HOMEWORK, _strip_prefixes(line, HOMEWORK_PREFIXES))
+
+        if is_teacher or length < 30:
+            # Короткий текст, похожий на элемент интерфейса, учителем не считаем
+            if not is_teacher and self._interface_re.search(line_lower):
+                return LineVerdict(LINE_NOISE)
+            return LineVerdict(LINE_TEACHER, _strip_prefixes(line, TEACHER_PREFIXES))
+
+        return LineVerdict(LINE_NOISE)
+
+    def parse_card(self, subject, lesson_text):
+        """
+        Разбирает текст карточки урока
+        Возвращает словарь с информацией об уроке
+        """
+        lesson_info = {
+            "subject": subject,
+            "start_time": NOT_SPECIFIED,
+            "end_time": NOT_SPECIFIED,
+            "room": NOT_SPECIFIED,
+            "teacher": NOT_SPECIFIED,
+            "homework": NOT_SPECIFIED
+        }
+
+        for line in lesson_text.split('\n'):
+            line = line.strip()
+
+            # Пропускаем пустые строки и название предмета
+            if not line or line == subject:
+                continue
+
+            verdict = self.classify(line)
+            if verdict.kind == LINE_TIME:
+                lesson_info["start_time"] = verdict.value
+                if verdict.extra is not None:
+                    lesson_info["end_time"] = verdict.extra
+            elif verdict.kind == LINE_ROOM:
+                lesson_info["room"] = verdict.value
+            elif verdict.kind == LINE_HOMEWORK:
+                lesson_info["homework"] = verdict.value
+            elif verdict.kind == LINE_TEACHER:
+                lesson_info["teacher"] = verdict.value
+
+        # Если имя учителя слишком длинное, возможно это домашнее задание
+        if len(lesson_info["teacher"]) > 50 and lesson_info["homework"] == NOT_SPECIFIED:
+            lesson_info["homework"] = lesson_info["teacher"]
+            lesson_info["teacher"] = NOT_SPECIFIED
+
+        return lesson_info
+
+
+# Общий экземпляр классификатора
+line_classifier = LessonLineClassifier()
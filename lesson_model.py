@@ -0,0 +1,194 @@
+import json
+import re
+from datetime import time as dtime
+from typing import NamedTuple, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен, без него кэш сохраняется в JSON
+    msgpack = None
+
+# Значение, которым скрейпер обозначает отсутствующие поля
+NOT_SPECIFIED = "Не указано"
+
+# Версия формата сериализации кэша
+CACHE_FORMAT_VERSION = 1
+
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})")
+
+
+def parse_time(value):
+    """
+    Преобразует строку вида "08:30" в datetime.time (None, если время не указано)
+    """
+    if not value or value == NOT_SPECIFIED:
+        return None
+    if isinstance(value, dtime):
+        return value
+    match = _TIME_RE.search(value)
+    if not match:
+        return None
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 23 or minutes > 59:
+        return None
+    return dtime(hours, minutes)
+
+
+def _optional(value):
+    """
+    Заменяет строку-заглушку "Не указано" и пустые строки на None
+    """
+    if value is None or value == NOT_SPECIFIED:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _to_minutes(value):
+    return None if value is None else value.hour * 60 + value.minute
+
+
+def _from_minutes(value):
+    return None if value is None else dtime(value // 60, value % 60)
+
+
+class Lesson(NamedTuple):
+    """
+    Урок. Отсутствующие поля имеют значение None, время - datetime.time
+    """
+    subject: str
+    start_time: Optional[dtime] = None
+    end_time: Optional[dtime] = None
+    room: Optional[str] = None
+    teacher: Optional[str] = None
+    homework: Optional[str] = None
+    lesson_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Создает урок из словаря в формате скрейпера
+        """
+        return cls(
+            subject=str(data.get("subject") or "").strip(),
+            start_time=parse_time(data.get("start_time")),
+            end_time=parse_time(data.get("end_time")),
+            room=_optional(data.get("room")),
+            teacher=_optional(data.get("teacher")),
+            homework=_optional(data.get("homework")),
+            lesson_id=_optional(data.get("lesson_id")),
+        )
+
+    def to_dict(self):
+        """
+        Возвращает словарь в формате скрейпера (со строками "Не указано")
+        """
+        return {
+            "subject": self.subject,
+            "start_time": self.start_time.strftime("%H:%M") if self.start_time else NOT_SPECIFIED,
+            "end_time": self.end_time.strftime("%H:%M") if self.end_time else NOT_SPECIFIED,
+            "room": self.room or NOT_SPECIFIED,
+            "teacher": self.teacher or NOT_SPECIFIED,
+            "homework": self.homework or NOT_SPECIFIED,
+        }
+
+    @property
+    def has_homework(self):
+        """
+        Есть ли у урока домашнее задание, которое нужно выполнить
+        """
+        if not self.homework:
+            return False
+        homework_lower = self.homework.lower()
+        return "нет" not in homework_lower and "без" not in homework_lower
+
+    @property
+    def time_range(self):
+        """
+        Время урока в виде строки " ⏰ 08:30 - 09:15" (пустая строка, если время не указано)
+        """
+        if self.start_time is None:
+            return ""
+        result = f" ⏰ {self.start_time.strftime('%H:%M')}"
+        if self.end_time is not None:
+            result += f" - {self.end_time.strftime('%H:%M')}"
+        return result
+
+    def pack(self):
+        return [self.subject, _to_minutes(self.start_time), _to_minutes(self.end_time),
+                self.room, self.teacher, self.homework, self.lesson_id]
+
+    @classmethod
+    def unpack(cls, data):
+        subject, start, end, room, teacher, homework, lesson_id = data
+        return cls(subject, _from_minutes(start), _from_minutes(end), room, teacher, homework, lesson_id)
+
+
+class DaySchedule(NamedTuple):
+    """
+    Расписание на день: дата (DD-MM-YYYY), уроки и время получения
+    """
+    date: str
+    lessons: Tuple[Lesson, ...]
+    timestamp: float
+
+    def pack(self):
+        return [self.date, self.timestamp, [lesson.pack() for lesson in self.lessons]]
+
+    @classmethod
+    def unpack(cls, data):
+        date_str, timestamp, lessons = data
+        return cls(date_str, tuple(Lesson.unpack(lesson) for lesson in lessons), timestamp)
+
+
+def lessons_from_dicts(lessons):
+    """
+    Преобразует список словарей скрейпера в кортеж уроков
+    """
+    if not lessons:
+        return ()
+    return tuple(lesson if isinstance(lesson, Lesson) else Lesson.from_dict(lesson) for lesson in lessons)
+
+
+def dumps_cache(cache):
+    """
+    Сериализует кэш расписания {date: DaySchedule} в байты (msgpack, если доступен, иначе JSON)
+    """
+    payload = [CACHE_FORMAT_VERSION, [day.pack() for day in cache.values()]]
+    if msgpack is not None:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads_cache(data):
+    """
+    Восстанавливает кэш расписания из байтов, созданных dumps_cache
+    """
+    if data[:1] in (b"[", b"{"):
+        payload = json.loads(data.decode("utf-8"))
+    elif msgpack is not None:
+        payload = msgpack.unpackb(data, raw=False)
+    else:
+        raise ValueError("Кэш сохранен в формате msgpack, но модуль msgpack не установлен")
+
+    version, days = payload
+    if version != CACHE_FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия формата кэша: {version}")
+    result = {}
+    for packed in days:
+        day = DaySchedule.unpack(packed)
+        result[day.date] = day
+    return result
+
+
+def migrate_legacy_cache(legacy_cache):
+    """
+    Преобразует старый кэш {date: {'data': [dict, ...], 'timestamp': float}} в {date: DaySchedule}
+    """
+    result = {}
+    for date_str, entry in legacy_cache.items():
+        try:
+            result[date_str] = DaySchedule(date_str, lessons_from_dicts(entry.get('data')), entry['timestamp'])
+        except (KeyError, TypeError, AttributeError):
+            continue
+    return result
@@ -0,0 +1,117 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Следит за задержкой цикла событий asyncio.
+
+    Фоновая задача засыпает на interval секунд и измеряет, насколько позже она
+    просыпается: это время цикл был занят синхронной работой (pickle, разбор,
+    форматирование) и не обслуживал других пользователей.
+
+    Если задан block_threshold (режим отладки), отдельный поток-сторож проверяет,
+    что задача продолжает просыпаться. Если цикл не отвечает дольше порога, сторож
+    записывает в лог стек потока цикла событий в этот момент - по нему видно,
+    какой код держит цикл. После освобождения цикла в лог пишется длительность блокировки.
+    """
+
+    def __init__(self, interval=0.5, block_threshold=None, lag_histogram=None, blocks_counter=None,
+                 max_samples=10000):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lag_histogram = lag_histogram
+        self.blocks_counter = blocks_counter
+        # Последние измерения задержки (для отчетов и нагрузочного теста)
+        self.samples = collections.deque(maxlen=max_samples)
+        self.max_lag = 0.0
+        self.blocks = 0
+        self.last_block_stack = None
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._stall_reported = False
+
+    def start(self):
+        """
+        Запускает измерения (вызывается из работающего цикла событий)
+        """
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.block_threshold:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+            logger.info(f"Включен поиск блокировок цикла событий дольше {self.block_threshold:g} с")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self):
+        """
+        Сбрасывает накопленные измерения (например, между ступенями нагрузочного теста)
+        """
+        self.samples.clear()
+        self.max_lag = 0.0
+        self.blocks = 0
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if self.lag_histogram is not None:
+                self.lag_histogram.observe(lag)
+            if self.block_threshold and lag >= self.block_threshold:
+                self.blocks += 1
+                if self.blocks_counter is not None:
+                    self.blocks_counter.inc()
+                logger.warning(f"Цикл событий был заблокирован на {lag:.2f} с")
+            self._stall_reported = False
+
+    def _watch(self):
+        check_interval = max(0.01, self.block_threshold / 4)
+        while not self._stopped.wait(check_interval):
+            stalled = time.monotonic() - self._heartbeat - self.interval
+            if stalled < self.block_threshold or self._stall_reported:
+                continue
+            # Фиксируем стек один раз за блокировку: дальше он обычно не меняется
+            self._stall_reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self.last_block_stack = "".join(traceback.format_stack(frame))
+            logger.warning(f"Цикл событий не отвечает {stalled:.2f} с, стек:\n{self.last_block_stack}")
+
+
+def lag_percentile(samples, q):
+    """
+    Возвращает квантиль задержки по списку измерений (0, если их нет)
+    """
+    if not samples:
+        return 0.0
+    values = sorted(samples)
+    return values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))]
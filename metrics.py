@@ -0,0 +1,301 @@
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию (в секундах)
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values, **kwargs):
+        """
+        Возвращает метрику для конкретного набора значений меток
+        """
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def children(self):
+        """
+        Возвращает список пар (значения меток, метрика) в порядке значений меток
+        """
+        return sorted(self._children.items())
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"Метрика {self.name} требует указания меток {self.labelnames}")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """
+        Возвращает список строк (имя, метки, значение) для вывода в формате Prometheus
+        """
+        raise NotImplementedError
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """
+    Монотонно растущий счетчик
+    """
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    @property
+    def value(self):
+        return sum(child.value for child in list(self._children.values()))
+
+    def get(self, *values):
+        """
+        Возвращает значение счетчика для набора значений меток (0, если его еще не было)
+        """
+        child = self._children.get(tuple(str(value) for value in values))
+        return child.value if child is not None else 0
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labelnames, values), child.value)
+                for values, child in list(self._children.items())]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        """
+        Оценивает квантиль по корзинам (верхняя граница корзины, в которую он попадает)
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class _Timer:
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.target.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(_Metric):
+    """
+    Распределение значений по корзинам (для длительностей операций)
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        """
+        Контекстный менеджер, измеряющий длительность блока
+        """
+        return _Timer(self._default())
+
+    def samples(self):
+        result = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(child.buckets, child.counts):
+                cumulative += count
+                result.append((f"{self.name}_bucket",
+                               _format_labels(self.labelnames, values, ("le", _format_value(float(bound)))),
+                               cumulative))
+            labels = _format_labels(self.labelnames, values)
+            result.append((f"{self.name}_sum", labels, child.sum))
+            result.append((f"{self.name}_count", labels, child.count))
+        return result
+
+
+class FunctionMetric(_Metric):
+    """
+    Метрика, значение которой вычисляется функцией при каждом чтении
+    (например, размер очереди или число попаданий в кэш)
+    """
+
+    def __init__(self, name, documentation, func, kind="gauge"):
+        super().__init__(name, documentation)
+        self.func = func
+        self.kind = kind
+
+    @property
+    def value(self):
+        return self.func()
+
+    def samples(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.error(f"Ошибка при вычислении метрики {self.name}: {e}")
+            return []
+        if value is None:
+            return []
+        return [(self.name, "", value)]
+
+
+class MetricsRegistry:
+    """
+    Набор метрик приложения
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_function(self, name, documentation, func):
+        return self._register(FunctionMetric(name, documentation, func, "gauge"))
+
+    def counter_function(self, name, documentation, func):
+        return self._register(FunctionMetric(name, documentation, func, "counter"))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """
+        Возвращает все метрики в текстовом формате Prometheus
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Реестр метрик бота
+registry = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = registry
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Не засоряем лог бота запросами сборщика метрик
+        pass
+
+
+def start_http_server(port, host="127.0.0.1", metrics_registry=registry):
+    """
+    Запускает HTTP-сервер с метриками (/metrics) в фоновом потоке
+    Возвращает объект сервера (для остановки - server.shutdown())
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": metrics_registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    logger.info(f"Метрики доступны по адресу http://{host}:{server.server_address[1]}/metrics")
+    return server
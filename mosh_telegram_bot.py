@@ -5,10 +5,36 @@ from datetime import datetime, timedelta, date
 import calendar
 import pickle
 import time
+import functools
+import gc
+import sys
+import secrets
+import contextvars
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes, ConversationHandler
-from mosreg_schedule_selenium import MosregSchedule
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultArticle, InputTextMessageContent
+from telegram.error import Forbidden
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler, MessageHandler, filters, ContextTypes, ConversationHandler
+from accounts import AccountRegistry, SessionPool, class_key_from_info
+import scrape_workers
+from scrape_workers import ScrapeWorkerPool, ScrapeWorkerError, ScrapeTimeout, ScrapeQueueFull
+from circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+from fetch_scheduler import (FetchScheduler, FetchDropped, fetch_priority, current_priority, PRIORITIES,
+                             PRIORITY_INTERACTIVE, PRIORITY_BROADCAST, PRIORITY_BACKGROUND)
+from render_cache import RenderCache, lessons_hash
+from subject_classifier import get_classifier, DEFAULT_IGNORE_RULES
+from lesson_model import DaySchedule, lessons_from_dicts, dumps_cache, loads_cache, migrate_legacy_cache
+from timetable_model import WeeklyTimetable
+from calendar_index import CalendarIndex, CalendarDay
+from expiring_dict import ExpiringDict
+import metrics
+from tracing import tracer, traced, span, current_span, wrap_context
+from progressive import MessageUpdater, partial_lessons
+from loop_monitor import LoopMonitor, lag_percentile
+from hw_status_store import HomeworkStatusStore
+from storage import open_storage, SharedDict
+from schedule_service import ScheduleServiceClient, ScheduleServiceError
+from refresh_governor import RefreshGovernor, SOURCE_RECENT, SOURCE_IN_FLIGHT
+from schedule_diff import diff_schedules, keys_for_subset, lesson_token, HOMEWORK_EVENTS, HOMEWORK_ADDED, HOMEWORK_CHANGED
 import concurrent.futures
 
 # Загрузка переменных окружения
@@ -26,142 +52,683 @@ WAITING_FOR_TIME = 2
 WAITING_FOR_CONFIRMATION = 3
 
 # Глобальный кэш для хранения расписания, чтобы не запрашивать его повторно
+# Ключ - дата в формате DD-MM-YYYY, значение - DaySchedule
 schedule_cache = {}
+# Имя файла для хранения кэша расписания (msgpack)
+CACHE_FILE = 'schedule_cache.bin'
+# Старый файл кэша в формате pickle (используется только для миграции)
+LEGACY_CACHE_FILE = 'schedule_cache.pkl'
 # Время жизни кэша в секундах (увеличено с 24 до 48 часов)
 CACHE_TTL = 172800  # 48 часов
 
+# Недельный шаблон расписания по последним TIMETABLE_WEEKS сохраненным дням каждого дня недели:
+# прогноз уроков на даты, которых еще нет в кэше (строится по schedule_cache)
+TIMETABLE_WEEKS = int(os.getenv("TIMETABLE_WEEKS", "4"))
+timetable = WeeklyTimetable(TIMETABLE_WEEKS)
+# Файл недельного шаблона (кэш расписания хранит только недавно полученные дни)
+TIMETABLE_FILE = 'timetable.pkl'
+# Сводка по месяцам для календаря (число уроков, ДЗ, дни без уроков), обновляется вместе с кэшем
+calendar_index = CalendarIndex()
+
 # Словарь для хранения настроек автоматических рассылок для групп
 group_subscriptions = {}
 # Имя файла для хранения настроек групп
 GROUP_SETTINGS_FILE = 'group_settings.pkl'
 
-# Глобальный экземпляр MosregSchedule для повторного использования
-scheduler_instance = None
-scheduler_last_used = 0
+# Правила игнорирования предметов для групп
+group_ignore_rules = {}
+# Имя файла для хранения правил игнорирования
+IGNORE_RULES_FILE = 'ignore_rules.pkl'
+
+# Адрес МЭШ (можно заменить на тестовый сервер)
+MOSREG_BASE_URL = os.getenv("MOSREG_BASE_URL", "https://authedu.mosreg.ru")
+
+# Учетные записи МЭШ (файл ACCOUNTS_FILE, по умолчанию одна учетная запись с cookies.json)
+ACCOUNTS_FILE = os.getenv("ACCOUNTS_FILE", "accounts.json")
+accounts = AccountRegistry.load(ACCOUNTS_FILE)
+# Привязка чатов и пользователей к учетным записям, заданная командой /account
+chat_accounts = {}
+# Имя файла для хранения привязки чатов к учетным записям
+ACCOUNT_SETTINGS_FILE = 'chat_accounts.pkl'
+# Классы учетных записей, определенные по школе и классу из дневника
+# (если класс не задан в ACCOUNTS_FILE): ученики одного класса используют общий кэш расписания
+account_classes = {}
+# Имя файла для хранения определенных классов
+ACCOUNT_CLASSES_FILE = 'account_classes.pkl'
+# Через сколько секунд повторять неудачное определение класса (до этого учетная запись - отдельный класс)
+CLASS_DETECT_RETRY = 3600
+class_detect_failures = {}
+
+# Открытые сеансы MosregSchedule (браузеры) по учетным записям для повторного использования
 SCHEDULER_TIMEOUT = 600  # 10 минут неактивности до закрытия
+# Сколько браузеров разных учетных записей может быть открыто одновременно
+MAX_BROWSER_SESSIONS = int(os.getenv("MAX_BROWSER_SESSIONS", "2"))
+scraper_sessions = SessionPool(MAX_BROWSER_SESSIONS, SCHEDULER_TIMEOUT)
+# Браузер учетной записи запускает один запрос, остальные ждут его
+browser_start_locks = {}
+
+# Получение расписания в отдельных процессах со своими браузерами (0 - в потоках бота):
+# зависший браузер завершается по таймауту и не занимает место, процесс перезапускается
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "0"))
+# Время на один запрос к МЭШ, с
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "30"))
+# Сколько запросов может ждать свободного процесса (остальные сразу получают устаревший кэш)
+SCRAPE_QUEUE_MAX = int(os.getenv("SCRAPE_QUEUE_MAX", "20"))
+
+# Предохранители запросов к МЭШ и к сервису расписания: если среди последних запросов
+# доля ошибок и таймаутов не меньше BREAKER_FAILURE_RATE, запросы приостанавливаются
+# (пауза от BREAKER_BACKOFF до BREAKER_MAX_BACKOFF секунд), а пользователи сразу
+# получают сохраненное расписание
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "4"))
+BREAKER_BACKOFF = float(os.getenv("BREAKER_BACKOFF", "30"))
+BREAKER_MAX_BACKOFF = float(os.getenv("BREAKER_MAX_BACKOFF", "600"))
+# Источник ответа, когда источник данных недоступен: сохраненное (возможно, устаревшее) расписание
+SOURCE_STALE = "stale"
+
+# Очередь запросов к МЭШ с приоритетами: нажатия пользователей, затем рассылки, затем фоновая работа.
+# Одновременно выполняется FETCH_CONCURRENCY запросов (по умолчанию - по числу процессов
+# SCRAPE_WORKERS или потоков пула), рассылки занимают не больше FETCH_BROADCAST_LIMIT мест,
+# фоновые проверки - не больше FETCH_BACKGROUND_LIMIT; фоновый запрос, не дождавшийся места
+# за FETCH_BACKGROUND_DEADLINE секунд, отменяется (ответ из кэша)
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "0")) or SCRAPE_WORKERS or 4
+FETCH_BROADCAST_LIMIT = int(os.getenv("FETCH_BROADCAST_LIMIT", "2"))
+FETCH_BACKGROUND_LIMIT = int(os.getenv("FETCH_BACKGROUND_LIMIT", "1"))
+FETCH_BACKGROUND_DEADLINE = float(os.getenv("FETCH_BACKGROUND_DEADLINE", "120"))
+FETCH_BACKGROUND_QUEUE = int(os.getenv("FETCH_BACKGROUND_QUEUE", "20"))
+# Источник ответа, когда фоновый запрос снят с очереди
+SOURCE_DROPPED = "dropped"
+
+# Постепенный ответ на нажатие даты: сразу показывается сохраненное расписание или обычные
+# уроки этого дня недели, затем уже разобранные уроки и итоговое расписание. Сообщение
+# изменяется не чаще раза в PROGRESSIVE_EDIT_INTERVAL секунд (0 - отключить промежуточные версии)
+PROGRESSIVE_EDIT_INTERVAL = float(os.getenv("PROGRESSIVE_EDIT_INTERVAL", "1.0"))
+
+# Inline-режим (@бот завтра, @бот 15.03, @бот алгебра): ответ только из кэша и прогноза за
+# INLINE_BUDGET секунд; Telegram кэширует ответ INLINE_CACHE_TIME секунд, а ответ с прогнозом
+# или без расписания - INLINE_MISS_CACHE_TIME (расписание тем временем загружается в фоне)
+INLINE_BUDGET = float(os.getenv("INLINE_BUDGET", "0.2"))
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+INLINE_MISS_CACHE_TIME = int(os.getenv("INLINE_MISS_CACHE_TIME", "10"))
+# Сколько дней вперед просматривается при поиске предмета и сколько из них загружается в фоне
+INLINE_SEARCH_DAYS = int(os.getenv("INLINE_SEARCH_DAYS", "14"))
+INLINE_PREFETCH_DAYS = int(os.getenv("INLINE_PREFETCH_DAYS", "3"))
 
 # Глобальный пул потоков для параллельного получения данных
-thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(4, FETCH_CONCURRENCY))
 
-# Словарь для хранения времени последнего обновления расписания для каждого пользователя и даты
-last_refresh_times = {}
+# Кулдаун для кнопки обновления в секундах (5 минут) - ограничение для пользователя
+REFRESH_COOLDOWN = 300
+# Максимальное число одновременно отслеживаемых кулдаунов (пар пользователь-дата)
+REFRESH_COOLDOWN_MAX_ENTRIES = 10000
+# Время последнего обновления расписания для каждого пользователя и даты
+# (записи удаляются по истечении кулдауна)
+last_refresh_times = ExpiringDict(ttl=REFRESH_COOLDOWN, max_entries=REFRESH_COOLDOWN_MAX_ENTRIES)
 # Словарь для хранения реального времени последнего обновления расписания для каждой даты
 last_update_times = {}
-# Кулдаун для кнопки обновления в секундах (5 минут)
-REFRESH_COOLDOWN = 300
+# Если дату обновлял кто-то другой за это время (в секундах), повторный запрос к МЭШ не выполняется
+REFRESH_SHARE_WINDOW = 120
+# Ограничитель обновлений по дате, общий для всех пользователей
+refresh_governor = RefreshGovernor(share_window=REFRESH_SHARE_WINDOW)
+# Одновременные определения класса одной учетной записи объединяются
+class_detector = RefreshGovernor(share_window=0)
 # Имя файла для хранения времени последнего обновления
 LAST_UPDATE_FILE = 'last_update_times.pkl'
-# Имя файла для хранения статуса домашних заданий
-HW_STATUS_FILE = 'hw_status.pkl'
+# Файлы для хранения статуса домашних заданий: снимок и журнал изменений
+HW_STATUS_FILE = 'hw_status.bin'
+HW_STATUS_JOURNAL_FILE = 'hw_status.journal'
+# Старый файл статусов в формате pickle (используется только для миграции)
+LEGACY_HW_STATUS_FILE = 'hw_status.pkl'
+# Сколько изменений накапливается в журнале до записи полного снимка
+HW_STATUS_COMPACT_AFTER = 500
 
-# Словарь для хранения статуса домашних заданий для пользователей
-hw_status_data = {}
+# Общее хранилище настроек чатов и отметок ДЗ для нескольких процессов-обработчиков
+# (например, sqlite:///data/bot.db); если не задано, состояние хранится в файлах pickle процесса
+STORAGE_URL = os.getenv("STORAGE_URL")
+storage = open_storage(STORAGE_URL)
 
-# Функция для инициализации или получения существующего экземпляра планировщика
-async def get_scheduler():
-    global scheduler_instance, scheduler_last_used
-    
-    current_time = time.time()
-    
-    # Если экземпляр не существует или прошло слишком много времени с последнего использования
-    if scheduler_instance is None or current_time - scheduler_last_used > SCHEDULER_TIMEOUT:
-        # Закрываем старый экземпляр, если он существует
-        if scheduler_instance is not None:
-            try:
-                scheduler_instance.close()
-            except Exception as e:
-                logger.error(f"Ошибка при закрытии старого экземпляра: {e}")
+# Адрес сервиса расписания (schedule_service.py). Если задан, процесс работает как обработчик
+# Telegram без собственного браузера: расписание запрашивается у сервиса, а в памяти хранится только копия
+SCHEDULE_SERVICE_URL = os.getenv("SCHEDULE_SERVICE_URL")
+schedule_client = ScheduleServiceClient(SCHEDULE_SERVICE_URL) if SCHEDULE_SERVICE_URL else None
+
+# Выполнять ли в этом процессе рассылки в группы и проверку изменений ДЗ
+# (при нескольких обработчиках задачи должны работать только в одном из них)
+RUN_JOBS = os.getenv("RUN_JOBS", "1") != "0"
+
+# Статусы домашних заданий пользователей (битовая маска на пользователя и дату)
+hw_status_store = HomeworkStatusStore(HW_STATUS_FILE, HW_STATUS_JOURNAL_FILE, compact_after=HW_STATUS_COMPACT_AFTER,
+                                      backend=storage)
+
+# Кэш готовых сообщений и клавиатур для календаря, расписания и ДЗ
+render_cache = RenderCache()
+
+# Чаты (пользователи и группы), подписанные на уведомления об изменениях ДЗ
+homework_subscribers = {}
+# Имя файла для хранения подписок на уведомления
+NOTIFY_SETTINGS_FILE = 'notify_subscriptions.pkl'
+# Интервал запуска фоновой проверки изменений ДЗ в секундах
+WATCH_TICK = 60
+# На сколько дней вперед проверяются изменения ДЗ
+WATCH_DAYS = 7
+# Сколько дат проверяется за один запуск (каждая проверка - запрос к МЭШ)
+WATCH_MAX_PER_TICK = 1
+# Границы интервала между проверками одной даты в секундах
+WATCH_MIN_INTERVAL = 900  # 15 минут
+WATCH_MAX_INTERVAL = 6 * 3600  # 6 часов
+# Время следующей проверки и число проверок подряд без изменений для каждой даты
+watch_next_poll = {}
+watch_unchanged_streak = {}
+# Уроки даты, о ДЗ которых подписчики уже знают (ключ кэша -> уроки). Изменения ищутся
+# относительно них: кэш может обновить не только фоновая проверка, но и нажатие даты,
+# кнопка «Обновить», inline-запрос или рассылка в группы
+homework_snapshots = {}
+
+# Идентификаторы пользователей Telegram с доступом к служебным командам (через запятую)
+ADMIN_IDS = {item.strip() for item in os.getenv("ADMIN_IDS", "").split(",") if item.strip()}
+
+# Порт локального HTTP-сервера с метриками (/metrics); если не задан, сервер не запускается
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Трассировка запросов: файл JSONL для всех трасс (если не задан, трассы не записываются)
+# и порог в секундах, начиная с которого запрос записывается в лог как медленный
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", "20"))
+tracer.configure(export_path=TRACE_FILE, slow_threshold=TRACE_SLOW_SECONDS)
+
+# Режим webhook: если задан публичный адрес WEBHOOK_URL (например, https://bot.example.com),
+# обновления принимаются встроенным HTTP-сервером на WEBHOOK_LISTEN:WEBHOOK_PORT вместо long polling.
+# Telegram подписывает запросы секретом WEBHOOK_SECRET (без него - случайный при каждом запуске)
+# и открывает не больше WEBHOOK_MAX_CONNECTIONS соединений одновременно
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Число одновременно обрабатываемых обновлений (0 - по одному); по умолчанию 64 в режиме webhook
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES") or (64 if WEBHOOK_URL else 0))
+
+# Контроль цикла событий: период измерения задержки в секундах и порог блокировки
+# (если порог задан, при блокировке дольше него в лог записывается стек - режим отладки)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+LOOP_BLOCK_SECONDS = float(os.getenv("LOOP_BLOCK_SECONDS") or 0) or None
+
+# Метрики бота
+SCHEDULE_REQUESTS = metrics.registry.counter(
+    "schedule_requests_total", "Запросы расписания по источнику данных", ["source"])
+SCRAPE_REQUESTS = metrics.registry.counter(
+    "scrape_requests_total", "Запросы к МЭШ через Selenium по результату", ["outcome"])
+SCRAPE_DURATION = metrics.registry.histogram(
+    "scrape_duration_seconds", "Длительность получения расписания из МЭШ")
+BROWSER_STARTS = metrics.registry.counter(
+    "browser_starts_total", "Запуски браузера по причине", ["reason"])
+BROWSER_START_FAILURES = metrics.registry.counter(
+    "browser_start_failures_total", "Неудачные запуски браузера")
+BROWSER_START_DURATION = metrics.registry.histogram(
+    "browser_start_duration_seconds", "Длительность запуска браузера")
+BROADCAST_DURATION = metrics.registry.histogram(
+    "broadcast_duration_seconds", "Длительность рассылки", ["kind"])
+BROADCAST_MESSAGES = metrics.registry.counter(
+    "broadcast_messages_total", "Сообщения рассылок по результату", ["kind", "outcome"])
+EVENT_LOOP_LAG = metrics.registry.histogram(
+    "event_loop_lag_seconds", "Задержка цикла событий",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+EVENT_LOOP_BLOCKS = metrics.registry.counter(
+    "event_loop_blocks_total", "Блокировки цикла событий дольше LOOP_BLOCK_SECONDS")
+# Названия рассылок для /stats
+BROADCAST_NAMES = {"group_schedule": "Рассылки расписания в группы", "homework_notify": "Уведомления об изменениях ДЗ"}
+metrics.registry.gauge_function(
+    "thread_pool_queue_depth", "Задачи, ожидающие свободного потока", lambda: thread_pool._work_queue.qsize())
+metrics.registry.gauge_function(
+    "thread_pool_threads", "Запущенные потоки пула", lambda: len(thread_pool._threads))
+metrics.registry.counter_function(
+    "render_cache_hits_total", "Попадания в кэш готовых сообщений", lambda: render_cache.hits)
+metrics.registry.counter_function(
+    "render_cache_misses_total", "Промахи кэша готовых сообщений", lambda: render_cache.misses)
+metrics.registry.gauge_function(
+    "render_cache_entries", "Записи в кэше готовых сообщений", lambda: len(render_cache))
+metrics.registry.gauge_function(
+    "browser_sessions", "Открытые сеансы МЭШ (браузеры)", lambda: len(scraper_sessions))
+CIRCUIT_BREAKER_TRANSITIONS = metrics.registry.counter(
+    "circuit_breaker_transitions_total", "Переходы предохранителей источников данных", ["name", "state"])
+# Состояние предохранителя для метрик: 0 - закрыт, 1 - открыт, 2 - пробная попытка
+BREAKER_STATE_VALUES = {STATE_CLOSED: 0, STATE_OPEN: 1, STATE_HALF_OPEN: 2}
+metrics.registry.gauge_function(
+    "portal_breaker_state", "Состояние предохранителя запросов к МЭШ",
+    lambda: BREAKER_STATE_VALUES[portal_breaker.state])
+metrics.registry.gauge_function(
+    "schedule_service_breaker_state", "Состояние предохранителя запросов к сервису расписания",
+    lambda: BREAKER_STATE_VALUES[service_breaker.state])
+FETCH_QUEUE_WAIT = metrics.registry.histogram(
+    "fetch_queue_wait_seconds", "Ожидание места в очереди запросов к МЭШ", ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+FETCH_JOBS = metrics.registry.counter(
+    "fetch_jobs_total", "Запросы к МЭШ в очереди по классу и событию (started, dropped, promoted)",
+    ["priority", "event"])
+metrics.registry.gauge_function(
+    "fetch_queue_depth", "Запросы, ожидающие места в очереди запросов к МЭШ", lambda: fetch_scheduler.queue_depth())
+SCHEDULE_PREVIEWS = metrics.registry.counter(
+    "schedule_previews_total", "Предварительные ответы на нажатие даты по виду (cached, predicted, partial)", ["kind"])
+INLINE_QUERIES = metrics.registry.counter(
+    "inline_queries_total", "Inline-запросы по результату (cached, stale, predicted, miss, search, empty)", ["result"])
+INLINE_QUERY_DURATION = metrics.registry.histogram(
+    "inline_query_duration_seconds", "Подготовка ответа на inline-запрос",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+metrics.registry.gauge_function(
+    "schedule_prefetch_tasks", "Фоновые загрузки расписания по inline-запросам", lambda: len(prefetch_tasks))
+SCRAPE_WORKER_RESTARTS = metrics.registry.counter(
+    "scrape_worker_restarts_total", "Перезапуски процессов получения расписания по причине", ["reason"])
+metrics.registry.gauge_function(
+    "scrape_workers_alive", "Работающие процессы получения расписания",
+    lambda: scrape_pool.alive_count() if scrape_pool else 0)
+metrics.registry.gauge_function(
+    "scrape_queue_depth", "Запросы, ожидающие свободного процесса получения расписания",
+    lambda: scrape_pool.queue_depth if scrape_pool else 0)
+metrics.registry.gauge_function(
+    "schedule_cache_entries", "Дни в кэше расписания", lambda: len(schedule_cache))
+metrics.registry.gauge_function(
+    "process_resident_memory_bytes", "Размер резидентной памяти процесса", lambda: get_rss_bytes())
+
+# Монитор цикла событий (запускается после инициализации приложения)
+loop_monitor = LoopMonitor(LOOP_LAG_INTERVAL, LOOP_BLOCK_SECONDS, EVENT_LOOP_LAG, EVENT_LOOP_BLOCKS)
+
+# Пул процессов получения расписания (процессы запускаются при первом запросе к МЭШ)
+scrape_pool = ScrapeWorkerPool(
+    SCRAPE_WORKERS, scrape_workers.default_factory(MOSREG_BASE_URL), SCRAPE_TIMEOUT, SCRAPE_QUEUE_MAX,
+    SCHEDULER_TIMEOUT, on_restart=lambda reason: SCRAPE_WORKER_RESTARTS.labels(reason).inc(),
+) if SCRAPE_WORKERS > 0 else None
+
+def create_breaker(name):
+    return CircuitBreaker(
+        name, BREAKER_FAILURE_RATE, BREAKER_MIN_CALLS, backoff=BREAKER_BACKOFF, max_backoff=BREAKER_MAX_BACKOFF,
+        on_state_change=lambda name, state: CIRCUIT_BREAKER_TRANSITIONS.labels(name, state).inc())
+
+portal_breaker = create_breaker("portal")
+
+fetch_scheduler = FetchScheduler(
+    FETCH_CONCURRENCY,
+    limits={PRIORITY_BROADCAST: FETCH_BROADCAST_LIMIT, PRIORITY_BACKGROUND: FETCH_BACKGROUND_LIMIT},
+    deadlines={PRIORITY_BACKGROUND: FETCH_BACKGROUND_DEADLINE},
+    queue_limits={PRIORITY_BACKGROUND: FETCH_BACKGROUND_QUEUE},
+    wait_histogram=FETCH_QUEUE_WAIT, jobs_counter=FETCH_JOBS)
+service_breaker = create_breaker("schedule_service")
+
+# Названия дней недели
+WEEKDAY_NAMES = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+
+# Функция для инициализации или получения существующего экземпляра планировщика учетной записи
+@traced("get_scheduler")
+async def get_scheduler(account=None):
+    if account is None:
+        account = accounts.default
+    
+    # Если браузер учетной записи открыт и не простаивал слишком долго, используем его
+    scheduler, _ = scraper_sessions.get(account.name)
+    if scheduler is not None:
+        return scheduler
+    
+    lock = browser_start_locks.setdefault(account.name, asyncio.Lock())
+    async with lock:
+        # Браузер мог запустить другой запрос, пока мы ждали
+        scheduler, reason = scraper_sessions.get(account.name)
+        if scheduler is not None:
+            return scheduler
+        BROWSER_STARTS.labels(reason).inc()
         
         # Создаем новый экземпляр в отдельном потоке
         def create_scheduler():
-            try:
-                # Добавляем явную установку для Chrome и ChromeDriver
-                from webdriver_manager.chrome import ChromeDriverManager
-                from selenium import webdriver
-                from selenium.webdriver.chrome.service import Service
-
-                # Настройка опций Chrome
-                chrome_options = webdriver.ChromeOptions()
-                if True:  # headless=True по умолчанию
-                    chrome_options.add_argument('--headless')
-                chrome_options.add_argument('--no-sandbox')
-                chrome_options.add_argument('--disable-dev-shm-usage')
-                chrome_options.add_argument('--disable-gpu')
-                chrome_options.add_argument('--window-size=1920,1080')
-                
-                try:
-                    # Попытка использовать ChromeDriverManager
-                    service = Service(executable_path=ChromeDriverManager().install())
-                    browser = webdriver.Chrome(service=service, options=chrome_options)
-                    logger.info("ChromeDriver успешно запущен через ChromeDriverManager")
-                except Exception as driver_err:
-                    logger.error(f"Ошибка при установке через ChromeDriverManager: {driver_err}")
-                    # Резервный вариант - использовать локальный ChromeDriver или systemный Chrome
-                    try:
-                        # Пробуем использовать Chrome напрямую, если он установлен в системе
-                        browser = webdriver.Chrome(options=chrome_options)
-                        logger.info("Chrome запущен через системный браузер")
-                    except Exception as sys_err:
-                        logger.error(f"Не удалось запустить Chrome: {sys_err}")
-                        return None
-                        
-                # Инициализируем MosregSchedule с запущенным браузером
-                return MosregSchedule(browser=browser)
-            except Exception as e:
-                logger.error(f"Ошибка при создании экземпляра планировщика: {e}")
-                return None
+            return scrape_workers.create_scheduler(account, MOSREG_BASE_URL)
         
+        current_span().set(started=True, account=account.name)
         try:
-            scheduler_instance = await asyncio.get_event_loop().run_in_executor(thread_pool, create_scheduler)
-            if scheduler_instance is None:
+            with BROWSER_START_DURATION.time():
+                scheduler = await asyncio.get_event_loop().run_in_executor(thread_pool, create_scheduler)
+            if scheduler is None:
                 logger.error("Не удалось создать экземпляр планировщика")
+                BROWSER_START_FAILURES.inc()
                 return None
         except Exception as e:
             logger.error(f"Исключение при создании экземпляра планировщика: {e}")
+            BROWSER_START_FAILURES.inc()
             return None
-    
-    # Обновляем время последнего использования
-    scheduler_last_used = current_time
-    return scheduler_instance
+        
+        # Сохраняем сеанс (давно не использованный браузер другой учетной записи может быть закрыт)
+        scraper_sessions.put(account.name, scheduler)
+    return scheduler
+
+async def resolve_account(account):
+    """
+    Возвращает учетную запись с известным классом. Класс, не заданный в ACCOUNTS_FILE,
+    определяется один раз по школе и классу из дневника; пока это не удалось,
+    учетная запись считается отдельным классом
+    """
+    if account.class_key is not None:
+        return account
+    # Пока МЭШ недоступен, класс не определяем (повторим, когда предохранитель закроется)
+    if not portal_breaker.is_open() and time.time() - class_detect_failures.get(account.name, 0) >= CLASS_DETECT_RETRY:
+        fetch_scheduler.promote(f"class:{account.name}")
+        class_key, _ = await class_detector.run(account.name, lambda: detect_account_class(account))
+        if class_key is not None:
+            return accounts.get(account.name)
+    return account._replace(class_key=account_class_key(account))
+
+def account_class_key(account):
+    """
+    Класс учетной записи для кэша; пока класс не определен (и не задан в ACCOUNTS_FILE),
+    учетная запись считается отдельным классом
+    """
+    return account.class_key or f"account:{account.name}"
+
+async def get_class_info(account):
+    """
+    Школа и класс учетной записи из дневника (None при ошибке)
+    """
+    if scrape_pool is not None:
+        try:
+            return await scrape_pool.run(account, "get_class_info")
+        except ScrapeWorkerError as e:
+            logger.error(f"Ошибка при определении класса учетной записи {account.name}: {e}")
+            return None
+    scheduler = await get_scheduler(account)
+    if scheduler is None:
+        return None
+    def get_class_info_blocking():
+        with scraper_sessions.lock(account.name):
+            return scheduler.get_class_info()
+    try:
+        return await asyncio.get_event_loop().run_in_executor(thread_pool, wrap_context(get_class_info_blocking))
+    except Exception as e:
+        logger.error(f"Ошибка при определении класса учетной записи {account.name}: {e}")
+        return None
+
+@traced("detect_class")
+async def detect_account_class(account):
+    """
+    Определяет класс учетной записи по дневнику и запоминает его
+    Возвращает ключ класса или None
+    """
+    info = None
+    try:
+        async with fetch_scheduler.slot(key=f"class:{account.name}"):
+            info = await get_class_info(account)
+    except FetchDropped as e:
+        # МЭШ занят запросами пользователей - определим класс при следующем запросе
+        logger.info(f"Определение класса учетной записи {account.name} отложено: {e}")
+        return None
+    
+    class_key = class_key_from_info(info)
+    if class_key is None:
+        logger.warning(f"Не удалось определить класс учетной записи {account.name}, "
+                       f"повторим через {CLASS_DETECT_RETRY // 60} мин.")
+        class_detect_failures[account.name] = time.time()
+        return None
+    
+    logger.info(f"Учетная запись {account.name}: класс {class_key}")
+    class_detect_failures.pop(account.name, None)
+    accounts.set_class(account.name, class_key)
+    account_classes[account.name] = class_key
+    save_account_classes()
+    return class_key
+
+def schedule_key(date, account=None):
+    """
+    Ключ кэша расписания: дата для класса учетной записи по умолчанию
+    (совместим с кэшем одной учетной записи) и "класс/дата" для остальных классов.
+    Учетная запись, класс которой еще не определен, считается отдельным классом
+    (как в resolve_account) - даже если класс по умолчанию тоже неизвестен
+    """
+    if account is None or account.name == accounts.default.name:
+        return date
+    class_key = account_class_key(account)
+    if class_key == accounts.default.class_key:
+        return date
+    return f"{class_key}/{date}"
+
+def schedule_key_date(key):
+    """
+    Дата (DD-MM-YYYY) из ключа кэша расписания
+    """
+    return key.rsplit("/", 1)[-1]
+
+def split_schedule_key(key):
+    """
+    Класс (None для класса по умолчанию) и дата из ключа кэша расписания
+    """
+    if "/" not in key:
+        return None, key
+    class_key, date_str = key.rsplit("/", 1)
+    return class_key, date_str
+
+def store_schedule(key, day):
+    """
+    Сохраняет расписание в кэш и учитывает его в недельном шаблоне
+    """
+    schedule_cache[key] = day
+    class_key, date_str = split_schedule_key(key)
+    timetable.observe(class_key, date_str, day.lessons)
+    calendar_index.update(class_key, date_str, day.lessons)
+    # Старые отметки ДЗ (одна учетная запись - класс по умолчанию) ждали расписания этой даты
+    if class_key is None and date_str in legacy_hw_dates:
+        migrate_legacy_hw_keys(date_str, day.lessons)
 
 # Функция для получения расписания
-async def get_schedule(date=None, force_refresh=False):
+async def get_schedule(date=None, force_refresh=False, account=None):
     """
     Асинхронная функция для получения расписания на указанную дату с использованием кэша
-    и прямого перехода на страницу нужного дня
+    и прямого перехода на страницу нужного дня (account - учетная запись МЭШ, None - по умолчанию)
+    """
+    lessons, _ = await fetch_schedule(date, force_refresh, account)
+    return lessons
+
+@traced("get_schedule")
+async def fetch_schedule(date=None, force_refresh=False, account=None):
+    """
+    Получает расписание на дату для класса учетной записи и сообщает, откуда взяты данные
+    Возвращает кортеж (lessons, source), где source - "cache", "fetched",
+    "in_flight" (присоединились к идущему запросу) или "recent" (дату только что обновил другой пользователь)
     """
-    global schedule_cache, last_update_times
     current_time = time.time()
     
     # Если дата не указана, используем сегодняшнюю
     if date is None:
         date = datetime.now().strftime("%d-%m-%Y")
+    if account is None:
+        account = accounts.default
+    trace_span = current_span()
+    trace_span.set(date=date, force_refresh=force_refresh, account=account.name)
+    
+    # Обработчик без собственного браузера получает расписание у сервиса расписания
+    if schedule_client is not None:
+        return await fetch_schedule_from_service(date, force_refresh, account)
+    
+    # Класс учетной записи, не заданный в настройках, определяется по дневнику
+    account = await resolve_account(account)
+    key = schedule_key(date, account)
     
     # Проверяем кэш, если не требуется принудительное обновление
-    if not force_refresh and date in schedule_cache and current_time - schedule_cache[date]['timestamp'] < CACHE_TTL:
+    if not force_refresh and key in schedule_cache and current_time - schedule_cache[key].timestamp < CACHE_TTL:
         logger.info(f"Используем кэшированное расписание для {date}")
-        return schedule_cache[date]['data']
+        SCHEDULE_REQUESTS.labels("cache").inc()
+        trace_span.set(source="cache")
+        return schedule_cache[key].lessons, "cache"
+    
+    # Принудительное обновление даты, которую только что получал кто-то другой, не запускаем повторно
+    if force_refresh and key in schedule_cache and refresh_governor.fetched_recently(key, current_time):
+        logger.info(f"Расписание на {date} недавно обновлялось, используем полученные данные")
+        refresh_governor.mark_recent()
+        SCHEDULE_REQUESTS.labels(SOURCE_RECENT).inc()
+        trace_span.set(source=SOURCE_RECENT)
+        return schedule_cache[key].lessons, SOURCE_RECENT
+    
+    # Одновременные запросы одной даты одного класса объединяются в одно получение данных;
+    # если этой даты уже ждет менее срочный запрос (фоновая проверка), он повышается до нашего класса
+    fetch_scheduler.promote(key)
+    fetched_before = refresh_governor.last_fetch_time(key)
+    try:
+        lessons, source = await refresh_governor.run(key, lambda: queued_load_schedule(date, account, key))
+    except CircuitOpenError as e:
+        # МЭШ недоступен - не ждем таймаута, сразу отдаем сохраненное расписание
+        return stale_schedule(key, e)
+    except FetchDropped as e:
+        # Фоновый запрос не дождался очереди - МЭШ занят запросами пользователей
+        return stale_schedule(key, e, SOURCE_DROPPED)
+    if refresh_governor.last_fetch_time(key) == fetched_before:
+        # МЭШ не ответил (таймаут, ошибка страницы) - load_schedule вернул сохраненное расписание
+        source = SOURCE_STALE
+    SCHEDULE_REQUESTS.labels(source).inc()
+    trace_span.set(source=source)
+    return lessons, source
+
+def stale_schedule(key, reason, source=SOURCE_STALE):
+    """
+    Ответ без запроса к источнику данных: сохраненное расписание (даже устаревшее) или пустой список
+    Возвращает кортеж (lessons, source)
+    """
+    logger.info(f"{reason}; используем сохраненное расписание для {key}")
+    SCHEDULE_REQUESTS.labels(source).inc()
+    current_span().set(source=source)
+    if key in schedule_cache:
+        return schedule_cache[key].lessons, source
+    return [], source
+
+async def queued_load_schedule(date, account, key):
+    """
+    Ждет места в очереди запросов к МЭШ (по классу запроса, см. fetch_priority) и получает расписание
+    """
+    async with fetch_scheduler.slot(key=key) as priority:
+        current_span().set(priority=priority)
+        return await load_schedule(date, account)
+
+def stale_notice():
+    """
+    Строка для ответа, показанного из сохраненного расписания
+    """
+    breaker = service_breaker if schedule_client is not None else portal_breaker
+    notice = "⚠️ МЭШ сейчас не отвечает, показано сохраненное расписание"
+    retry_after = breaker.retry_after()
+    if retry_after:
+        notice += f". Повторим запрос через {max(1, round(retry_after / 60))} мин."
+    return notice
+
+async def fetch_schedule_from_service(date, force_refresh=False, account=None):
+    """
+    Получает расписание у сервиса расписания и обновляет его копию в памяти процесса
+    Возвращает кортеж (lessons, source), как fetch_schedule
+    """
+    if account is None:
+        account = accounts.default
+    key = schedule_key(date, account)
+    trace_span = current_span()
+    try:
+        service_breaker.check()
+        with span("schedule_service"):
+            result = await schedule_client.get_schedule(date, force_refresh, account.name, current_priority())
+        day = DaySchedule.unpack(result["day"])
+        source = result["source"]
+        # Класс учетной записи определяет сервис
+        if result.get("class_key") and result["class_key"] != account.class_key:
+            account = accounts.set_class(account.name, result["class_key"])
+            key = schedule_key(date, account)
+    except CircuitOpenError as e:
+        return stale_schedule(key, e)
+    except (ScheduleServiceError, KeyError, TypeError, ValueError) as e:
+        logger.error(f"Не удалось получить расписание на {date} у сервиса расписания: {e}")
+        service_breaker.record_failure()
+        SCHEDULE_REQUESTS.labels("service_error").inc()
+        trace_span.set(source="service_error")
+        # Используем копию в памяти, даже устаревшую
+        if key in schedule_cache:
+            return schedule_cache[key].lessons, "cache"
+        return [], "service_error"
+    
+    service_breaker.record_success()
+    
+    # Расписание, которого нет в кэше сервиса (например, при ошибке МЭШ), не сохраняем
+    if day.timestamp:
+        cached = schedule_cache.get(key)
+        if cached is None or cached.timestamp != day.timestamp:
+            store_schedule(key, day)
+            render_cache.invalidate_date(date)
+        if result.get("updated"):
+            last_update_times[key] = result["updated"]
+    
+    SCHEDULE_REQUESTS.labels(source).inc()
+    trace_span.set(source=source)
+    return (schedule_cache[key].lessons if key in schedule_cache else day.lessons), source
+
+async def schedule_service_response(date, force_refresh=False, account_name=None, priority=None):
+    """
+    Ответ сервиса расписания (schedule_service.py): расписание в упакованном виде
+    (DaySchedule.pack), источник данных и сведения о последнем обновлении.
+    priority - класс запроса обработчика (нажатие, рассылка, фоновая проверка)
+    """
+    account = accounts.get(account_name) if account_name else accounts.default
+    if account is None:
+        raise ValueError(f"Неизвестная учетная запись МЭШ: {account_name}")
+    with fetch_priority(priority if priority in PRIORITIES else PRIORITY_INTERACTIVE):
+        account = await resolve_account(account)
+        key = schedule_key(date, account)
+        lessons, source = await fetch_schedule(date, force_refresh, account)
+    day = schedule_cache.get(key)
+    if day is None or day.lessons is not lessons:
+        day = DaySchedule(key, tuple(lessons or ()), 0)
+    return {"day": day.pack(), "source": source, "updated": last_update_times.get(key),
+            "class_key": account.class_key}
+
+@traced("load_schedule")
+async def load_schedule(date, account=None):
+    """
+    Получает расписание на дату из МЭШ под учетной записью и сохраняет его в кэш класса
+    """
+    global schedule_cache, last_update_times
+    current_time = time.time()
+    if account is None:
+        account = accounts.default
+    key = schedule_key(date, account)
     
-    # Если данных нет в кэше или они устарели, получаем новые
-    logger.info(f"Запрашиваем новое расписание для {date}")
+    # Пока МЭШ недоступен, не запрашиваем его и не перезапускаем браузер (CircuitOpenError)
+    portal_breaker.check()
     
-    # Получаем или создаем экземпляр планировщика
-    scheduler = await get_scheduler()
-    if scheduler is None:
-        logger.error("Не удалось получить экземпляр планировщика")
-        # Проверяем, есть ли кешированное расписание, даже устаревшее
-        if date in schedule_cache:
-            logger.info(f"Используем устаревшее кешированное расписание для {date}")
-            return schedule_cache[date]['data']
-        logger.warning(f"Нет кешированного расписания для {date}, возвращаем пустой список")
-        return []  # Возвращаем пустой список вместо None, чтобы избежать ошибок
+    # Если данных нет в кэше или они устарели, получаем новые
+    logger.info(f"Запрашиваем новое расписание для {key}")
+    
+    # Получаем или создаем экземпляр планировщика учетной записи
+    # (с SCRAPE_WORKERS браузер открывает процесс-исполнитель)
+    scheduler = None
+    if scrape_pool is None:
+        scheduler = await get_scheduler(account)
+        if scheduler is None:
+            logger.error("Не удалось получить экземпляр планировщика")
+            SCRAPE_REQUESTS.labels("no_browser").inc()
+            portal_breaker.record_failure()
+            # Проверяем, есть ли кешированное расписание, даже устаревшее
+            if key in schedule_cache:
+                logger.info(f"Используем устаревшее кешированное расписание для {date}")
+                return schedule_cache[key].lessons
+            logger.warning(f"Нет кешированного расписания для {date}, возвращаем пустой список")
+            return []  # Возвращаем пустой список вместо None, чтобы избежать ошибок
     
     # Преобразуем дату в формат, необходимый для URL (если требуется)
     day, month, year = date.split('-')
     formatted_date = f"{day}.{month}.{year}"
+    # Результат запроса для метрик: ok, empty, error, timeout или overloaded
+    outcome = "ok"
+    
+    async def get_schedule_in_worker():
+        nonlocal outcome
+        # Таймаут соблюдает пул: зависший процесс завершается вместе с браузером
+        lessons = await scrape_pool.run(account, "get_schedule", date)
+        if not lessons:
+            logger.warning(f"Получен пустой список уроков на {formatted_date}")
+            outcome = "empty"
+        return lessons_from_dicts(lessons) if lessons is not None else None
     
     # Используем ThreadPoolExecutor для запуска блокирующего кода в отдельном потоке
     def get_schedule_blocking():
+        nonlocal outcome
         try:
             # Добавляем диагностические сообщения
             logger.info(f"Получаем расписание на {formatted_date} через Selenium")
@@ -169,92 +736,192 @@ async def get_schedule(date=None, force_refresh=False):
             lessons = None
             
             try:
-                lessons = scheduler.get_schedule(date)
+                # Браузер учетной записи обслуживает один запрос за раз
+                with scraper_sessions.lock(account.name):
+                    lessons = scheduler.get_schedule(date)
                 logger.info(f"Успешно получено расписание на {formatted_date}")
                 
                 # Проверяем, что в расписании действительно есть уроки
                 if not lessons:
                     logger.warning(f"Получен пустой список уроков на {formatted_date}")
+                    outcome = "empty"
                 elif isinstance(lessons, list):
                     logger.info(f"Получено {len(lessons)} уроков на {formatted_date}")
                     for i, lesson in enumerate(lessons[:3], 1):  # Выводим первые 3 урока для проверки
                         logger.info(f"Урок {i}: {lesson.get('subject', 'Без названия')}")
+                
+                # Преобразуем словари скрейпера в компактные объекты уроков
+                if lessons is not None:
+                    lessons = lessons_from_dicts(lessons)
             except Exception as e:
                 logger.error(f"Ошибка при получении расписания через стандартный метод: {e}")
+                outcome = "error"
                 lessons = []  # Возвращаем пустой список вместо None
             
             return lessons
         except Exception as e:
             logger.error(f"Глобальная ошибка при получении расписания: {e}")
+            outcome = "error"
             return []  # Возвращаем пустой список вместо None
     
     # Запускаем блокирующий код в отдельном потоке с таймаутом
+    scrape_started = time.perf_counter()
     try:
-        # Увеличиваем таймаут до 30 секунд для запроса
-        lessons = await asyncio.wait_for(
-            asyncio.get_event_loop().run_in_executor(thread_pool, get_schedule_blocking),
-            timeout=30
-        )
-    except asyncio.TimeoutError:
+        # Таймаут запроса - SCRAPE_TIMEOUT (30 секунд по умолчанию)
+        # wrap_context передает текущую трассу в поток, чтобы этапы скрейпера попали в нее
+        with span("scrape"):
+            if scrape_pool is not None:
+                lessons = await get_schedule_in_worker()
+            else:
+                lessons = await asyncio.wait_for(
+                    asyncio.get_event_loop().run_in_executor(thread_pool, wrap_context(get_schedule_blocking)),
+                    timeout=SCRAPE_TIMEOUT
+                )
+        SCRAPE_DURATION.observe(time.perf_counter() - scrape_started)
+        SCRAPE_REQUESTS.labels(outcome).inc()
+        if outcome == "error":
+            # Ошибка страницы: сохраненное расписание не заменяем пустым
+            portal_breaker.record_failure()
+            if key in schedule_cache:
+                return schedule_cache[key].lessons
+            return []
+        portal_breaker.record_success()
+    except ScrapeQueueFull:
+        # Все процессы заняты и очередь заполнена - не ждем, отдаем то, что есть
+        logger.warning(f"Очередь запросов к МЭШ заполнена, расписание на {date} не обновлено")
+        SCRAPE_REQUESTS.labels("overloaded").inc()
+        # Запрос не дошел до МЭШ: если он был пробным, предохранитель ждет следующего
+        portal_breaker.release_probe()
+        if key in schedule_cache:
+            return schedule_cache[key].lessons
+        return []
+    except (asyncio.TimeoutError, ScrapeTimeout):
         logger.error(f"Таймаут при получении расписания для {date}")
+        SCRAPE_DURATION.observe(time.perf_counter() - scrape_started)
+        SCRAPE_REQUESTS.labels("timeout").inc()
+        portal_breaker.record_failure()
         # Проверяем, есть ли кешированное расписание, даже устаревшее
-        if date in schedule_cache:
+        if key in schedule_cache:
             logger.info(f"Используем устаревшее кешированное расписание для {date}")
-            return schedule_cache[date]['data']
+            return schedule_cache[key].lessons
         return []  # Возвращаем пустой список вместо None
     except Exception as e:
         logger.error(f"Необработанное исключение при получении расписания: {e}")
-        if date in schedule_cache:
-            return schedule_cache[date]['data']
+        SCRAPE_REQUESTS.labels("error").inc()
+        portal_breaker.record_failure()
+        if key in schedule_cache:
+            return schedule_cache[key].lessons
         return []  # Возвращаем пустой список вместо None
     
     # Сохраняем результат в кэш
     if lessons is not None:
-        schedule_cache[date] = {
-            'data': lessons,
-            'timestamp': current_time
-        }
-        
+        # Сравниваем с предыдущей версией расписания
+        previous = schedule_cache.get(key)
+        changes = diff_schedules(date, previous.lessons if previous else (), lessons)
+        store_schedule(key, DaySchedule(key, lessons, current_time))
+        # Дата получена: повторное обновление в течение REFRESH_SHARE_WINDOW не запускается
+        refresh_governor.mark_fetched(key)
+
         # Обновляем информацию о последнем обновлении
-        last_update_times[date] = {
+        last_update_times[key] = {
             'timestamp': current_time,
             'datetime': datetime.now().strftime("%d.%m.%Y %H:%M")
         }
         
         # Сохраняем информацию о последних обновлениях
-        save_last_update_times()
+        with span("save_last_update_times"):
+            save_last_update_times()
         
-        # Сохраняем кэш на диск для долговременного хранения
-        try:
-            with open('schedule_cache.pkl', 'wb') as f:
-                pickle.dump(schedule_cache, f)
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении кэша: {e}")
+        if previous is None or changes:
+            if changes:
+                logger.info(f"Изменения в расписании на {date}: " + ", ".join(f"{change.kind} {change.key}" for change in changes))
+            
+            # Готовые сообщения для этой даты больше не актуальны
+            render_cache.invalidate_date(date)
+            
+            # Сохраняем кэш на диск для долговременного хранения
+            with span("save_cache"):
+                save_cache()
+                save_timetable()
+        else:
+            logger.info(f"Расписание на {date} не изменилось")
     
     # Если мы получили пустой список, но в кеше есть данные для этой даты, используем их
-    if not lessons and date in schedule_cache:
+    if not lessons and key in schedule_cache:
         logger.info(f"Получен пустой список уроков, используем кеш для {date}")
-        return schedule_cache[date]['data']
+        return schedule_cache[key].lessons
             
     return lessons
 
 # Загрузка кэша при запуске
 def load_cache():
     global schedule_cache
+    load_timetable()
     try:
-        if os.path.exists('schedule_cache.pkl'):
-            with open('schedule_cache.pkl', 'rb') as f:
-                schedule_cache = pickle.load(f)
+        if os.path.exists(CACHE_FILE):
+            with open(CACHE_FILE, 'rb') as f:
+                schedule_cache = loads_cache(f.read())
                 logger.info(f"Загружен кэш расписания с {len(schedule_cache)} записями")
+        elif os.path.exists(LEGACY_CACHE_FILE):
+            # Переносим кэш из старого формата pickle
+            with open(LEGACY_CACHE_FILE, 'rb') as f:
+                schedule_cache = migrate_legacy_cache(pickle.load(f))
+            logger.info(f"Кэш расписания с {len(schedule_cache)} записями перенесен из {LEGACY_CACHE_FILE}")
+            save_cache()
     except Exception as e:
         logger.error(f"Ошибка при загрузке кэша: {e}")
         schedule_cache = {}
+    timetable.learn(schedule_cache, split_schedule_key)
+    calendar_index.clear()
+
+# Загрузка недельного шаблона расписания
+def load_timetable():
+    try:
+        if os.path.exists(TIMETABLE_FILE):
+            with open(TIMETABLE_FILE, 'rb') as f:
+                timetable.load(pickle.load(f))
+            logger.info(f"Загружен недельный шаблон расписания ({timetable.days_count()} дней)")
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке недельного шаблона расписания: {e}")
+
+# Сохранение недельного шаблона расписания
+def save_timetable():
+    if schedule_client is not None:
+        return
+    try:
+        with open(TIMETABLE_FILE, 'wb') as f:
+            pickle.dump(timetable.export(), f)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении недельного шаблона расписания: {e}")
+
+# Сохранение кэша расписания на диск
+def save_cache():
+    # Обработчик хранит только копию расписания, кэш на диске ведет сервис расписания
+    if schedule_client is not None:
+        return
+    try:
+        data = dumps_cache(schedule_cache)
+        with open(CACHE_FILE, 'wb') as f:
+            f.write(data)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении кэша: {e}")
+
+# Открытие общего словаря настроек; при первом запуске в него переносятся данные из файла pickle
+def load_shared_settings(namespace, legacy_file):
+    shared = SharedDict(storage, namespace)
+    if not len(shared) and os.path.exists(legacy_file):
+        with open(legacy_file, 'rb') as f:
+            shared.update_from(pickle.load(f))
+        logger.info(f"Данные {legacy_file} ({len(shared)} записей) перенесены в общее хранилище")
+    return shared
 
 # Загрузка настроек групп
 def load_group_settings():
     global group_subscriptions
     try:
-        if os.path.exists(GROUP_SETTINGS_FILE):
+        if storage is not None:
+            group_subscriptions = load_shared_settings("group_subscriptions", GROUP_SETTINGS_FILE)
+        elif os.path.exists(GROUP_SETTINGS_FILE):
             with open(GROUP_SETTINGS_FILE, 'rb') as f:
                 group_subscriptions = pickle.load(f)
                 logger.info(f"Загружены настройки для {len(group_subscriptions)} групп")
@@ -264,6 +931,9 @@ def load_group_settings():
 
 # Сохранение настроек групп
 def save_group_settings():
+    # В общем хранилище каждое изменение записывается сразу
+    if storage is not None:
+        return
     try:
         with open(GROUP_SETTINGS_FILE, 'wb') as f:
             pickle.dump(group_subscriptions, f)
@@ -271,21 +941,138 @@ def save_group_settings():
     except Exception as e:
         logger.error(f"Ошибка при сохранении настроек групп: {e}")
 
+# Загрузка правил игнорирования предметов
+def load_ignore_rules():
+    global group_ignore_rules
+    try:
+        if storage is not None:
+            group_ignore_rules = load_shared_settings("group_ignore_rules", IGNORE_RULES_FILE)
+        elif os.path.exists(IGNORE_RULES_FILE):
+            with open(IGNORE_RULES_FILE, 'rb') as f:
+                group_ignore_rules = pickle.load(f)
+                logger.info(f"Загружены правила игнорирования для {len(group_ignore_rules)} групп")
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке правил игнорирования: {e}")
+        group_ignore_rules = {}
+
+# Сохранение правил игнорирования предметов
+def save_ignore_rules():
+    # В общем хранилище каждое изменение записывается сразу
+    if storage is not None:
+        return
+    try:
+        with open(IGNORE_RULES_FILE, 'wb') as f:
+            pickle.dump(group_ignore_rules, f)
+        logger.info(f"Сохранены правила игнорирования для {len(group_ignore_rules)} групп")
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении правил игнорирования: {e}")
+
+# Загрузка подписок на уведомления об изменениях ДЗ
+def load_notify_settings():
+    global homework_subscribers
+    try:
+        if storage is not None:
+            homework_subscribers = load_shared_settings("homework_subscribers", NOTIFY_SETTINGS_FILE)
+        elif os.path.exists(NOTIFY_SETTINGS_FILE):
+            with open(NOTIFY_SETTINGS_FILE, 'rb') as f:
+                homework_subscribers = pickle.load(f)
+                logger.info(f"Загружены подписки на уведомления для {len(homework_subscribers)} чатов")
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке подписок на уведомления: {e}")
+        homework_subscribers = {}
+
+# Сохранение подписок на уведомления об изменениях ДЗ
+def save_notify_settings():
+    # В общем хранилище каждое изменение записывается сразу
+    if storage is not None:
+        return
+    try:
+        with open(NOTIFY_SETTINGS_FILE, 'wb') as f:
+            pickle.dump(homework_subscribers, f)
+        logger.info(f"Сохранены подписки на уведомления для {len(homework_subscribers)} чатов")
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении подписок на уведомления: {e}")
+
+# Загрузка привязки чатов к учетным записям МЭШ
+def load_account_settings():
+    global chat_accounts
+    try:
+        if storage is not None:
+            chat_accounts = load_shared_settings("chat_accounts", ACCOUNT_SETTINGS_FILE)
+        elif os.path.exists(ACCOUNT_SETTINGS_FILE):
+            with open(ACCOUNT_SETTINGS_FILE, 'rb') as f:
+                chat_accounts = pickle.load(f)
+                logger.info(f"Загружена привязка к учетным записям для {len(chat_accounts)} чатов")
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке привязки к учетным записям: {e}")
+        chat_accounts = {}
+
+# Загрузка классов учетных записей, определенных по дневнику
+def load_account_classes():
+    global account_classes
+    try:
+        if storage is not None:
+            account_classes = load_shared_settings("account_classes", ACCOUNT_CLASSES_FILE)
+        elif os.path.exists(ACCOUNT_CLASSES_FILE):
+            with open(ACCOUNT_CLASSES_FILE, 'rb') as f:
+                account_classes = pickle.load(f)
+    except Exception as e:
+        logger.error(f"Ошибка при загрузке классов учетных записей: {e}")
+        account_classes = {}
+    
+    # Класс, заданный в ACCOUNTS_FILE, важнее определенного ранее
+    for name, class_key in account_classes.items():
+        account = accounts.get(name)
+        if account is not None and account.class_key is None:
+            accounts.set_class(name, class_key)
+
+# Сохранение классов учетных записей
+def save_account_classes():
+    if storage is not None:
+        return
+    try:
+        with open(ACCOUNT_CLASSES_FILE, 'wb') as f:
+            pickle.dump(account_classes, f)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении классов учетных записей: {e}")
+
+# Сохранение привязки чатов к учетным записям МЭШ
+def save_account_settings():
+    # В общем хранилище каждое изменение записывается сразу
+    if storage is not None:
+        return
+    try:
+        with open(ACCOUNT_SETTINGS_FILE, 'wb') as f:
+            pickle.dump(chat_accounts, f)
+        logger.info(f"Сохранена привязка к учетным записям для {len(chat_accounts)} чатов")
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении привязки к учетным записям: {e}")
+
 # Получение русского названия дня недели
+@functools.lru_cache(maxsize=512)
 def get_weekday_name(date_str):
     """
     Получает русское название дня недели из строки даты формата DD.MM.YYYY
     """
-    weekday_names = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
     try:
         dt = datetime.strptime(date_str, "%d.%m.%Y")
-        return weekday_names[dt.weekday()]
+        return WEEKDAY_NAMES[dt.weekday()]
     except Exception as e:
         logger.error(f"Ошибка при получении дня недели: {e}")
         return ""
 
+# Разбор строки даты из callback_data
+@functools.lru_cache(maxsize=512)
+def parse_date_str(date_str):
+    """
+    Разбирает дату формата DD-MM-YYYY
+    Возвращает кортеж (date_readable, month, year), где date_readable - дата в формате DD.MM.YYYY
+    """
+    selected_date = datetime.strptime(date_str, "%d-%m-%Y")
+    return selected_date.strftime("%d.%m.%Y"), selected_date.month, selected_date.year
+
 # Форматирование расписания для отправки в сообщении
-def format_schedule(lessons, date_str):
+def format_schedule(lessons, date_str, classifier=None):
     """
     Форматирование расписания для отправки в сообщении
     Возвращает кортеж (message, lessons) где message - отформатированное сообщение,
@@ -295,21 +1082,17 @@ def format_schedule(lessons, date_str):
         weekday = get_weekday_name(date_str)
         return f"❌ На {date_str} ({weekday}) расписание не найдено или нет уроков.", None
     
-    # Фильтруем уроки, исключая те, что в списке игнорирования
+    if classifier is None:
+        classifier = get_classifier()
+    
+    # Классифицируем предметы один раз и исключаем те, что в списке игнорирования
     filtered_lessons = []
+    subject_infos = []
     for lesson in lessons:
-        subject = lesson['subject']
-        should_ignore = False
-        
-        # Проверяем начинается ли название предмета со слова "Группа"
-        if subject.lower().startswith("группа"):
-            # Но НЕ игнорируем те, что содержат "_РОВ"
-            if "_ров" not in subject.lower():
-                should_ignore = True
-                
-        # Добавляем урок в отфильтрованный список, только если его не нужно игнорировать
-        if not should_ignore:
+        info = classifier.classify(lesson.subject)
+        if not info.ignored:
             filtered_lessons.append(lesson)
+            subject_infos.append(info)
     
     # Если после фильтрации не осталось уроков
     if not filtered_lessons:
@@ -319,67 +1102,122 @@ def format_schedule(lessons, date_str):
     # Получаем день недели
     weekday = get_weekday_name(date_str)
     message = f"📅 *Расписание на {date_str} ({weekday})*\n\n"
-    
-    # Словарь эмодзи для предметов
-    subject_emojis = {
-        "математика": "🔢",
-        "алгебра": "🧮",
-        "геометрия": "📐",
-        "русский": "🇷🇺",
-        "литература": "📚",
-        "английский": "🇬🇧",
-        "иностранный": "🌍",
-        "история": "🏛️",
-        "обществознание": "👥",
-        "география": "🗺️",
-        "биология": "🧬",
-        "химия": "🧪",
-        "физика": "⚛️",
-        "информатика": "💻",
-        "физическая культура": "🏃‍♂️",
-        "физкультура": "🏋️",
-        "изо": "🎨",
-        "музыка": "🎵",
-        "технология": "🔧",
-        "обж": "🚨",
-        "группа": "👥"
-    }
-    
-    for i, lesson in enumerate(filtered_lessons, 1):
-        subject = lesson['subject']
-        
-        # Добавление специального эмодзи в зависимости от предмета
-        emoji = "📝"  # Эмодзи по умолчанию
-        for key, value in subject_emojis.items():
-            if key.lower() in subject.lower():
-                emoji = value
-                break
-        
-        message += f"{emoji} *{i}. {subject}*"
-        
-        if lesson['start_time'] != "Не указано":
-            time_str = f" ⏰ {lesson['start_time']}"
-            if lesson['end_time'] != "Не указано":
-                time_str += f" - {lesson['end_time']}"
-            message += time_str
-        
-        message += "\n"
+
+    for i, (lesson, info) in enumerate(zip(filtered_lessons, subject_infos), 1):
+        message += f"{info.emoji} *{i}. {lesson.subject}*{lesson.time_range}\n"
         
         # Добавляем домашнее задание с эмодзи
-        homework = lesson.get('homework', "Не указано")
-        if homework == "Не указано" or not homework:
-            homework = "без дз"
-            homework_emoji = "✅"
-        elif "нет" in homework.lower() or "без" in homework.lower():
-            homework_emoji = "✅"
-        else:
-            homework_emoji = "📒"
+        homework = lesson.homework or "без дз"
+        homework_emoji = "📒" if lesson.has_homework else "✅"
         
         message += f"{homework_emoji} ДЗ: {homework}\n\n"
     
     # Возвращаем отформатированное сообщение и отфильтрованные уроки
     return message, filtered_lessons
 
+def get_subject_classifier(chat_id=None):
+    """
+    Возвращает классификатор предметов с правилами игнорирования для чата
+    Для групп правила могут быть заданы командой /ignore, иначе используются стандартные
+    """
+    ignore_rules = None
+    if chat_id is not None:
+        ignore_rules = group_ignore_rules.get(str(chat_id))
+    return get_classifier(ignore_rules)
+
+def get_account(chat_id=None, user_id=None):
+    """
+    Возвращает учетную запись МЭШ для чата: сначала привязку чата, затем пользователя
+    (команда /account или файл учетных записей), иначе учетную запись по умолчанию
+    """
+    for key in (chat_id, user_id):
+        if key is None:
+            continue
+        name = chat_accounts.get(str(key)) or accounts.chats.get(str(key))
+        account = accounts.get(name) if name else None
+        if account is not None:
+            return account
+    return accounts.default
+
+def get_update_account(update):
+    """
+    Учетная запись МЭШ для чата и пользователя обновления
+    """
+    user = update.effective_user
+    return get_account(update.effective_chat.id, user.id if user else None)
+
+def render_schedule(lessons, date_str, classifier=None):
+    """
+    Возвращает результат format_schedule для даты формата DD-MM-YYYY, используя кэш
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    cache_key = (("schedule", classifier.key), date_str, lessons_hash(lessons), 0)
+    cached = render_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    date_readable, _, _ = parse_date_str(date_str)
+    result = format_schedule(lessons, date_readable, classifier)
+    render_cache.put(cache_key, result)
+    return result
+
+def schedule_is_fresh(date_str, account=None):
+    """
+    Есть ли в кэше не устаревшее расписание на дату (ответ будет без запроса к МЭШ)
+    """
+    key = schedule_key(date_str, account)
+    return key in schedule_cache and time.time() - schedule_cache[key].timestamp < CACHE_TTL
+
+def predict_schedule(date_str, account=None):
+    """
+    Прогноз расписания на дату по недельному шаблону класса учетной записи (PredictedDay или None)
+    """
+    class_key, _ = split_schedule_key(schedule_key(date_str, account))
+    return timetable.predict(class_key, date_str)
+
+def format_predicted_schedule(prediction, date_str, classifier=None, note="домашние задания загружаются"):
+    """
+    Сообщение с прогнозом расписания на дату (без домашних заданий)
+    Возвращает кортеж (message, lessons) как format_schedule
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    date_readable, _, _ = parse_date_str(date_str)
+    weekday = get_weekday_name(date_readable)
+    message = f"🔮 *Прогноз расписания на {date_readable} ({weekday})*\n"
+    message += f"_обычные уроки этого дня недели (по {prediction.days} нед.), {note}_\n\n"
+    shown = []
+    for lesson in prediction.lessons:
+        info = classifier.classify(lesson.subject)
+        if info.ignored:
+            continue
+        shown.append(lesson)
+        message += f"{info.emoji} *{len(shown)}. {lesson.subject}*{lesson.time_range}\n"
+    if not shown:
+        return None, ()
+    return message, tuple(shown)
+
+def schedule_preview(date_str, account=None, classifier=None):
+    """
+    Сообщение, которое можно показать сразу, пока расписание на дату загружается:
+    сохраненное (устаревшее) расписание этой даты или прогноз по недельному шаблону
+    Возвращает кортеж (message, lessons), где lessons - показанные уроки, или (None, ())
+    """
+    key = schedule_key(date_str, account)
+    if key in schedule_cache and schedule_cache[key].lessons:
+        message, shown = render_schedule(schedule_cache[key].lessons, date_str, classifier)
+        if shown:
+            SCHEDULE_PREVIEWS.labels("cached").inc()
+            return message + "\n\n⏳ Обновляю расписание...", tuple(shown)
+    prediction = predict_schedule(date_str, account)
+    if prediction is not None:
+        message, shown = format_predicted_schedule(prediction, date_str, classifier)
+        if message is not None:
+            SCHEDULE_PREVIEWS.labels("predicted").inc()
+            return message + "\n⏳ Получаю актуальное расписание...", shown
+    return None, ()
+
 # Обработчики команд бота
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -391,13 +1229,17 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "Я бот для получения расписания из МЭШ.\n\n"
         "Используйте следующие команды:\n"
         "/month - календарь на текущий месяц\n"
-        "/groups - настройка ежедневной отправки расписания на завтра в группу (только для администраторов)"
+        "/groups - настройка ежедневной отправки расписания на завтра в группу (только для администраторов)\n"
+        "/ignore - правила скрытия предметов в группе\n"
+        "/notify - уведомления о новых и измененных домашних заданиях"
     )
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Обработчик отмены ввода даты
     """
+    context.user_data.pop('chat_id', None)
+    context.user_data.pop('time', None)
     await update.message.reply_text("Операция отменена.")
     return ConversationHandler.END
 
@@ -425,16 +1267,76 @@ async def month_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     # Создаем календарь для этого месяца
     await show_calendar(update, context, month, year)
 
-async def show_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE, month, year):
+# Цифры для числа уроков у даты в календаре: по полученному расписанию и по прогнозу
+LESSON_COUNT_DIGITS = str.maketrans("0123456789", "⁰¹²³⁴⁵⁶⁷⁸⁹")
+PREDICTED_COUNT_DIGITS = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
+
+def calendar_days(month, year, account=None, classifier=None, user_id_str=None):
     """
-    Отображает календарь на указанный месяц
+    Отметки дат месяца для календаря по сводке calendar_index (без обращения к МЭШ):
+    число уроков по кэшу расписания, а для дат без него (начиная с сегодняшней) - по прогнозу
+    недельного шаблона, невыполненные ДЗ пользователя и дни без уроков
+    Возвращает словарь {день: CalendarDay}
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    class_key, _ = split_schedule_key(schedule_key(f"01-{month:02d}-{year}", account))
+
+    def lookup(date_str):
+        day = schedule_cache.get(schedule_key(date_str, account))
+        return None if day is None else day.lessons
+
+    summaries = calendar_index.month(class_key, month, year, classifier, lookup)
+    statuses = {}
+    if user_id_str is not None:
+        homework_dates = [f"{day:02d}-{month:02d}-{year}" for day, summary in summaries.items() if summary.homework]
+        statuses = hw_status_store.days_status(user_id_str, homework_dates) if homework_dates else {}
+
+    today = date.today()
+    first_weekday, days_in_month = calendar.monthrange(year, month)
+    result = {}
+    for day in range(1, days_in_month + 1):
+        summary = summaries.get(day)
+        if summary is not None:
+            status = statuses.get(f"{day:02d}-{month:02d}-{year}")
+            pending = sum(1 for key in summary.homework if not status.get(key)) if status is not None else 0
+            if summary.lessons or summary.holiday:
+                result[day] = CalendarDay(summary.lessons, False, pending, summary.holiday)
+        elif date(year, month, day) >= today:
+            weekday = (first_weekday + day - 1) % 7
+            count = calendar_index.predicted_count(
+                class_key, weekday, classifier,
+                lambda: getattr(predict_schedule(f"{day:02d}-{month:02d}-{year}", account), "lessons", None))
+            if count:
+                result[day] = CalendarDay(count, True, 0, False)
+    return result
+
+def render_calendar(month, year, account=None, classifier=None, user_id_str=None):
     """
+    Формирует заголовок и клавиатуру календаря на указанный месяц с отметками дат
+    (число уроков, невыполненные ДЗ пользователя, дни без уроков - см. calendar_days)
+    Результат кэшируется: сетка месяца с одинаковыми отметками общая для всех пользователей
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    today = date.today()
+    marks = calendar_days(month, year, account, classifier, user_id_str)
+    cache_key = (("calendar", classifier.key), f"{month:02d}-{year}", today.toordinal(), hash(tuple(sorted(marks.items()))))
+    cached = render_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     # Получаем информацию о месяце
     cal = calendar.monthcalendar(year, month)
     month_name = calendar.month_name[month]
     
     # Формируем заголовок календаря
     header = f"📅 *Календарь на {month_name} {year}*\n\n"
+    pending = sum(mark.pending for mark in marks.values())
+    if pending:
+        header += f"📒 Невыполненных ДЗ: {pending}\n"
+    if marks:
+        header += "_⁶ - уроков по расписанию, ₆ - по прогнозу, • - есть невыполненные ДЗ, 🌴 - нет уроков_\n"
     
     # Создаем клавиатуру для календаря
     keyboard = []
@@ -466,7 +1368,6 @@ async def show_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE, mont
     keyboard.append(days_row)
     
     # Добавляем дни месяца
-    today = date.today()
     for week in cal:
         week_row = []
         for day in week:
@@ -482,13 +1383,31 @@ async def show_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE, mont
                     day_text = f"✅{day}"
                 else:
                     day_text = str(day)
+                mark = marks.get(day)
+                if mark is not None and mark.holiday:
+                    day_text += "🌴"
+                elif mark is not None:
+                    day_text += str(mark.lessons).translate(PREDICTED_COUNT_DIGITS if mark.predicted else LESSON_COUNT_DIGITS)
+                    if mark.pending:
+                        day_text += "•"
                     
                 week_row.append(InlineKeyboardButton(day_text, callback_data=f"date_{callback_date}"))
         
         if week_row:  # Добавляем только непустые ряды
             keyboard.append(week_row)
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    result = (header, InlineKeyboardMarkup(keyboard))
+    render_cache.put(cache_key, result)
+    return result
+
+async def show_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE, month, year):
+    """
+    Отображает календарь на указанный месяц
+    """
+    user = update.effective_user
+    header, reply_markup = render_calendar(
+        month, year, get_update_account(update), get_subject_classifier(update.effective_chat.id),
+        str(user.id) if user else None)
     
     # Отправляем сообщение с календарем
     if update.callback_query:
@@ -506,15 +1425,18 @@ async def show_calendar(update: Update, context: ContextTypes.DEFAULT_TYPE, mont
             parse_mode="Markdown"
         )
 
+@traced("callback")
 async def calendar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Обработчик callback-запросов от календаря
     """
     query = update.callback_query
-    await query.answer()
+    with span("telegram.answer_callback"):
+        await query.answer()
     
     callback_data = query.data
     user_id = update.effective_user.id
+    current_span().set(data=callback_data, user=user_id)
     
     if callback_data.startswith("calendar_"):
         # Обработка навигации по календарю
@@ -535,7 +1457,7 @@ async def calendar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         # Проверяем, прошло ли достаточно времени с последнего обновления
         current_time = time.time()
-        last_refresh_time = last_refresh_times.get(refresh_key, 0)
+        last_refresh_time = last_refresh_times.get(refresh_key, 0, now=current_time)
         
         if current_time - last_refresh_time >= REFRESH_COOLDOWN:
             # Если прошло достаточно времени, изменяем текст кнопки на "Обновление..."
@@ -551,14 +1473,9 @@ async def calendar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 
             await query.edit_message_reply_markup(reply_markup=InlineKeyboardMarkup(keyboard))
             
-            # Обновляем расписание и сохраняем время последнего обновления
-            last_refresh_times[refresh_key] = current_time
-            # Сохраняем реальное время обновления
-            date_readable = datetime.strptime(date_str, "%d-%m-%Y").strftime("%d.%m.%Y")
-            last_update_times[date_str] = {
-                'timestamp': current_time,
-                'datetime': datetime.now().strftime("%d.%m.%Y %H:%M")
-            }
+            # Обновляем расписание и сохраняем время последнего обновления пользователем
+            # (реальное время обновления данных сохраняется при получении расписания)
+            last_refresh_times.set(refresh_key, current_time, now=current_time)
             await show_schedule_for_date(update, context, date_str, force_refresh=True)
         else:
             # Если не прошло достаточно времени, показываем сообщение об ошибке
@@ -574,40 +1491,30 @@ async def calendar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Обработка выбора предмета для просмотра ДЗ
         parts = callback_data.split("_", 3)
         date_str = parts[2]
-        subject_index = int(parts[3])
-        await show_homework_detail(update, context, date_str, subject_index)
+        token = parts[3]
+        await show_homework_detail(update, context, date_str, token)
     
     elif callback_data.startswith("hw_toggle_"):
         # Обработка переключения статуса ДЗ (выполнено/не выполнено)
         parts = callback_data.split("_")
         date_str = parts[2]
-        subject_index = int(parts[3])
+        token = parts[3]
         current_status = int(parts[4])  # 0 - не выполнено, 1 - выполнено
         
         # Инвертируем статус
         new_status = not bool(current_status)
         
-        # Сохраняем новый статус в глобальном хранилище
         user_id_str = str(user_id)
-        hw_status_key = f"hw_status_{user_id_str}_{date_str}"
         
-        # Инициализируем вложенные словари, если их нет
-        if user_id_str not in hw_status_data:
-            hw_status_data[user_id_str] = {}
-        if date_str not in hw_status_data[user_id_str]:
-            hw_status_data[user_id_str][date_str] = {}
+        # Находим урок по коду его идентификатора: порядок уроков мог измениться после отрисовки кнопок
+        lessons = await get_schedule(date_str, account=get_update_account(update))
+        _, subject_key = find_homework_lesson(lessons, date_str, token, get_subject_classifier(update.effective_chat.id))
+        if subject_key is None:
+            await show_homework_buttons(update, context, date_str)
+            return
         
-        # Сохраняем новый статус
-        subject_key = f"{date_str}_{subject_index}"
-        hw_status_data[user_id_str][date_str][subject_key] = new_status
-        
-        # Сохраняем обновленные данные в файл
-        save_hw_status()
-        
-        # Также сохраняем в context.user_data для обратной совместимости
-        if not context.user_data.get(hw_status_key):
-            context.user_data[hw_status_key] = {}
-        context.user_data[hw_status_key][subject_key] = new_status
+        # Сохраняем новый статус (изменение сразу дописывается в журнал)
+        hw_status_store.set(user_id_str, date_str, subject_key, new_status)
         
         # Обновляем список домашних заданий
         await show_homework_buttons(update, context, date_str)
@@ -623,25 +1530,205 @@ async def calendar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Игнорируем нажатия на заголовки дней недели и пустые ячейки
         pass
 
-async def show_homework_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE, date_str):
+# Фоновые загрузки расписания (ключ кэша -> задача)
+prefetch_tasks = {}
+
+def prefetch_schedule(date_str, account=None):
     """
-    Отображает кнопки с предметами для просмотра домашних заданий
+    Запускает получение расписания на дату в фоне (класс background), если его нет в кэше
+    или оно устарело. Пока загрузка идет, повторный вызов для той же даты ничего не делает
+    Возвращает True, если загрузка запущена
     """
-    query = update.callback_query
-    user_id = update.effective_user.id
-    user_id_str = str(user_id)
-    
-    # Получаем расписание на указанную дату
-    date_readable = datetime.strptime(date_str, "%d-%m-%Y").strftime("%d.%m.%Y")
-    lessons = await get_schedule(date_str)
-    _, filtered_lessons = format_schedule(lessons, date_readable)
+    key = schedule_key(date_str, account)
+    if key in prefetch_tasks or schedule_is_fresh(date_str, account):
+        return False
+
+    async def run():
+        try:
+            with fetch_priority(PRIORITY_BACKGROUND):
+                await fetch_schedule(date_str, account=account)
+        except Exception as e:
+            logger.error(f"Ошибка фоновой загрузки расписания на {date_str}: {e}")
+        finally:
+            prefetch_tasks.pop(key, None)
+
+    # Задача запускается в пустом контексте: у нее своя трасса, а не продолжение уже завершенного запроса
+    prefetch_tasks[key] = contextvars.Context().run(asyncio.ensure_future, run())
+    return True
+
+# Слова inline-запроса для дат
+INLINE_DAY_WORDS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+INLINE_WEEKDAY_WORDS = {name.lower(): index for index, name in enumerate(WEEKDAY_NAMES)}
+INLINE_WEEKDAY_WORDS.update({name: index for index, name in enumerate(("пн", "вт", "ср", "чт", "пт", "сб", "вс"))})
+
+def parse_inline_date(text, today=None):
+    """
+    Дата из текста inline-запроса: "сегодня", "завтра", день недели ("пятница", "пт"),
+    "15.03" или "15.03.2025". Возвращает date или None, если текст не похож на дату
+    """
+    today = today or date.today()
+    text = text.strip().lower()
+    if text in INLINE_DAY_WORDS:
+        return today + timedelta(days=INLINE_DAY_WORDS[text])
+    if text in INLINE_WEEKDAY_WORDS:
+        # Ближайший такой день недели, начиная с сегодняшнего
+        return today + timedelta(days=(INLINE_WEEKDAY_WORDS[text] - today.weekday()) % 7)
+    parts = text.replace("-", ".").replace("/", ".").split(".")
+    if len(parts) not in (2, 3) or not all(part.isdigit() for part in parts):
+        return None
+    try:
+        day, month = int(parts[0]), int(parts[1])
+        year = int(parts[2]) if len(parts) == 3 else today.year
+        if year < 100:
+            year += 2000
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+def inline_article(result_id, title, description, message):
+    return InlineQueryResultArticle(
+        id=result_id[:64], title=title, description=description[:200] if description else None,
+        input_message_content=InputTextMessageContent(message, parse_mode="Markdown"))
+
+def inline_day_result(date_str, account, classifier):
+    """
+    Результат inline-запроса для даты: расписание из кэша, иначе прогноз (загрузка запускается в фоне)
+    Возвращает кортеж (article или None, результат для метрик)
+    """
+    date_readable, _, _ = parse_date_str(date_str)
+    weekday = get_weekday_name(date_readable)
+    cached = schedule_cache.get(schedule_key(date_str, account))
+    fresh = schedule_is_fresh(date_str, account)
+    if not fresh:
+        prefetch_schedule(date_str, account)
+    if cached is not None:
+        message, shown = render_schedule(cached.lessons, date_str, classifier)
+        homework = sum(1 for lesson in shown or () if lesson.has_homework)
+        description = f"Уроков: {len(shown)}, с ДЗ: {homework}" if shown else "Уроков нет"
+        article = inline_article(f"day:{date_str}", f"📅 {date_readable} ({weekday})", description, message)
+        return article, "cached" if fresh else "stale"
+    prediction = predict_schedule(date_str, account)
+    if prediction is not None:
+        message, shown = format_predicted_schedule(prediction, date_str, classifier, "без домашних заданий")
+        if message is not None:
+            description = f"Прогноз: уроков {len(shown)}, расписание загружается"
+            return inline_article(f"predicted:{date_str}", f"🔮 {date_readable} ({weekday})", description, message), "predicted"
+    return None, "miss"
+
+def inline_subject_results(text, account, classifier, deadline):
+    """
+    Результаты inline-запроса по предмету: ближайшие уроки, название которых содержит text
+    (из кэша, для дат без кэша - по прогнозу). Даты без кэша загружаются в фоне (не больше INLINE_PREFETCH_DAYS)
+    """
+    needle = text.lower()
+    results = []
+    prefetched = 0
+    today = date.today()
+    for offset in range(INLINE_SEARCH_DAYS):
+        if len(results) >= 10 or time.perf_counter() > deadline:
+            break
+        day = today + timedelta(days=offset)
+        date_str = day.strftime("%d-%m-%Y")
+        cached = schedule_cache.get(schedule_key(date_str, account))
+        predicted = cached is None
+        if predicted:
+            if day.weekday() < 5 and prefetched < INLINE_PREFETCH_DAYS and prefetch_schedule(date_str, account):
+                prefetched += 1
+            prediction = predict_schedule(date_str, account)
+            lessons = prediction.lessons if prediction is not None else ()
+        else:
+            lessons = cached.lessons
+        date_readable = day.strftime("%d.%m.%Y")
+        weekday = get_weekday_name(date_readable)
+        for index, lesson in enumerate(lessons):
+            info = classifier.classify(lesson.subject)
+            if info.ignored or needle not in lesson.subject.lower():
+                continue
+            title = f"{'🔮' if predicted else info.emoji} {lesson.subject} - {date_readable} ({weekday})"
+            message = f"{info.emoji} *{lesson.subject}* - {date_readable} ({weekday}){lesson.time_range}\n"
+            if predicted:
+                description = "По прогнозу, домашнее задание пока неизвестно"
+                message += "🔮 _по прогнозу расписания, домашнее задание пока неизвестно_"
+            else:
+                description = f"ДЗ: {lesson.homework}" if lesson.has_homework else "Без ДЗ"
+                message += f"{'📒' if lesson.has_homework else '✅'} ДЗ: {lesson.homework or 'без дз'}"
+            results.append((predicted, inline_article(f"lesson:{date_str}:{index}", title, description, message)))
+    return results
+
+@traced("inline_query")
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик inline-запросов (@бот завтра, @бот 15.03, @бот алгебра).
+    Отвечает только из кэша расписания и прогноза недельного шаблона, не дожидаясь МЭШ:
+    на дату без кэша запускается фоновая загрузка, а ответ кэшируется Telegram ненадолго
+    """
+    started = time.perf_counter()
+    query = update.inline_query
+    text = query.query.strip()
+    account = get_account(user_id=query.from_user.id)
+    classifier = get_classifier()
+    current_span().set(user=query.from_user.id, query=text[:50])
+
+    results = []
+    complete = True
+    if not text or parse_inline_date(text) is not None:
+        # Без текста - сегодня и завтра
+        days = [parse_inline_date(text)] if text else [date.today(), date.today() + timedelta(days=1)]
+        for day in days:
+            article, result = inline_day_result(day.strftime("%d-%m-%Y"), account, classifier)
+            INLINE_QUERIES.labels(result).inc()
+            complete = complete and result == "cached"
+            if article is not None:
+                results.append(article)
+    elif len(text) >= 3:
+        found = inline_subject_results(text, account, classifier, started + INLINE_BUDGET)
+        INLINE_QUERIES.labels("search").inc()
+        complete = not any(predicted for predicted, _ in found)
+        results = [article for _, article in found]
+    if not results:
+        INLINE_QUERIES.labels("empty").inc()
+        complete = False
+
+    INLINE_QUERY_DURATION.observe(time.perf_counter() - started)
+    with span("telegram.answer_inline_query", results=len(results)):
+        await query.answer(results, cache_time=INLINE_CACHE_TIME if complete else INLINE_MISS_CACHE_TIME,
+                           is_personal=True)
+
+def get_hw_status(user_id_str, date_str):
+    """
+    Возвращает статусы ДЗ пользователя на указанную дату (DayStatus)
+    """
+    return hw_status_store.day_status(user_id_str, date_str)
+
+def find_homework_lesson(lessons, date_str, token, classifier=None):
+    """
+    Возвращает урок отфильтрованного списка и его идентификатор по коду из callback_data
+    (lesson_token) или (None, None), если такого урока в расписании больше нет
+    """
+    _, filtered_lessons = render_schedule(lessons, date_str, classifier)
+    for lesson, key in zip(filtered_lessons or (), keys_for_subset(lessons, filtered_lessons or ())):
+        if lesson_token(key) == token:
+            return lesson, key
+    return None, None
+
+def render_homework_buttons(lessons, date_str, user_id_str, hw_status, classifier=None):
+    """
+    Формирует сообщение и клавиатуру со списком предметов для просмотра ДЗ
+    Возвращает кортеж (message, reply_markup) или None, если уроков нет
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    # Маска статусов однозначно задает отметки пользователя на дату
+    cache_key = (("homework", classifier.key), date_str, lessons_hash(lessons), (user_id_str, hw_status.mask))
+    cached = render_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    date_readable, month, year = parse_date_str(date_str)
+    _, filtered_lessons = render_schedule(lessons, date_str, classifier)
     
     if not filtered_lessons:
-        await query.edit_message_text(
-            text=f"❌ Не удалось получить домашние задания на {date_readable}",
-            parse_mode="Markdown"
-        )
-        return
+        return None
     
     # Получаем день недели
     weekday = get_weekday_name(date_readable)
@@ -650,53 +1737,16 @@ async def show_homework_buttons(update: Update, context: ContextTypes.DEFAULT_TY
     # Создаем кнопки для каждого предмета в новом формате (3 колонки)
     keyboard = []
     
-    # Словарь эмодзи для предметов
-    subject_emojis = {
-        "математика": "🔢",
-        "алгебра": "🧮",
-        "геометрия": "📐",
-        "русский": "🇷🇺",
-        "литература": "📚",
-        "английский": "🇬🇧",
-        "иностранный": "🌍",
-        "история": "🏛️",
-        "обществознание": "👥",
-        "география": "🗺️",
-        "биология": "🧬",
-        "химия": "🧪",
-        "физика": "⚛️",
-        "информатика": "💻",
-        "физическая культура": "🏃‍♂️",
-        "физкультура": "🏋️",
-        "изо": "🎨",
-        "музыка": "🎵",
-        "технология": "🔧",
-        "обж": "🚨",
-        "группа": "👥"
-    }
-    
-    # Получаем статусы заданий из глобального хранилища, если они есть
-    hw_status = {}
-    if user_id_str in hw_status_data and date_str in hw_status_data[user_id_str]:
-        hw_status = hw_status_data[user_id_str][date_str]
-    
-    # Также проверяем context.user_data для обратной совместимости
-    hw_status_key = f"hw_status_{user_id}_{date_str}"
-    if not hw_status and hw_status_key in context.user_data:
-        hw_status = context.user_data.get(hw_status_key, {})
-    
-    for i, lesson in enumerate(filtered_lessons):
-        subject = lesson['subject']
-        subject_key = f"{date_str}_{i}"
-        
-        # Определяем есть ли домашнее задание
-        homework = lesson.get('homework', "Не указано")
+    keys = keys_for_subset(lessons, filtered_lessons)
+    for lesson, subject_key in zip(filtered_lessons, keys):
+        subject = lesson.subject
+        homework = lesson.homework
         
         # Проверяем статус задания - выполнено или нет
         done = hw_status.get(subject_key, False)
         
         # Обрабатываем текст домашнего задания
-        if homework == "Не указано" or not homework or "нет" in homework.lower() or "без" in homework.lower():
+        if not lesson.has_homework:
             homework_status = "✅"  # Статус "Задания нет" или "Выполнено"
             text_status = "Без ДЗ"
         else:
@@ -713,73 +1763,78 @@ async def show_homework_buttons(update: Update, context: ContextTypes.DEFAULT_TY
         subject_short = subject[:15] + "..." if len(subject) > 15 else subject
         
         # Создаем ряд из трех кнопок: статус, предмет, текст задания
+        # (урок задается кодом идентификатора, а не номером в списке)
+        token = lesson_token(subject_key)
         row = [
-            InlineKeyboardButton(homework_status, callback_data=f"hw_toggle_{date_str}_{i}_{1 if done else 0}"),
-            InlineKeyboardButton(subject_short, callback_data=f"hw_subject_{date_str}_{i}"),
-            InlineKeyboardButton(text_status, callback_data=f"hw_subject_{date_str}_{i}")
+            InlineKeyboardButton(homework_status, callback_data=f"hw_toggle_{date_str}_{token}_{1 if done else 0}"),
+            InlineKeyboardButton(subject_short, callback_data=f"hw_subject_{date_str}_{token}"),
+            InlineKeyboardButton(text_status, callback_data=f"hw_subject_{date_str}_{token}")
         ]
         keyboard.append(row)
     
-    # Извлекаем месяц и год из выбранной даты для возврата к календарю
-    selected_date = datetime.strptime(date_str, "%d-%m-%Y")
-    month = selected_date.month
-    year = selected_date.year
-    
     # Добавляем кнопки "Назад к расписанию" и "Назад в календарь"
     keyboard.append([InlineKeyboardButton("⬅️ Назад к расписанию", callback_data=f"back_to_schedule_{date_str}")])
     keyboard.append([InlineKeyboardButton("📅 Назад в календарь", callback_data=f"calendar_{year}_{month}")])
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        text=message,
-        parse_mode="Markdown",
-        reply_markup=reply_markup
-    )
+    result = (message, InlineKeyboardMarkup(keyboard))
+    render_cache.put(cache_key, result)
+    return result
 
-async def show_homework_detail(update: Update, context: ContextTypes.DEFAULT_TYPE, date_str, subject_index):
+async def show_homework_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE, date_str):
     """
-    Отображает детальную информацию о домашнем задании по выбранному предмету
+    Отображает кнопки с предметами для просмотра домашних заданий
     """
     query = update.callback_query
-    user_id = update.effective_user.id
-    user_id_str = str(user_id)
+    user_id_str = str(update.effective_user.id)
     
-    # Получаем расписание на указанную дату
-    date_readable = datetime.strptime(date_str, "%d-%m-%Y").strftime("%d.%m.%Y")
-    lessons = await get_schedule(date_str)
-    _, filtered_lessons = format_schedule(lessons, date_readable)
+    # Получаем расписание на указанную дату для класса чата
+    lessons = await get_schedule(date_str, account=get_update_account(update))
+    hw_status = get_hw_status(user_id_str, date_str)
+    classifier = get_subject_classifier(update.effective_chat.id)
+    rendered = render_homework_buttons(lessons, date_str, user_id_str, hw_status, classifier)
     
-    if not filtered_lessons or subject_index >= len(filtered_lessons):
+    if rendered is None:
+        date_readable, _, _ = parse_date_str(date_str)
         await query.edit_message_text(
-            text=f"❌ Информация не найдена",
+            text=f"❌ Не удалось получить домашние задания на {date_readable}",
             parse_mode="Markdown"
         )
         return
     
-    # Получаем информацию о выбранном предмете
-    lesson = filtered_lessons[subject_index]
-    subject = lesson['subject']
+    message, reply_markup = rendered
+    await query.edit_message_text(
+        text=message,
+        parse_mode="Markdown",
+        reply_markup=reply_markup
+    )
+
+def render_homework_detail(lessons, date_str, token, user_id_str, hw_status, classifier=None):
+    """
+    Формирует сообщение и клавиатуру с детальной информацией о домашнем задании
+    Возвращает кортеж (message, reply_markup) или None, если предмет не найден
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    cache_key = (("hw_detail", token, classifier.key), date_str, lessons_hash(lessons), (user_id_str, hw_status.mask))
+    cached = render_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    date_readable, month, year = parse_date_str(date_str)
+    lesson, subject_key = find_homework_lesson(lessons, date_str, token, classifier)
     
-    # Получаем текущий статус ДЗ из глобального хранилища
-    done = False
-    subject_key = f"{date_str}_{subject_index}"
+    if lesson is None:
+        return None
     
-    if user_id_str in hw_status_data and date_str in hw_status_data[user_id_str]:
-        done = hw_status_data[user_id_str][date_str].get(subject_key, False)
-    else:
-        # Проверяем также context.user_data для обратной совместимости
-        hw_status_key = f"hw_status_{user_id}_{date_str}"
-        if hw_status_key in context.user_data:
-            done = context.user_data[hw_status_key].get(subject_key, False)
+    # Получаем информацию о выбранном предмете
+    subject = lesson.subject
+    
+    # Получаем текущий статус ДЗ
+    done = hw_status.get(subject_key, False)
     
     # Форматируем информацию о домашнем задании
-    homework = lesson.get('homework', "Не указано")
-    if homework == "Не указано" or not homework:
-        homework = "Нет домашнего задания"
-        homework_emoji = "✅"
-        status_text = "Нет задания"
-    elif "нет" in homework.lower() or "без" in homework.lower():
+    homework = lesson.homework or "Нет домашнего задания"
+    if not lesson.has_homework:
         homework_emoji = "✅"
         status_text = "Нет задания"
     else:
@@ -790,14 +1845,8 @@ async def show_homework_detail(update: Update, context: ContextTypes.DEFAULT_TYP
     weekday = get_weekday_name(date_readable)
     
     # Создаем сообщение с информацией о домашнем задании
-    time_info = ""
-    if lesson['start_time'] != "Не указано":
-        time_info = f" ⏰ {lesson['start_time']}"
-        if lesson['end_time'] != "Не указано":
-            time_info += f" - {lesson['end_time']}"
-    
     message = f"📚 *Домашнее задание на {date_readable} ({weekday})*\n\n" \
-              f"*Предмет: {subject}*{time_info}\n\n" \
+              f"*Предмет: {subject}*{lesson.time_range}\n\n" \
               f"{homework_emoji} *Статус: {status_text}*\n" \
               f"*Домашнее задание:*\n{homework}"
     
@@ -805,22 +1854,40 @@ async def show_homework_detail(update: Update, context: ContextTypes.DEFAULT_TYP
     keyboard = []
     
     # Добавляем кнопку для переключения статуса, если есть задание
-    if not (homework == "Нет домашнего задания" or "нет" in homework.lower() or "без" in homework.lower()):
+    if lesson.has_homework:
         toggle_text = "✅ Отметить как выполненное" if not done else "📒 Отметить как невыполненное"
-        keyboard.append([InlineKeyboardButton(toggle_text, callback_data=f"hw_toggle_{date_str}_{subject_index}_{1 if done else 0}")])
-    
-    # Извлекаем месяц и год из выбранной даты для возврата к календарю
-    selected_date = datetime.strptime(date_str, "%d-%m-%Y")
-    month = selected_date.month
-    year = selected_date.year
+        keyboard.append([InlineKeyboardButton(toggle_text, callback_data=f"hw_toggle_{date_str}_{token}_{1 if done else 0}")])
     
     # Добавляем кнопку для возврата к списку предметов
     keyboard.append([InlineKeyboardButton("⬅️ Назад к списку предметов", callback_data=f"homework_{date_str}")])
     # Добавляем кнопку "Назад в календарь"
     keyboard.append([InlineKeyboardButton("📅 Назад в календарь", callback_data=f"calendar_{year}_{month}")])
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    result = (message, InlineKeyboardMarkup(keyboard))
+    render_cache.put(cache_key, result)
+    return result
+
+async def show_homework_detail(update: Update, context: ContextTypes.DEFAULT_TYPE, date_str, token):
+    """
+    Отображает детальную информацию о домашнем задании по выбранному предмету
+    """
+    query = update.callback_query
+    user_id_str = str(update.effective_user.id)
+    
+    # Получаем расписание на указанную дату для класса чата
+    lessons = await get_schedule(date_str, account=get_update_account(update))
+    hw_status = get_hw_status(user_id_str, date_str)
+    classifier = get_subject_classifier(update.effective_chat.id)
+    rendered = render_homework_detail(lessons, date_str, token, user_id_str, hw_status, classifier)
+    
+    if rendered is None:
+        await query.edit_message_text(
+            text=f"❌ Информация не найдена",
+            parse_mode="Markdown"
+        )
+        return
     
+    message, reply_markup = rendered
     await query.edit_message_text(
         text=message,
         parse_mode="Markdown",
@@ -905,14 +1972,14 @@ async def confirm_subscription(update: Update, context: ContextTypes.DEFAULT_TYP
     """
     confirmation = update.message.text.strip().lower()
     
+    # Забираем сохраненные данные (после завершения диалога они больше не нужны)
+    chat_id = context.user_data.pop('chat_id', None)
+    time_text = context.user_data.pop('time', None)
+    
     if confirmation != 'да':
         await update.message.reply_text("Настройка отменена.")
         return ConversationHandler.END
     
-    # Получаем сохраненные данные
-    chat_id = context.user_data.get('chat_id')
-    time_text = context.user_data.get('time')
-    
     if not chat_id or not time_text:
         await update.message.reply_text("Ошибка: не хватает данных для настройки. Пожалуйста, начните снова.")
         return ConversationHandler.END
@@ -938,6 +2005,7 @@ async def disable_subscription(update: Update, context: ContextTypes.DEFAULT_TYP
     Отключение автоматической отправки расписания
     """
     chat = update.effective_chat
+    context.user_data.pop('chat_id', None)
     
     if str(chat.id) in group_subscriptions:
         del group_subscriptions[str(chat.id)]
@@ -948,6 +2016,60 @@ async def disable_subscription(update: Update, context: ContextTypes.DEFAULT_TYP
     
     return ConversationHandler.END
 
+async def ignore_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /ignore - настройка правил игнорирования предметов в группе
+    /ignore - показать текущие правила
+    /ignore <префикс> [исключение ...] - игнорировать предметы, начинающиеся с префикса
+    /ignore remove <префикс> - удалить правило
+    /ignore reset - вернуть стандартные правила
+    """
+    user = update.effective_user
+    chat = update.effective_chat
+    
+    if chat.type == 'private':
+        await update.message.reply_text("Эта команда доступна только в групповых чатах.")
+        return
+    
+    chat_id = str(chat.id)
+    rules = [(prefix, tuple(exceptions)) for prefix, exceptions in group_ignore_rules.get(chat_id, DEFAULT_IGNORE_RULES)]
+    args = context.args or []
+    
+    if args:
+        # Изменять правила могут только администраторы
+        chat_member = await context.bot.get_chat_member(chat.id, user.id)
+        if chat_member.status not in ['administrator', 'creator']:
+            await update.message.reply_text("Только администраторы группы могут изменять правила игнорирования.")
+            return
+        
+        if args[0].lower() == "reset":
+            group_ignore_rules.pop(chat_id, None)
+            rules = list(DEFAULT_IGNORE_RULES)
+        elif args[0].lower() == "remove" and len(args) > 1:
+            prefix = args[1].lower()
+            rules = [rule for rule in rules if rule[0] != prefix]
+            group_ignore_rules[chat_id] = tuple(rules)
+        else:
+            prefix = args[0].lower()
+            exceptions = tuple(arg.lower() for arg in args[1:])
+            rules = [rule for rule in rules if rule[0] != prefix] + [(prefix, exceptions)]
+            group_ignore_rules[chat_id] = tuple(rules)
+        
+        save_ignore_rules()
+    
+    if rules:
+        lines = []
+        for prefix, exceptions in rules:
+            line = f"• начинается с «{prefix}»"
+            if exceptions:
+                line += f", кроме содержащих: {', '.join(exceptions)}"
+            lines.append(line)
+        rules_text = "\n".join(lines)
+    else:
+        rules_text = "Правил нет, показываются все предметы."
+    
+    await update.message.reply_text(f"Правила игнорирования предметов:\n{rules_text}")
+
 async def check_group_schedules(context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Функция для проверки и отправки расписаний в настроенные группы
@@ -995,17 +2117,19 @@ async def check_group_schedules(context: ContextTypes.DEFAULT_TYPE) -> None:
     
     # Если есть задачи на отправку, выполняем их параллельно
     if send_tasks:
-        await asyncio.gather(*send_tasks)
+        with BROADCAST_DURATION.labels("group_schedule").time():
+            await asyncio.gather(*send_tasks)
 
 async def send_schedule_to_group(bot, chat_id, tomorrow, tomorrow_readable, current_date):
     """
     Вспомогательная функция для отправки расписания в группу
     """
     try:
-        # Получаем расписание на завтра
-        lessons = await get_schedule(tomorrow)
+        # Получаем расписание на завтра для класса группы
+        with fetch_priority(PRIORITY_BROADCAST):
+            lessons = await get_schedule(tomorrow, account=get_account(chat_id))
         if lessons is not None:
-            message, filtered_lessons = format_schedule(lessons, tomorrow_readable)
+            message, filtered_lessons = render_schedule(lessons, tomorrow, get_subject_classifier(chat_id))
             
             # Отправляем расписание в группу с кнопкой ДЗ, если есть уроки
             if filtered_lessons:
@@ -1024,37 +2148,266 @@ async def send_schedule_to_group(bot, chat_id, tomorrow, tomorrow_readable, curr
                     parse_mode="Markdown"
                 )
             
-            # Обновляем дату последней отправки
-            group_subscriptions[str(chat_id)]['last_sent_date'] = current_date
+            # Обновляем дату последней отправки (запись целиком - для общего хранилища)
+            group_subscriptions[str(chat_id)] = dict(group_subscriptions[str(chat_id)], last_sent_date=current_date)
             save_group_settings()
             
             logger.info(f"Расписание на завтра ({tomorrow_readable}) отправлено в группу {chat_id}")
+            BROADCAST_MESSAGES.labels("group_schedule", "sent").inc()
     except Exception as e:
         logger.error(f"Ошибка при отправке расписания в группу {chat_id}: {e}")
+        BROADCAST_MESSAGES.labels("group_schedule", "error").inc()
 
-# Функция для периодической очистки кэша старых записей
-def clean_cache():
-    global schedule_cache, last_update_times, hw_status_data
+async def notify_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /notify - включение и отключение уведомлений об изменениях ДЗ в чате
+    """
+    user = update.effective_user
+    chat = update.effective_chat
+    
+    # В группах подписку могут менять только администраторы
+    if chat.type != 'private':
+        chat_member = await context.bot.get_chat_member(chat.id, user.id)
+        if chat_member.status not in ['administrator', 'creator']:
+            await update.message.reply_text("Только администраторы группы могут настраивать уведомления.")
+            return
+    
+    chat_id = str(chat.id)
+    if chat_id in homework_subscribers:
+        del homework_subscribers[chat_id]
+        save_notify_settings()
+        await update.message.reply_text("🔕 Уведомления об изменениях домашних заданий отключены.")
+    else:
+        homework_subscribers[chat_id] = {'since': time.time()}
+        save_notify_settings()
+        await update.message.reply_text(
+            "🔔 Уведомления включены. Бот сообщит, когда в ближайшие дни появятся новые или изменятся домашние задания.\n"
+            "Отправьте /notify ещё раз, чтобы отключить."
+        )
+
+def format_account_class(account):
+    return f"класс {account.class_key}" if account.class_key else "класс определится по дневнику"
+
+async def account_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /account - учетная запись МЭШ (класс), расписание которой видит чат
+    /account - показать учетную запись чата
+    /account <имя> [chat_id] - привязать чат или пользователя к учетной записи (только для ADMIN_IDS)
+    /account reset [chat_id] - вернуть учетную запись по умолчанию (только для ADMIN_IDS)
+    """
+    chat_id = str(update.effective_chat.id)
+    args = context.args or []
+    is_admin = str(update.effective_user.id) in ADMIN_IDS
+    
+    if args:
+        # Учетная запись открывает дневник ученика, поэтому привязку меняют только администраторы бота
+        if not is_admin:
+            await update.message.reply_text("Изменять учетную запись могут только администраторы бота.")
+            return
+        target = args[1] if len(args) > 1 else chat_id
+        if args[0].lower() == "reset":
+            chat_accounts.pop(target, None)
+        elif accounts.get(args[0]) is None:
+            await update.message.reply_text(f"Учетная запись {args[0]} не найдена. Доступны: {', '.join(accounts.names())}")
+            return
+        else:
+            chat_accounts[target] = args[0]
+        save_account_settings()
+        account = get_account(target)
+        await update.message.reply_text(f"✅ Чат {target}: учетная запись {account.name} ({format_account_class(account)})")
+        return
+    
+    account = get_update_account(update)
+    lines = [f"Учетная запись МЭШ: {account.name} ({format_account_class(account)})"]
+    if is_admin and len(accounts) > 1:
+        lines.append("Доступны: " + ", ".join(f"{item.name} ({format_account_class(item)})" for item in accounts.accounts.values()))
+    await update.message.reply_text("\n".join(lines))
+
+def next_watch_interval(target_date, now, unchanged_streak):
+    """
+    Возвращает интервал до следующей проверки даты в секундах
+    Ближайшие дни проверяются чаще, ночью и при долгом отсутствии изменений - реже
+    """
+    days_ahead = (target_date - now.date()).days
+    if days_ahead <= 1:
+        interval = WATCH_MIN_INTERVAL
+    elif days_ahead <= 3:
+        interval = WATCH_MIN_INTERVAL * 4
+    else:
+        interval = WATCH_MIN_INTERVAL * 12
+    
+    # Если изменений давно не было, увеличиваем интервал
+    interval *= 2 ** min(unchanged_streak, 3)
+    
+    # Ночью учителя редко выставляют задания
+    if now.hour >= 23 or now.hour < 6:
+        interval *= 4
+    
+    return min(interval, WATCH_MAX_INTERVAL)
+
+def format_homework_changes(changes, date_str, classifier=None):
+    """
+    Формирует текст уведомления об изменениях ДЗ (или None, если показывать нечего)
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    
+    lines = []
+    for change in changes:
+        if change.kind not in HOMEWORK_EVENTS:
+            continue
+        lesson = change.new or change.old
+        if classifier.classify(lesson.subject).ignored:
+            continue
+        if change.kind == HOMEWORK_ADDED:
+            lines.append(f"➕ *{lesson.subject}*: {change.new.homework}")
+        elif change.kind == HOMEWORK_CHANGED:
+            lines.append(f"✏️ *{lesson.subject}*: {change.new.homework}")
+        else:
+            lines.append(f"➖ *{lesson.subject}*: задание снято")
+    
+    if not lines:
+        return None
+    
+    date_readable, _, _ = parse_date_str(date_str)
+    weekday = get_weekday_name(date_readable)
+    return f"🔔 *Изменения в ДЗ на {date_readable} ({weekday})*\n\n" + "\n".join(lines)
+
+async def notify_homework_changes(bot, date_str, changes, chat_ids=None):
+    """
+    Рассылает уведомление об изменениях ДЗ подписанным чатам (chat_ids - только этим чатам)
+    """
+    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("📚 Перейти к ДЗ", callback_data=f"homework_{date_str}")]])
+    
+    async def send(chat_id):
+        message = format_homework_changes(changes, date_str, get_subject_classifier(chat_id))
+        if message is None:
+            return
+        try:
+            await bot.send_message(chat_id=int(chat_id), text=message, parse_mode="Markdown", reply_markup=reply_markup)
+            BROADCAST_MESSAGES.labels("homework_notify", "sent").inc()
+        except Forbidden:
+            # Бот заблокирован или удален из группы - отписываем чат
+            logger.info(f"Чат {chat_id} недоступен, отключаем уведомления")
+            BROADCAST_MESSAGES.labels("homework_notify", "forbidden").inc()
+            homework_subscribers.pop(chat_id, None)
+            save_notify_settings()
+        except Exception as e:
+            logger.error(f"Ошибка при отправке уведомления в чат {chat_id}: {e}")
+            BROADCAST_MESSAGES.labels("homework_notify", "error").inc()
+    
+    with BROADCAST_DURATION.labels("homework_notify").time():
+        await asyncio.gather(*(send(chat_id) for chat_id in (chat_ids if chat_ids is not None else list(homework_subscribers))))
+
+async def watch_homework_changes(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Фоновая проверка изменений ДЗ на ближайшие учебные дни
+    Одна общая проверка даты заменяет обновления, которые иначе запускал бы каждый пользователь
+    """
+    if not homework_subscribers:
+        return
+    
+    now = datetime.now()
     current_time = time.time()
+    
+    # Классы подписанных чатов: каждая дата проверяется один раз на класс
+    class_accounts = {}
+    class_subscribers = {}
+    for chat_id in list(homework_subscribers):
+        account = get_account(chat_id)
+        if schedule_client is None:
+            with fetch_priority(PRIORITY_BACKGROUND):
+                account = await resolve_account(account)
+        # С сервисом расписания класс здесь не определяется: учетные записи с неизвестным
+        # классом проверяются каждая отдельно (как в schedule_key)
+        class_key = account_class_key(account)
+        class_accounts.setdefault(class_key, account)
+        class_subscribers.setdefault(class_key, []).append(chat_id)
+    
+    # Выбираем учебные дни, для которых подошло время проверки
+    watched = []
+    due_dates = []
+    for offset in range(WATCH_DAYS):
+        target_date = now.date() + timedelta(days=offset)
+        if target_date.weekday() >= 5:
+            continue
+        date_str = target_date.strftime("%d-%m-%Y")
+        for class_key, account in class_accounts.items():
+            key = schedule_key(date_str, account)
+            watched.append((key, date_str, target_date, class_key))
+            # Первое известное расписание даты - точка отсчета для уведомлений
+            if key not in homework_snapshots and key in schedule_cache:
+                homework_snapshots[key] = schedule_cache[key].lessons
+            next_poll = watch_next_poll.get(key, 0)
+            if next_poll <= current_time:
+                due_dates.append((next_poll, key, date_str, class_key))
+    
+    # Проверяем в первую очередь даты, проверка которых просрочена сильнее всего
+    due_dates.sort()
+    polled = set()
+    for _, key, date_str, class_key in due_dates[:WATCH_MAX_PER_TICK]:
+        with fetch_priority(PRIORITY_BACKGROUND):
+            await get_schedule(date_str, force_refresh=True, account=class_accounts[class_key])
+        polled.add(key)
+    
+    # Сравниваем кэш с тем, о чем подписчики уже знают - для всех наблюдаемых дат,
+    # в том числе обновленных не фоновой проверкой
+    for key, date_str, target_date, class_key in watched:
+        current = schedule_cache.get(key)
+        previous = homework_snapshots.get(key)
+        changes = []
+        if current is not None:
+            homework_snapshots[key] = current.lessons
+            if previous is not None and current.lessons is not previous:
+                changes = [change for change in diff_schedules(date_str, previous, current.lessons)
+                           if change.kind in HOMEWORK_EVENTS]
+        
+        if changes:
+            watch_unchanged_streak[key] = 0
+            logger.info(f"Обнаружено {len(changes)} изменений ДЗ на {key}, отправляем уведомления")
+            await notify_homework_changes(context.bot, date_str, changes, class_subscribers[class_key])
+        elif key in polled:
+            watch_unchanged_streak[key] = watch_unchanged_streak.get(key, 0) + 1
+        
+        if key in polled:
+            interval = next_watch_interval(target_date, now, watch_unchanged_streak[key])
+            watch_next_poll[key] = current_time + interval
+            logger.info(f"Следующая проверка ДЗ на {key} через {interval // 60} мин.")
+    
+    # Забываем прошедшие даты
+    for key in list(watch_next_poll):
+        try:
+            if datetime.strptime(schedule_key_date(key), "%d-%m-%Y").date() < now.date():
+                watch_next_poll.pop(key, None)
+                watch_unchanged_streak.pop(key, None)
+        except ValueError:
+            watch_next_poll.pop(key, None)
+    watched_keys = {key for key, _, _, _ in watched}
+    for key in list(homework_snapshots):
+        if key not in watched_keys:
+            homework_snapshots.pop(key, None)
+
+# Очистка устаревших записей кэша расписания и сведений о последних обновлениях
+def clean_schedule_cache(current_time=None):
+    current_time = current_time or time.time()
     old_keys = []
     
     # Находим старые записи в кэше расписания
     for date, data in schedule_cache.items():
-        if current_time - data['timestamp'] > CACHE_TTL * 2:
+        if current_time - data.timestamp > CACHE_TTL * 2:
             old_keys.append(date)
     
     # Удаляем старые записи из кэша
     for key in old_keys:
         del schedule_cache[key]
+        render_cache.invalidate_date(schedule_key_date(key))
+        class_key, date_str = split_schedule_key(key)
+        calendar_index.update(class_key, date_str, None)
     
     if old_keys:
         logger.info(f"Очищено {len(old_keys)} устаревших записей в кэше")
         # Сохраняем обновленный кэш
-        try:
-            with open('schedule_cache.pkl', 'wb') as f:
-                pickle.dump(schedule_cache, f)
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении кэша после очистки: {e}")
+        save_cache()
     
     # Очищаем также устаревшие записи о последних обновлениях
     old_update_keys = []
@@ -1071,46 +2424,175 @@ def clean_cache():
         # Сохраняем обновленные данные о последних обновлениях
         save_last_update_times()
     
+    # Забываем давние обновления дат
+    refresh_governor.purge(current_time)
+
+# Функция для периодической очистки кэша старых записей
+def clean_cache():
+    current_time = time.time()
+    clean_schedule_cache(current_time)
+    
     # Очищаем устаревшие данные о домашних заданиях (старше 30 дней)
     MAX_HW_AGE = 30 * 24 * 60 * 60  # 30 дней в секундах
     current_date = datetime.now()
-    cleanup_count = 0
+    old_hw_dates = []
     
-    for user_id, dates in hw_status_data.items():
-        dates_to_remove = []
-        for date_str in dates:
-            try:
-                # Преобразуем строку даты в объект datetime
-                task_date = datetime.strptime(date_str.split('_')[0], "%d-%m-%Y")
-                # Если задание старше 30 дней, удаляем его
-                if (current_date - task_date).total_seconds() > MAX_HW_AGE:
-                    dates_to_remove.append(date_str)
-                    cleanup_count += 1
-            except Exception as e:
-                logger.error(f"Ошибка при обработке даты ДЗ {date_str}: {e}")
-        
-        # Удаляем устаревшие записи
-        for date_str in dates_to_remove:
-            del hw_status_data[user_id][date_str]
-        
-        # Если у пользователя не осталось записей, удаляем его из словаря
-        if not hw_status_data[user_id]:
-            hw_status_data.pop(user_id, None)
+    for date_str in hw_status_store.dates():
+        try:
+            task_date = datetime.strptime(date_str, "%d-%m-%Y")
+            # Если задание старше 30 дней, удаляем его
+            if (current_date - task_date).total_seconds() > MAX_HW_AGE:
+                old_hw_dates.append(date_str)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке даты ДЗ {date_str}: {e}")
     
+    cleanup_count = hw_status_store.remove_dates(old_hw_dates)
     if cleanup_count > 0:
         logger.info(f"Очищено {cleanup_count} устаревших записей о домашних заданиях")
-        # Сохраняем обновленные данные о домашних заданиях
-        save_hw_status()
+    # Сохраняем снимок статусов ДЗ и очищаем журнал
+    save_hw_status()
+    
+    # Удаляем истекшие кулдауны
+    last_refresh_times.purge(current_time)
+    
+    logger.info("Память: " + "; ".join(f"{name}: {value}" for name, value in memory_stats()))
+
+async def clean_cache_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Периодическая задача очистки кэша
+    """
+    clean_cache()
+
+def get_rss_bytes():
+    """
+    Возвращает текущий размер резидентной памяти процесса в байтах (или None, если он неизвестен)
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Пиковое значение: в Linux в килобайтах, в macOS в байтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def memory_stats():
+    """
+    Возвращает список пар (название, значение) с размером процесса и внутренних структур бота
+    """
+    rss = get_rss_bytes()
+    return [
+        ("RSS", f"{rss / 1024 / 1024:.1f} МБ" if rss is not None else "неизвестно"),
+        ("Объектов Python", len(gc.get_objects())),
+        ("Дней в кэше расписания", len(schedule_cache)),
+        ("Готовых сообщений в кэше", f"{len(render_cache)} (попаданий {render_cache.hits}, промахов {render_cache.misses})"),
+        ("Кулдаунов обновления", len(last_refresh_times)),
+        ("Времен обновления дат", len(last_update_times)),
+        ("Пользователей со статусами ДЗ", hw_status_store.users_count()),
+        ("Дней со статусами ДЗ", len(hw_status_store)),
+        ("Статусов ДЗ", hw_status_store.records_count()),
+        ("Дат под наблюдением", len(watch_next_poll)),
+    ]
+
+async def memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /memory - отчет о потреблении памяти (только для ADMIN_IDS)
+    """
+    if str(update.effective_user.id) not in ADMIN_IDS:
+        await update.message.reply_text("Эта команда доступна только администраторам бота.")
+        return
+    
+    lines = ["🧠 *Память бота*", ""]
+    lines.extend(f"{name}: {value}" for name, value in memory_stats())
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+def format_stats():
+    """
+    Формирует краткую сводку по метрикам бота
+    """
+    def percent(part, total):
+        return f"{part / total * 100:.0f}%" if total else "-"
+    
+    lines = ["📊 *Статистика бота*", ""]
+    
+    requests_total = SCHEDULE_REQUESTS.value
+    from_cache = SCHEDULE_REQUESTS.get("cache")
+    shared = SCHEDULE_REQUESTS.get(SOURCE_RECENT) + SCHEDULE_REQUESTS.get(SOURCE_IN_FLIGHT)
+    lines.append(f"Запросы расписания: {requests_total} (из кэша {percent(from_cache, requests_total)}, "
+                 f"общих с другими {percent(shared, requests_total)})")
+    
+    render_total = render_cache.hits + render_cache.misses
+    lines.append(f"Кэш сообщений: {len(render_cache)} записей, попаданий {percent(render_cache.hits, render_total)}")
+    
+    scrape = SCRAPE_DURATION._default()
+    outcomes = ", ".join(f"{values[0].replace('_', ' ')} {child.value}" for values, child in SCRAPE_REQUESTS.children())
+    lines.append(f"Запросы к МЭШ: {SCRAPE_REQUESTS.value}" + (f" ({outcomes})" if outcomes else ""))
+    if scrape.count:
+        lines.append(f"Время запроса к МЭШ: среднее {scrape.sum / scrape.count:.1f} с, "
+                     f"p50 ≤ {scrape.quantile(0.5):g} с, p95 ≤ {scrape.quantile(0.95):g} с")
+    
+    lines.append(f"Очередь пула потоков: {thread_pool._work_queue.qsize()}")
+    if loop_monitor.samples:
+        lines.append(f"Задержка цикла событий: p99 {lag_percentile(loop_monitor.samples, 0.99) * 1000:.0f} мс, "
+                     f"максимум {loop_monitor.max_lag * 1000:.0f} мс, блокировок {EVENT_LOOP_BLOCKS.value}")
+    lines.append(f"Запуски браузера: {BROWSER_STARTS.value} (ошибок {BROWSER_START_FAILURES.value}), "
+                 f"открыто сеансов {len(scraper_sessions)} из {MAX_BROWSER_SESSIONS}")
+    for title, breaker in (("МЭШ", portal_breaker), ("сервис расписания", service_breaker)):
+        if breaker.opens or breaker.state != STATE_CLOSED:
+            state = {STATE_CLOSED: "работает", STATE_OPEN: f"недоступен, повтор через {breaker.retry_after():.0f} с",
+                     STATE_HALF_OPEN: "пробный запрос"}[breaker.state]
+            lines.append(f"Предохранитель ({title}): {state}, ошибок {breaker.failure_ratio():.0%}, "
+                         f"срабатываний {breaker.opens}, отклонено запросов {breaker.rejected}")
+    if FETCH_JOBS.value:
+        queued = ", ".join(f"{priority} {fetch_scheduler.running[priority]}/{fetch_scheduler.queue_depth(priority)}"
+                           for priority in PRIORITIES)
+        dropped = sum(FETCH_JOBS.get(priority, "dropped") for priority in PRIORITIES)
+        lines.append(f"Очередь запросов к МЭШ (выполняется/ждет): {queued}, отменено фоновых {dropped}")
+    if scrape_pool is not None:
+        health = scrape_pool.health()
+        busy = sum(1 for worker in health if worker["busy"])
+        lines.append(f"Процессы получения расписания: работает {scrape_pool.alive_count()} из {len(health)}, "
+                     f"заняты {busy}, в очереди {scrape_pool.queue_depth}, перезапусков {scrape_pool.restarts()}, "
+                     f"отклонено {scrape_pool.rejected}")
+    
+    for (kind,), child in BROADCAST_DURATION.children():
+        lines.append(f"{BROADCAST_NAMES.get(kind, kind)}: {child.count}, среднее время {child.sum / child.count:.1f} с")
+    
+    return "\n".join(lines)
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Обработчик команды /stats - сводка по метрикам бота (только для ADMIN_IDS)
+    """
+    if str(update.effective_user.id) not in ADMIN_IDS:
+        await update.message.reply_text("Эта команда доступна только администраторам бота.")
+        return
+    
+    await update.message.reply_text(format_stats(), parse_mode="Markdown")
+
+# Закрытие браузера (при завершении работы бота или сервиса расписания)
+def close_browser():
+    scraper_sessions.close_all()
+    if scrape_pool is not None:
+        scrape_pool.stop()
+
+def scrape_health():
+    """
+    Состояние процессов получения расписания (для /health сервиса расписания)
+    """
+    if scrape_pool is None:
+        return {}
+    return {"scrape_workers": scrape_pool.health(), "scrape_queue_depth": scrape_pool.queue_depth}
 
 # Функция для корректного закрытия браузера при завершении работы
 def shutdown():
-    global scheduler_instance
-    if scheduler_instance is not None:
-        try:
-            scheduler_instance.close()
-            logger.info("Браузер успешно закрыт")
-        except Exception as e:
-            logger.error(f"Ошибка при закрытии браузера: {e}")
+    close_browser()
     
     # Сохраняем данные о статусе ДЗ перед выходом
     save_hw_status()
@@ -1119,6 +2601,7 @@ def shutdown():
     thread_pool.shutdown(wait=False)
     logger.info("Пул потоков закрыт")
 
+@traced("show_schedule_for_date")
 async def show_schedule_for_date(update: Update, context: ContextTypes.DEFAULT_TYPE, date_str, force_refresh=False):
     """
     Отображает расписание на выбранную дату с кнопкой обновления.
@@ -1129,25 +2612,50 @@ async def show_schedule_for_date(update: Update, context: ContextTypes.DEFAULT_T
         date_str: строка с датой в формате DD-MM-YYYY
         force_refresh: принудительное обновление (игнорирует кулдаун)
     """
-    global last_refresh_times
-    
     query = update.callback_query
     user_id = update.effective_user.id
+    edit_kind = "loading"
+
+    async def edit_message(text, reply_markup):
+        with span("telegram.edit_message", kind=edit_kind):
+            await query.edit_message_text(text=text, parse_mode="Markdown", reply_markup=reply_markup)
+
+    updater = MessageUpdater(edit_message, PROGRESSIVE_EDIT_INTERVAL)
     
     try:
-        # Проверяем необходимость загрузки сообщения
-        if not force_refresh and not query.message.text.startswith("Получаю расписание"):
-            await query.edit_message_text(f"Получаю расписание на {date_str.replace('-', '.')}... ⏳")
+        date_readable, month, year = parse_date_str(date_str)
+        account = get_update_account(update)
+        classifier = get_subject_classifier(update.effective_chat.id)
+        back_markup = InlineKeyboardMarkup(
+            [[InlineKeyboardButton("📅 Назад в календарь", callback_data=f"calendar_{year}_{month}")]])
         
-        # Получаем расписание на выбранную дату
-        date_readable = datetime.strptime(date_str, "%d-%m-%Y").strftime("%d.%m.%Y")
-        lessons = await get_schedule(date_str, force_refresh=force_refresh)
-        message, filtered_lessons = format_schedule(lessons, date_readable)
+        # Пока расписание загружается, сразу показываем сохраненное расписание даты или прогноз
+        # по недельному шаблону (при обновлении на экране уже есть расписание)
+        breaker = service_breaker if schedule_client is not None else portal_breaker
+        progressive = (not force_refresh and PROGRESSIVE_EDIT_INTERVAL > 0
+                       and not breaker.is_open() and not schedule_is_fresh(date_str, account))
+        preview, preview_lessons = schedule_preview(date_str, account, classifier) if progressive else (None, ())
+        if preview is not None:
+            await updater.show(preview, back_markup)
+        elif not force_refresh and not query.message.text.startswith("Получаю расписание"):
+            await updater.show(f"Получаю расписание на {date_readable}... ⏳", None)
         
-        # Извлекаем месяц и год из выбранной даты для возврата к календарю
-        selected_date = datetime.strptime(date_str, "%d-%m-%Y")
-        month = selected_date.month
-        year = selected_date.year
+        def on_partial(lessons):
+            # Уроки, уже разобранные скрейпером, показываем, если их больше, чем в предварительном ответе
+            if not progressive or edit_kind != "loading" or len(lessons) <= len(preview_lessons):
+                return
+            message, shown = format_schedule(lessons_from_dicts(lessons), date_readable, classifier)
+            if not shown or len(shown) <= len(preview_lessons):
+                return
+            SCHEDULE_PREVIEWS.labels("partial").inc()
+            updater.show_soon(message + f"⏳ Загружено уроков: {len(lessons)}...", back_markup)
+        
+        # Получаем расписание на выбранную дату для класса чата
+        with partial_lessons(on_partial):
+            lessons, source = await fetch_schedule(date_str, force_refresh=force_refresh, account=account)
+        edit_kind = "schedule"
+        with span("format_schedule"):
+            message, filtered_lessons = render_schedule(lessons, date_str, classifier)
         
         keyboard = []
         
@@ -1158,23 +2666,23 @@ async def show_schedule_for_date(update: Update, context: ContextTypes.DEFAULT_T
         # Проверяем, можно ли обновить расписание (прошло ли 5 минут с последнего обновления)
         refresh_key = f"{user_id}_{date_str}"
         current_time = time.time()
-        last_refresh_time = last_refresh_times.get(refresh_key, 0)
+        last_refresh_time = last_refresh_times.get(refresh_key, 0, now=current_time)
         can_refresh = current_time - last_refresh_time >= REFRESH_COOLDOWN
         
-        # Если принудительное обновление, обновляем время последнего обновления
+        # Если принудительное обновление, обновляем время последнего обновления пользователем
         if force_refresh:
-            last_refresh_times[refresh_key] = current_time
-            # Обновляем также реальное время обновления
-            last_update_times[date_str] = {
-                'timestamp': current_time,
-                'datetime': datetime.now().strftime("%d.%m.%Y %H:%M")
-            }
+            last_refresh_times.set(refresh_key, current_time, now=current_time)
         
         # Добавляем информацию о последнем обновлении или кнопку обновления
-        if date_str in last_update_times:
+        update_key = schedule_key(date_str, account)
+        if update_key in last_update_times:
             # Показываем время последнего обновления
-            update_info = last_update_times[date_str]['datetime']
+            update_info = last_update_times[update_key]['datetime']
             message += f"\n\n🔄 Обновлено: {update_info}"
+            if force_refresh and source in (SOURCE_RECENT, SOURCE_IN_FLIGHT):
+                message += " (по запросу другого пользователя)"
+            if source == SOURCE_STALE:
+                message += f"\n{stale_notice()}"
             
             # Добавляем кнопку обновления, только если прошло время кулдауна
             if can_refresh:
@@ -1189,6 +2697,8 @@ async def show_schedule_for_date(update: Update, context: ContextTypes.DEFAULT_T
         else:
             # Если информации о последнем обновлении нет, показываем "Обновлено ранее"
             message += f"\n\n🔄 Обновлено ранее"
+            if source == SOURCE_STALE:
+                message += f"\n{stale_notice()}"
             
             # Добавляем обычную кнопку обновления
             refresh_text = "🔄 Обновить"
@@ -1200,12 +2710,9 @@ async def show_schedule_for_date(update: Update, context: ContextTypes.DEFAULT_T
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(
-            text=message, 
-            parse_mode="Markdown",
-            reply_markup=reply_markup
-        )
+        await updater.finish(message, reply_markup)
     except Exception as e:
+        updater.cancel()
         logger.error(f"Ошибка при показе расписания на дату {date_str}: {e}")
         # В случае ошибки пытаемся отобразить сообщение об ошибке
         try:
@@ -1231,6 +2738,8 @@ def load_last_update_times():
 
 # Сохранение информации о последних обновлениях
 def save_last_update_times():
+    if schedule_client is not None:
+        return
     try:
         with open(LAST_UPDATE_FILE, 'wb') as f:
             pickle.dump(last_update_times, f)
@@ -1240,52 +2749,126 @@ def save_last_update_times():
 
 # Загрузка информации о статусе домашних заданий
 def load_hw_status():
-    global hw_status_data
     try:
-        if os.path.exists(HW_STATUS_FILE):
-            with open(HW_STATUS_FILE, 'rb') as f:
-                hw_status_data = pickle.load(f)
-                logger.info(f"Загружена информация о статусе ДЗ для {len(hw_status_data)} пользователей")
+        if hw_status_store.load():
+            logger.info(f"Загружена информация о статусе ДЗ для {hw_status_store.users_count()} пользователей")
+        elif storage is not None and (os.path.exists(HW_STATUS_FILE) or os.path.exists(HW_STATUS_JOURNAL_FILE)):
+            # Переносим статусы из файлов процесса в общее хранилище
+            file_store = HomeworkStatusStore(HW_STATUS_FILE, HW_STATUS_JOURNAL_FILE)
+            file_store.load()
+            storage.put_homework_statuses(file_store.export_records())
+            hw_status_store.sync()
+            logger.info(f"Статусы ДЗ ({hw_status_store.records_count()} отметок) перенесены в общее хранилище")
+        elif os.path.exists(LEGACY_HW_STATUS_FILE):
+            # Переносим статусы из старого формата pickle
+            with open(LEGACY_HW_STATUS_FILE, 'rb') as f:
+                legacy_data = pickle.load(f)
+            imported = hw_status_store.import_legacy(legacy_data)
+            if storage is not None:
+                storage.put_homework_statuses(hw_status_store.export_records())
+            logger.info(f"Статусы ДЗ ({imported} отметок) перенесены из {LEGACY_HW_STATUS_FILE}")
+            save_hw_status()
+        # Старые ключи "DD-MM-YYYY_N" переводятся на идентификаторы уроков по расписанию даты
+        find_legacy_hw_dates()
     except Exception as e:
         logger.error(f"Ошибка при загрузке информации о статусе ДЗ: {e}")
-        hw_status_data = {}
 
-# Сохранение информации о статусе домашних заданий
-def save_hw_status():
-    try:
-        with open(HW_STATUS_FILE, 'wb') as f:
-            pickle.dump(hw_status_data, f)
-        logger.info(f"Сохранена информация о статусе ДЗ для {len(hw_status_data)} пользователей")
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении информации о статусе ДЗ: {e}")
+# Даты с отметками ДЗ на старых ключах "DD-MM-YYYY_N", расписания которых еще нет в кэше:
+# отметки переводятся на идентификаторы уроков, когда расписание даты будет получено
+legacy_hw_dates = set()
 
-def main():
+def legacy_hw_index(date_str, key):
     """
-    Основная функция запуска бота
+    Номер урока из старого ключа отметки "DD-MM-YYYY_N" (None для других ключей)
     """
-    # Получаем токен бота из переменных окружения
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not token:
-        logger.error("Не задан токен бота. Укажите TELEGRAM_BOT_TOKEN в файле .env")
+    prefix = f"{date_str}_"
+    if key.startswith(prefix) and key[len(prefix):].isdigit():
+        return int(key[len(prefix):])
+    return None
+
+def find_legacy_hw_dates():
+    """
+    Запоминает даты с отметками на старых ключах; даты, расписание которых уже в кэше, переводит сразу
+    """
+    for date_str in hw_status_store.dates():
+        if any(legacy_hw_index(date_str, key) is not None for key in hw_status_store.date_keys(date_str)):
+            legacy_hw_dates.add(date_str)
+    for date_str in list(legacy_hw_dates):
+        if date_str in schedule_cache:
+            migrate_legacy_hw_keys(date_str, schedule_cache[date_str].lessons)
+    if legacy_hw_dates:
+        logger.info(f"Отметки ДЗ на старых ключах ждут расписания: {len(legacy_hw_dates)} дат")
+
+def migrate_legacy_hw_keys(date_str, lessons):
+    """
+    Переводит отметки ДЗ на дату со старых ключей (номер урока в списке без игнорируемых
+    предметов) на идентификаторы уроков. Номера, которых нет в расписании, удаляются
+    """
+    legacy_hw_dates.discard(date_str)
+    _, filtered_lessons = render_schedule(lessons, date_str)
+    keys = keys_for_subset(lessons, filtered_lessons or ())
+    renames = {}
+    for key in hw_status_store.date_keys(date_str):
+        index = legacy_hw_index(date_str, key)
+        if index is not None:
+            renames[key] = keys[index] if index < len(keys) else None
+    if not renames:
         return
-    
-    # Загружаем кэш и настройки групп
-    load_cache()
-    load_group_settings()
-    load_last_update_times()
-    load_hw_status()
-    
-    # Создаем приложение
-    application = Application.builder().token(token).build()
-    
+    moved, removed = hw_status_store.rename_keys(date_str, renames)
+    logger.info(f"Статусы ДЗ на {date_str} переведены на идентификаторы уроков: {moved}")
+    if removed:
+        logger.warning(f"Статусы ДЗ на {date_str} без урока в расписании удалены: {removed}")
+
+# Сохранение полного снимка статусов домашних заданий (изменения между снимками хранятся в журнале)
+def save_hw_status():
+    hw_status_store.compact()
+
+def build_application(token=None, bot=None, concurrent_updates=None):
+    """
+    Создает приложение с обработчиками команд и callback-запросов.
+    bot - готовый экземпляр Bot вместо токена (например, для нагрузочного теста)
+    concurrent_updates - число одновременно обрабатываемых обновлений (None - по одному)
+    """
+    builder = Application.builder()
+    builder = builder.bot(bot) if bot is not None else builder.token(token)
+    builder = builder.post_init(start_loop_monitor).post_shutdown(stop_loop_monitor)
+    if concurrent_updates is not None:
+        builder = builder.concurrent_updates(concurrent_updates)
+    application = builder.build()
+    register_handlers(application)
+    return application
+
+async def start_loop_monitor(application):
+    """
+    Запускает контроль задержки цикла событий (post_init приложения)
+    """
+    loop_monitor.start()
+
+async def stop_loop_monitor(application):
+    await loop_monitor.stop()
+
+def register_handlers(application):
+    """
+    Регистрирует обработчики команд, callback-запросов и ошибок
+    """
     # Добавляем обработчики команд
     # В боте доступны следующие команды:
     # /start - начало работы с ботом
     # /month - календарь на текущий месяц
     # /groups - настройка ежедневной отправки расписания
+    # /ignore - правила игнорирования предметов в группе
+    # /notify - уведомления об изменениях ДЗ
+    # /account - учетная запись МЭШ (класс) чата
+    # /memory - отчет о потреблении памяти (только для ADMIN_IDS)
+    # /stats - сводка по метрикам (только для ADMIN_IDS)
     application.add_handler(CommandHandler("start", start))
     # Удалены обработчики help_command, today_command, tomorrow_command, week_command
     application.add_handler(CommandHandler("month", month_command))
+    application.add_handler(CommandHandler("ignore", ignore_command))
+    application.add_handler(CommandHandler("notify", notify_command))
+    application.add_handler(CommandHandler("account", account_command))
+    application.add_handler(CommandHandler("memory", memory_command))
+    application.add_handler(CommandHandler("stats", stats_command))
     
     # Удален обрабочик ввода даты (date_command)
     
@@ -1305,25 +2888,95 @@ def main():
     
     # Добавляем обработчик callback-запросов для календаря
     application.add_handler(CallbackQueryHandler(calendar_callback))
+    application.add_handler(InlineQueryHandler(inline_query))
     
     # Обработчик ошибок
     application.add_error_handler(error_handler)
+
+def register_jobs(application):
+    """
+    Регистрирует периодические задачи (рассылки, проверка ДЗ, очистка кэша)
+    """
+    job_queue = application.job_queue
+    if job_queue is None:
+        logger.error("JobQueue недоступен: установите python-telegram-bot[job-queue]. Периодические задачи не запущены")
+        return
+    
+    # Добавляем задачу для периодической очистки кэша (каждые 6 часов)
+    job_queue.run_repeating(clean_cache_job, interval=21600, first=3600)
+    
+    if not RUN_JOBS:
+        logger.info("Рассылки и проверка изменений ДЗ выполняются другим процессом (RUN_JOBS=0)")
+        return
     
     # Добавляем задачу для периодической проверки и отправки расписаний в группы
-    job_queue = application.job_queue
     job_queue.run_repeating(check_group_schedules, interval=60, first=10)
     
-    # Добавляем задачу для периодической очистки кэша (каждые 6 часов)
-    job_queue.run_repeating(clean_cache, interval=21600, first=3600)
+    # Добавляем фоновую проверку изменений ДЗ для подписанных чатов
+    job_queue.run_repeating(watch_homework_changes, interval=WATCH_TICK, first=120)
+
+def webhook_options(listen=None, port=None, webhook_url=None):
+    """
+    Возвращает параметры запуска webhook (для Application.run_webhook и Updater.start_webhook)
+    """
+    return {
+        "listen": listen or WEBHOOK_LISTEN,
+        "port": port or WEBHOOK_PORT,
+        "url_path": WEBHOOK_PATH,
+        "webhook_url": webhook_url or f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+        "secret_token": WEBHOOK_SECRET,
+        "max_connections": WEBHOOK_MAX_CONNECTIONS,
+    }
+
+def main():
+    """
+    Основная функция запуска бота
+    """
+    # Получаем токен бота из переменных окружения
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not token:
+        logger.error("Не задан токен бота. Укажите TELEGRAM_BOT_TOKEN в файле .env")
+        return
+    
+    # Загружаем кэш и настройки групп
+    # (обработчик с сервисом расписания получает кэш расписания от сервиса)
+    if schedule_client is None:
+        load_cache()
+        load_last_update_times()
+    else:
+        logger.info(f"Расписание запрашивается у сервиса {SCHEDULE_SERVICE_URL}")
+    load_group_settings()
+    load_ignore_rules()
+    load_notify_settings()
+    load_account_settings()
+    load_account_classes()
+    load_hw_status()
+    
+    # Запускаем локальный HTTP-сервер с метриками
+    if METRICS_PORT:
+        try:
+            metrics.start_http_server(int(METRICS_PORT), METRICS_HOST)
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось запустить сервер метрик на порту {METRICS_PORT}: {e}")
+    
+    # Создаем приложение
+    application = build_application(token, concurrent_updates=CONCURRENT_UPDATES or None)
+    register_jobs(application)
     
     # Регистрируем обработчик для корректного завершения работы
     import atexit
     atexit.register(shutdown)
     
     # Запускаем бота
-    logger.info("Запускаем бота...")
     try:
-        application.run_polling()
+        if WEBHOOK_URL:
+            options = webhook_options()
+            logger.info(f"Запускаем бота в режиме webhook: {options['webhook_url']} -> "
+                        f"{options['listen']}:{options['port']}, обновлений одновременно: {CONCURRENT_UPDATES or 1}")
+            application.run_webhook(**options)
+        else:
+            logger.info("Запускаем бота...")
+            application.run_polling()
     except (KeyboardInterrupt, SystemExit):
         logger.info("Бот остановлен")
     finally:
@@ -9,9 +9,13 @@ import time
 load_dotenv()
 
 class MosregAPI:
-    def __init__(self):
-        self.base_url = "https://authedu.mosreg.ru"
-        self.token = os.getenv("MOSREG_TOKEN")
+    def __init__(self, base_url="https://authedu.mosreg.ru", token=None):
+        """
+        :param base_url: Адрес МЭШ (для тестового сервера, например http://127.0.0.1:8000)
+        :param token: Токен авторизации (по умолчанию из переменной окружения MOSREG_TOKEN)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.token = token or os.getenv("MOSREG_TOKEN")
         if not self.token:
             raise ValueError("Необходимо указать токен в переменной окружения MOSREG_TOKEN")
         
@@ -1,4 +1,5 @@
 import os
+import re
 import json
 import time
 from datetime import datetime
@@ -10,20 +11,64 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+from lesson_line_classifier import line_classifier
+from tracing import traced, stage
+from progressive import report_partial
 
 # Загрузка переменных окружения
 load_dotenv()
 
+# Номер урока в ссылке на карточку урока
+LESSON_ID_RE = re.compile(r"/lessons?/(\d+)")
+
+# Класс ученика в тексте дневника: "Класс: 9-А", "9 «А» класс", "10Б класс"
+CLASS_RES = (
+    re.compile(r"[Кк]ласс\s*:?\s*(\d{1,2})\s*[-–«\"']?\s*([А-ЯЁа-яё])(?![А-ЯЁа-яё])"),
+    re.compile(r"(?<!\d)(\d{1,2})\s*[-–«\"']?\s*([А-ЯЁа-яё])\s*[»\"']?\s+класс"),
+)
+# Строка с названием школы
+SCHOOL_RE = re.compile(r"^.*(?:МБОУ|МАОУ|МОУ|МКОУ|ГБОУ|[Шш]кола|[Лл]ицей|[Гг]имназия).*$", re.M)
+
+# Адрес МЭШ по умолчанию
+DEFAULT_BASE_URL = "https://authedu.mosreg.ru"
+
+# Паузы для загрузки страниц в секундах
+NAVIGATION_DELAYS = {
+    "login": 2,
+    "login_refresh": 3,
+    "schedules": 5,
+    "schedule": 7,
+}
+
+def parse_class_info(text):
+    """
+    Находит школу и класс ученика в тексте страницы дневника
+    :return: Словарь {"school": название или None, "class": "9А"} или None, если класс не найден
+    """
+    for pattern in CLASS_RES:
+        match = pattern.search(text)
+        if match:
+            break
+    else:
+        return None
+    school = SCHOOL_RE.search(text)
+    return {
+        "school": " ".join(school.group(0).split()) if school else None,
+        "class": f"{int(match.group(1))}{match.group(2).upper()}",
+    }
+
 class MosregSchedule:
-    def __init__(self, headless=False, cookies_file="cookies.json", browser=None):  # Добавлен параметр browser
+    def __init__(self, headless=False, cookies_file="cookies.json", browser=None, base_url=DEFAULT_BASE_URL):  # Добавлен параметр browser
         """
         Инициализация класса для получения расписания из МЭШ
         :param headless: Запуск браузера в фоновом режиме (без графического интерфейса)
         :param cookies_file: Путь к файлу с куками
         :param browser: Уже созданный экземпляр браузера Chrome
+        :param base_url: Адрес МЭШ (для тестового сервера, например http://127.0.0.1:8000)
         """
         # Если браузер уже предоставлен, cookies_file может быть необязательным
         self.cookies_file = cookies_file
+        self.base_url = base_url.rstrip("/")
         
         if browser:
             # Используем уже созданный браузер
@@ -73,6 +118,7 @@ class MosregSchedule:
             print("Загрузка куки и авторизация...")
             self.login_with_cookies()
     
+    @traced("portal.login")
     def login_with_cookies(self):
         """
         Авторизация с помощью куки из файла
@@ -80,8 +126,8 @@ class MosregSchedule:
         try:
             # Сначала открываем главную страницу
             print("Загрузка домена для установки куки...")
-            self.driver.get("https://authedu.mosreg.ru/")
-            time.sleep(2)
+            self.driver.get(f"{self.base_url}/")
+            time.sleep(NAVIGATION_DELAYS["login"])
             
             # Загружаем куки из файла
             print(f"Загрузка куки из файла {self.cookies_file}...")
@@ -117,7 +163,7 @@ class MosregSchedule:
             # Обновляем страницу после установки кук
             print("Обновление страницы после установки кук...")
             self.driver.refresh()
-            time.sleep(3)
+            time.sleep(NAVIGATION_DELAYS["login_refresh"])
             
             # Сохраняем текущую страницу для отладки
             with open("after_login.html", "w", encoding="utf-8") as f:
@@ -139,6 +185,7 @@ class MosregSchedule:
                 f.write(self.driver.page_source)
             print("Страница с ошибкой сохранена в login_error.html")
     
+    @traced("portal.get_schedule")
     def get_schedule(self, date=None):
         """
         Получение расписания уроков на указанную дату
@@ -149,12 +196,13 @@ class MosregSchedule:
             date = datetime.now().strftime("%d-%m-%Y")
         
         # Открываем страницу расписания
-        url = f"https://authedu.mosreg.ru/diary/schedules"
+        url = f"{self.base_url}/diary/schedules"
         print(f"Открываем страницу списка расписаний: {url}")
         
         try:
+            stage("portal.open_schedules", sleep=NAVIGATION_DELAYS["schedules"])
             self.driver.get(url)
-            time.sleep(5)  # Даем больше времени для загрузки страницы
+            time.sleep(NAVIGATION_DELAYS["schedules"])  # Даем больше времени для загрузки страницы
             
             # Сохраняем текущую страницу для отладки
             with open("schedules_page.html", "w", encoding="utf-8") as f:
@@ -162,11 +210,12 @@ class MosregSchedule:
             print("Страница списка расписаний сохранена в schedules_page.html")
             
             # Теперь переходим на конкретную дату
-            url = f"https://authedu.mosreg.ru/diary/schedules/schedule/?date={date}"
+            url = f"{self.base_url}/diary/schedules/schedule/?date={date}"
             print(f"Открываем страницу расписания на дату: {url}")
             
+            stage("portal.open_date", sleep=NAVIGATION_DELAYS["schedule"])
             self.driver.get(url)
-            time.sleep(7)  # Даем еще больше времени для загрузки
+            time.sleep(NAVIGATION_DELAYS["schedule"])  # Даем еще больше времени для загрузки
             
             # Сохраняем текущую страницу для отладки
             with open("schedule_page.html", "w", encoding="utf-8") as f:
@@ -174,6 +223,7 @@ class MosregSchedule:
             print("Страница расписания сохранена в schedule_page.html")
             
             # Проверяем наличие сообщения об отсутствии уроков
+            stage("portal.find_lessons")
             try:
                 no_lessons_texts = ["Уроков и мероприятий нет", "Уроков и мероприятий на этот день не найдено"]
                 page_text = self.driver.find_element(By.TAG_NAME, "body").text
@@ -264,13 +314,9 @@ class MosregSchedule:
                 # Если не нашли явных указаний на отсутствие уроков, продолжаем поиск
             
             # Уроки, которые мы собрали
+            stage("portal.parse_cards", cards=len(lesson_elements))
             lessons = []
             
-            # Слова, которые указывают на то, что это не урок, а элемент интерфейса
-            interface_elements = ["дневник", "библиотека", "портфолио", "справка", "учащийся", 
-                                  "расписание", "задания", "оценки", "создать", 
-                                  "учёба", "школа", "олимпиады", "версия", "написать нам"]
-            
             # Если нашли элементы расписания через XPath
             if lesson_elements:
                 print("Обрабатываем найденные элементы урока...")
@@ -293,85 +339,20 @@ class MosregSchedule:
                         print(f"Элемент {i+1}, предмет: {subject}")
                         
                         # Проверяем, не является ли это элемент интерфейса
-                        if any(interface_word in subject.lower() for interface_word in interface_elements):
+                        if line_classifier.is_interface(subject):
                             print(f"Элемент {i+1} похож на элемент интерфейса, пропускаем")
                             continue
                         
-                        # Создаем информацию об уроке
-                        lesson_info = {
-                            "subject": subject,
-                            "start_time": "Не указано",
-                            "end_time": "Не указано",
-                            "room": "Не указано",
-                            "teacher": "Не указано",
-                            "homework": "Не указано"
-                        }
+                        # Разбираем текст карточки урока: каждая строка классифицируется один раз
+                        lesson_info = line_classifier.parse_card(subject, elem.text.strip())
                         
-                        # Пытаемся получить детали урока
-                        lesson_text = elem.text.strip()
-                        lines = lesson_text.split('\n')
-                        
-                        # Типичные фразы, указывающие на домашнее задание
-                        homework_indicators = [
-                            "дз:", "домашнее задание:", "задание:", "выполнить:", "учить", "прочитать", 
-                            "выучить", "сделать", "подготовить", "параграф", "упражнение", "ex.", "exercise",
-                            "activity", "student's book", "workbook", "п.", "стр.", "с.", "записать", "решить"
-                        ]
-                        
-                        # Типичные указания на учителя
-                        teacher_indicators = [
-                            "преподаватель:", "учитель:", "внеурочная деятельность", "элективный курс"
-                        ]
-                        
-                        for line in lines:
-                            line = line.strip()
-                            
-                            # Пропускаем пустые строки и название предмета
-                            if not line or line == subject:
-                                continue
-                            
-                            # Время (содержит двоеточие и обычно короткая строка)
-                            if ":" in line and len(line) < 20:
-                                if "-" in line:
-                                    parts = line.split("-")
-                                    lesson_info["start_time"] = parts[0].strip()
-                                    lesson_info["end_time"] = parts[1].strip()
-                                else:
-                                    lesson_info["start_time"] = line.strip()
-                            
-                            # Кабинет (обычно короткая строка с цифрами)
-                            elif any(char.isdigit() for char in line) and len(line) < 15 and not ":" in line:
-                                # Если в строке есть слово "Кабинет", извлекаем только номер
-                                if "кабинет" in line.lower():
-                                    lesson_info["room"] = line.split("кабинет", 1)[1].strip()
-                                else:
-                                    lesson_info["room"] = line.strip()
-                            
-                            # Определяем, является ли строка домашним заданием или информацией об учителе
-                            elif len(line) > 3:
-                                # Явные индикаторы домашнего задания
-                                is_homework = any(hw_ind.lower() in line.lower() for hw_ind in homework_indicators)
-                                # Явные индикаторы учителя
-                                is_teacher = any(teacher_ind.lower() in line.lower() for teacher_ind in teacher_indicators)
-                                
-                                if is_homework or (len(line) > 30 and not is_teacher):
-                                    # Если это явно домашнее задание или длинный текст (не учитель)
-                                    # Очищаем от префиксов типа "ДЗ:", "Домашнее задание:" и т.д.
-                                    homework = line
-                                    for prefix in ["дз:", "домашнее задание:", "задание:"]:
-                                        if homework.lower().startswith(prefix):
-                                            homework = homework[len(prefix):].strip()
-                                    
-                                    lesson_info["homework"] = homework
-                                elif is_teacher or (len(line) < 30 and not is_homework):
-                                    # Если это явно учитель или короткий текст (не ДЗ)
-                                    # Очищаем от префиксов типа "Учитель:", "Преподаватель:" и т.д.
-                                    teacher = line
-                                    for prefix in ["учитель:", "преподаватель:"]:
-                                        if teacher.lower().startswith(prefix):
-                                            teacher = teacher[len(prefix):].strip()
-                                    
-                                    lesson_info["teacher"] = teacher
+                        # Номер урока из ссылки на карточку (используется как устойчивый идентификатор)
+                        try:
+                            lesson_id_match = LESSON_ID_RE.search(elem.get_attribute("href") or "")
+                            if lesson_id_match:
+                                lesson_info["lesson_id"] = lesson_id_match.group(1)
+                        except:
+                            pass
                         
                         # Пытаемся получить домашнее задание через XPath
                         try:
@@ -383,21 +364,9 @@ class MosregSchedule:
                             # Если не нашли через XPath, возможно уже нашли через текст
                             pass
                         
-                        # Если имя учителя слишком длинное, возможно это домашнее задание
-                        if len(lesson_info["teacher"]) > 50 and lesson_info["homework"] == "Не указано":
-                            lesson_info["homework"] = lesson_info["teacher"]
-                            lesson_info["teacher"] = "Не указано"
-                        
-                        # Проверяем, не являются ли детали элементами интерфейса
-                        if any(interface_word in lesson_info["teacher"].lower() for interface_word in interface_elements):
-                            if not any(teacher_ind in lesson_info["teacher"].lower() for teacher_ind in teacher_indicators):
-                                lesson_info["teacher"] = "Не указано"
-                        
-                        if any(interface_word in lesson_info["room"].lower() for interface_word in interface_elements):
-                            lesson_info["room"] = "Не указано"
-                        
-                        # Добавляем урок в список
+                        # Добавляем урок в список и показываем уже разобранные уроки ожидающему пользователю
                         lessons.append(lesson_info)
+                        report_partial(lessons)
                         
                     except Exception as e:
                         print(f"Ошибка при обработке элемента {i+1}: {e}")
@@ -414,7 +383,7 @@ class MosregSchedule:
             for lesson in lessons:
                 subject = lesson["subject"]
                 # Пропускаем элементы, которые выглядят как элементы интерфейса
-                if any(interface_word in subject.lower() for interface_word in interface_elements):
+                if line_classifier.is_interface(subject):
                     continue
                     
                 if subject not in subjects_seen:
@@ -440,6 +409,24 @@ class MosregSchedule:
             print("HTML страницы с ошибкой сохранен в error_page.html")
             return None
     
+    @traced("portal.class_info")
+    def get_class_info(self):
+        """
+        Определение школы и класса ученика по странице дневника
+        :return: Словарь {"school": ..., "class": ...} или None, если определить не удалось
+        """
+        url = f"{self.base_url}/diary/schedules"
+        try:
+            stage("portal.open_schedules", sleep=NAVIGATION_DELAYS["schedules"])
+            self.driver.get(url)
+            time.sleep(NAVIGATION_DELAYS["schedules"])
+            info = parse_class_info(self.driver.find_element(By.TAG_NAME, "body").text)
+            print(f"Класс ученика: {info}")
+            return info
+        except Exception as e:
+            print(f"Ошибка при определении класса ученика: {e}")
+            return None
+    
     def close(self):
         """
         Закрытие браузера
@@ -0,0 +1,126 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Получатель уроков, разобранных скрейпером к текущему моменту (для постепенного ответа)
+_partial_sink = contextvars.ContextVar("partial_lessons_sink", default=None)
+
+
+def report_partial(lessons):
+    """
+    Передает уроки, разобранные к текущему моменту, тому, кто ждет расписание
+    (вызывается скрейпером в потоке; без получателя ничего не делает)
+    """
+    sink = _partial_sink.get()
+    if sink is not None:
+        sink(list(lessons))
+
+
+@contextlib.contextmanager
+def partial_lessons(callback):
+    """
+    Внутри блока уроки, о которых сообщает скрейпер (report_partial), передаются в callback
+    в цикле событий. Контекст попадает в поток скрейпера через tracing.wrap_context
+    """
+    loop = asyncio.get_running_loop()
+    token = _partial_sink.set(lambda lessons: loop.call_soon_threadsafe(callback, lessons))
+    try:
+        yield
+    finally:
+        _partial_sink.reset(token)
+
+
+class MessageUpdater:
+    """
+    Постепенное обновление одного сообщения: промежуточные версии (show) отправляются
+    не чаще раза в min_interval секунд - если версия пришла раньше, отправляется
+    последняя из накопившихся по истечении интервала. Окончательная версия (finish)
+    отправляется сразу и отменяет ожидающую промежуточную.
+    Совпадающий текст повторно не отправляется (Telegram отклоняет такие правки).
+
+    edit(text, reply_markup) - корутина, изменяющая сообщение.
+    """
+
+    def __init__(self, edit, min_interval=1.0, clock=time.monotonic):
+        self.edit = edit
+        self.min_interval = min_interval
+        self._clock = clock
+        self._last_edit = None
+        self._last = None
+        self._pending = None
+        self._flush_task = None
+        self._sending = False
+        self.edits = 0
+
+    async def show(self, text, reply_markup=None):
+        """
+        Промежуточная версия сообщения
+        """
+        self._pending = (text, reply_markup)
+        if self._flush_task is not None:
+            return
+        delay = self._delay()
+        if delay <= 0:
+            await self._send_pending()
+        else:
+            self._flush_task = asyncio.ensure_future(self._flush_later(delay))
+
+    def show_soon(self, text, reply_markup=None):
+        """
+        Промежуточная версия из синхронного кода (обратного вызова)
+        """
+        self._pending = (text, reply_markup)
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later(self._delay()))
+
+    async def finish(self, text, reply_markup=None):
+        """
+        Окончательная версия сообщения
+        """
+        task, self._flush_task = self._flush_task, None
+        if task is not None:
+            # Уже отправляемую промежуточную версию дожидаемся, чтобы она не легла поверх окончательной
+            if not self._sending:
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._pending = (text, reply_markup)
+        await self._send_pending()
+
+    def cancel(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending = None
+
+    def _delay(self):
+        if self._last_edit is None:
+            return 0
+        return self.min_interval - (self._clock() - self._last_edit)
+
+    async def _flush_later(self, delay):
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._sending = True
+            await self._send_pending()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении сообщения: {e}")
+        finally:
+            self._sending = False
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+
+    async def _send_pending(self):
+        pending, self._pending = self._pending, None
+        if pending is None or pending == self._last:
+            return
+        self._last = pending
+        self._last_edit = self._clock()
+        self.edits += 1
+        await self.edit(*pending)
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Источники результата обновления
+SOURCE_FETCHED = "fetched"      # данные получены этим запросом
+SOURCE_IN_FLIGHT = "in_flight"  # запрос присоединился к уже идущему получению
+SOURCE_RECENT = "recent"        # данные недавно получены по запросу другого пользователя
+
+
+class RefreshGovernor:
+    """
+    Ограничитель обновлений расписания по дате (общий для всех пользователей).
+
+    - Одновременные запросы одной даты объединяются в одно получение данных.
+    - Если дату недавно (за share_window секунд) уже получал кто-то другой,
+      повторное принудительное обновление не запускается.
+
+    Получение считается состоявшимся только после mark_fetched(key): fetch() может
+    вернуть сохраненные данные при ошибке источника, и такие данные свежими не считаются.
+    """
+
+    def __init__(self, share_window=120):
+        self.share_window = share_window
+        self._last_fetch = {}
+        self._in_flight = {}
+        self.stats = {SOURCE_FETCHED: 0, SOURCE_IN_FLIGHT: 0, SOURCE_RECENT: 0}
+
+    def fetched_recently(self, key, now=None):
+        """
+        Проверяет, получались ли данные для ключа за последние share_window секунд
+        """
+        if now is None:
+            now = time.time()
+        return now - self._last_fetch.get(key, 0) < self.share_window
+
+    def last_fetch_time(self, key):
+        return self._last_fetch.get(key)
+
+    def mark_fetched(self, key, now=None):
+        """
+        Отмечает, что для ключа получены новые данные
+        """
+        self._last_fetch[key] = time.time() if now is None else now
+
+    def mark_recent(self):
+        """
+        Учитывает запрос, обслуженный недавно полученными данными
+        """
+        self.stats[SOURCE_RECENT] += 1
+
+    async def run(self, key, fetch):
+        """
+        Выполняет fetch() для ключа или присоединяется к уже идущему получению
+        Возвращает кортеж (result, source)
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats[SOURCE_IN_FLIGHT] += 1
+            logger.info(f"Присоединяемся к уже идущему получению данных для {key}")
+            # shield: отмена одного ожидающего не должна отменять общий запрос
+            return await asyncio.shield(task), SOURCE_IN_FLIGHT
+
+        task = asyncio.ensure_future(fetch())
+        self._in_flight[key] = task
+        self.stats[SOURCE_FETCHED] += 1
+        try:
+            return await asyncio.shield(task), SOURCE_FETCHED
+        finally:
+            if task.done():
+                self._in_flight.pop(key, None)
+            else:
+                task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+    def forget(self, keys):
+        """
+        Удаляет сведения о прошлых получениях для указанных ключей
+        """
+        for key in keys:
+            self._last_fetch.pop(key, None)
+
+    def purge(self, now=None):
+        """
+        Удаляет сведения о получениях старше share_window секунд
+        """
+        if now is None:
+            now = time.time()
+        for key, fetched_at in list(self._last_fetch.items()):
+            if now - fetched_at >= self.share_window:
+                del self._last_fetch[key]
@@ -0,0 +1,86 @@
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def lessons_hash(lessons):
+    """
+    Вычисляет хэш содержимого списка уроков.
+    Используется как часть ключа кэша: если уроки изменились, ключ тоже изменится.
+    """
+    if not lessons:
+        return 0
+    return hash(tuple(lessons))
+
+
+class RenderCache:
+    """
+    Кэш готовых к отправке сообщений и клавиатур.
+
+    Ключ: (view, date, content_hash, hw_version), значение - произвольный
+    объект (обычно кортеж (text, reply_markup)). Размер ограничен,
+    при переполнении вытесняются давно не использованные записи.
+    """
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Индекс ключей по дате для быстрой инвалидации
+        self._keys_by_date = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Возвращает закэшированное значение или None
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Сохраняет значение в кэш
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._keys_by_date.setdefault(key[1], set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._forget_key(old_key)
+
+    def invalidate_date(self, date_str, view=None):
+        """
+        Удаляет все записи для указанной даты (или только для указанного представления)
+        """
+        keys = self._keys_by_date.get(date_str)
+        if not keys:
+            return 0
+
+        removed = 0
+        for key in list(keys):
+            if view is None or key[0] == view:
+                self._entries.pop(key, None)
+                self._forget_key(key)
+                removed += 1
+        return removed
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_date.clear()
+
+    def _forget_key(self, key):
+        keys = self._keys_by_date.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_date[key[1]]
+
+    def __len__(self):
+        return len(self._entries)
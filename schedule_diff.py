@@ -0,0 +1,116 @@
+import hashlib
+from typing import NamedTuple, Optional
+
+from lesson_model import Lesson
+
+# Типы изменений расписания
+LESSON_ADDED = "lesson_added"
+LESSON_REMOVED = "lesson_removed"
+LESSON_CHANGED = "lesson_changed"
+HOMEWORK_ADDED = "homework_added"
+HOMEWORK_REMOVED = "homework_removed"
+HOMEWORK_CHANGED = "homework_changed"
+
+HOMEWORK_EVENTS = (HOMEWORK_ADDED, HOMEWORK_REMOVED, HOMEWORK_CHANGED)
+
+
+class ScheduleChange(NamedTuple):
+    kind: str
+    date: str
+    key: str
+    old: Optional[Lesson] = None
+    new: Optional[Lesson] = None
+
+
+def lesson_key(lesson):
+    """
+    Возвращает устойчивый идентификатор урока: номер урока в МЭШ, если он известен,
+    иначе название предмета и время начала
+    """
+    if lesson.lesson_id:
+        return f"id:{lesson.lesson_id}"
+    start = lesson.start_time.strftime("%H:%M") if lesson.start_time else ""
+    return f"{' '.join(lesson.subject.lower().split())}@{start}"
+
+
+def lesson_keys(lessons):
+    """
+    Возвращает список идентификаторов уроков дня (повторяющиеся идентификаторы получают суффикс #N)
+    """
+    keys = []
+    seen = {}
+    for lesson in lessons or ():
+        key = lesson_key(lesson)
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        keys.append(key if count == 0 else f"{key}#{count + 1}")
+    return keys
+
+
+def lesson_token(key):
+    """
+    Короткий код идентификатора урока для callback_data кнопок (не длиннее 8 символов)
+    """
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=4).hexdigest()
+
+
+def keys_for_subset(lessons, subset):
+    """
+    Возвращает идентификаторы для уроков subset - подпоследовательности lessons
+    (например, уроков, оставшихся после фильтрации). Идентификаторы вычисляются
+    по полному списку, поэтому не зависят от фильтра. Уроки сравниваются по значению:
+    subset может быть взят из кэша отрисовки и состоять из копий уроков lessons.
+    """
+    keys = lesson_keys(lessons)
+    result = []
+    position = 0
+    for lesson in subset or ():
+        while position < len(lessons) and lessons[position] != lesson:
+            position += 1
+        if position < len(lessons):
+            result.append(keys[position])
+            position += 1
+        else:
+            result.append(lesson_key(lesson))
+    return result
+
+
+def _homework_text(lesson):
+    return lesson.homework if lesson is not None and lesson.has_homework else None
+
+
+def diff_schedules(date_str, old_lessons, new_lessons):
+    """
+    Сравнивает два списка уроков за один день
+    Возвращает список ScheduleChange: добавленные, удаленные и измененные уроки,
+    а также появившиеся, удаленные и измененные домашние задания
+    """
+    old_by_key = dict(zip(lesson_keys(old_lessons), old_lessons or ()))
+    new_by_key = dict(zip(lesson_keys(new_lessons), new_lessons or ()))
+
+    changes = []
+    for key, new in new_by_key.items():
+        old = old_by_key.get(key)
+        if old is None:
+            changes.append(ScheduleChange(LESSON_ADDED, date_str, key, None, new))
+        elif (old.start_time, old.end_time, old.room, old.teacher) != (new.start_time, new.end_time, new.room, new.teacher):
+            changes.append(ScheduleChange(LESSON_CHANGED, date_str, key, old, new))
+
+        old_homework = _homework_text(old)
+        new_homework = _homework_text(new)
+        if old_homework != new_homework:
+            if old_homework is None:
+                kind = HOMEWORK_ADDED
+            elif new_homework is None:
+                kind = HOMEWORK_REMOVED
+            else:
+                kind = HOMEWORK_CHANGED
+            changes.append(ScheduleChange(kind, date_str, key, old, new))
+
+    for key, old in old_by_key.items():
+        if key not in new_by_key:
+            changes.append(ScheduleChange(LESSON_REMOVED, date_str, key, old, None))
+            if _homework_text(old) is not None:
+                changes.append(ScheduleChange(HOMEWORK_REMOVED, date_str, key, old, None))
+
+    return changes
@@ -0,0 +1,205 @@
+"""
+Сервис расписания: отдельный процесс, который владеет браузером, кэшем расписания
+и ограничителем обновлений. Обработчики Telegram (mosh_telegram_bot.py с переменной
+SCHEDULE_SERVICE_URL) запрашивают у него расписание по HTTP, поэтому при нескольких
+обработчиках МЭШ по-прежнему опрашивает один браузер, а одинаковые запросы объединяются.
+
+API:
+    GET /schedule?date=DD-MM-YYYY[&refresh=1][&account=имя учетной записи МЭШ][&priority=interactive|broadcast|background]
+        {"day": DaySchedule.pack(), "source": ..., "updated": {...} | null, "class_key": ...}
+    GET /health
+        {"status": "ok", "scrape_workers": [...], "scrape_queue_depth": ...} (процессы при SCRAPE_WORKERS)
+    GET /metrics
+
+Запуск:
+    python schedule_service.py   (адрес: SCHEDULE_SERVICE_HOST, SCHEDULE_SERVICE_PORT)
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+SERVICE_HOST = os.getenv("SCHEDULE_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SCHEDULE_SERVICE_PORT", "8085"))
+# Сколько обработчик ждет ответа сервиса (запуск браузера и получение расписания)
+SERVICE_TIMEOUT = float(os.getenv("SCHEDULE_SERVICE_TIMEOUT", "60"))
+
+
+class ScheduleServiceError(Exception):
+    """
+    Сервис расписания недоступен или вернул ошибку
+    """
+
+
+class ScheduleServiceClient:
+    """
+    Клиент сервиса расписания для обработчиков Telegram
+    """
+
+    def __init__(self, base_url, timeout=SERVICE_TIMEOUT):
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.AsyncClient(timeout=timeout, trust_env=False)
+        self._errors = (httpx.HTTPError, ValueError)
+
+    async def get_schedule(self, date, force_refresh=False, account=None, priority=None):
+        """
+        Возвращает ответ сервиса: словарь с упакованным расписанием дня (day),
+        источником (source) и сведениями о последнем обновлении (updated)
+        """
+        params = {"date": date}
+        if force_refresh:
+            params["refresh"] = "1"
+        if account:
+            params["account"] = account
+        if priority:
+            params["priority"] = priority
+        try:
+            response = await self._client.get(f"{self.base_url}/schedule", params=params)
+            response.raise_for_status()
+            return response.json()
+        except self._errors as e:
+            raise ScheduleServiceError(f"Сервис расписания {self.base_url}: {e}") from e
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class ScheduleServiceServer:
+    """
+    HTTP-сервер сервиса расписания.
+    Запросы принимаются в потоках сервера, а получение расписания (fetch - корутина
+    fetch(date, force_refresh, account, priority), возвращающая словарь ответа) выполняется в цикле событий loop.
+    """
+
+    def __init__(self, fetch, loop, host=SERVICE_HOST, port=SERVICE_PORT, render_metrics=None, health=None):
+        self.fetch = fetch
+        self.loop = loop
+        self.render_metrics = render_metrics
+        self.health = health
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                service._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="schedule-service", daemon=True)
+        self._thread.start()
+        logger.info(f"Сервис расписания доступен по адресу {self.address}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handle(self, request):
+        parsed = urlparse(request.path)
+        if parsed.path == "/health":
+            status = {"status": "ok"}
+            if self.health is not None:
+                status.update(self.health())
+            self._send(request, 200, status)
+            return
+        if parsed.path == "/metrics" and self.render_metrics is not None:
+            body = self.render_metrics().encode("utf-8")
+            request.send_response(200)
+            request.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            request.send_header("Content-Length", str(len(body)))
+            request.end_headers()
+            request.wfile.write(body)
+            return
+        if parsed.path != "/schedule":
+            request.send_error(404)
+            return
+
+        query = parse_qs(parsed.query)
+        date = query.get("date", [""])[0]
+        force_refresh = query.get("refresh", ["0"])[0] == "1"
+        account = query.get("account", [None])[0]
+        priority = query.get("priority", [None])[0]
+        try:
+            datetime.strptime(date, "%d-%m-%Y")
+        except ValueError:
+            self._send(request, 400, {"error": "Дата должна быть в формате DD-MM-YYYY"})
+            return
+
+        future = asyncio.run_coroutine_threadsafe(self.fetch(date, force_refresh, account, priority), self.loop)
+        try:
+            result = future.result(timeout=SERVICE_TIMEOUT)
+        except Exception as e:
+            future.cancel()
+            logger.error(f"Ошибка сервиса расписания для {date}: {e}")
+            self._send(request, 500, {"error": str(e)})
+            return
+        self._send(request, 200, result)
+
+    @staticmethod
+    def _send(request, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json; charset=utf-8")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+
+async def serve(bot, host=SERVICE_HOST, port=SERVICE_PORT):
+    """
+    Запускает сервис расписания на функциях получения расписания из mosh_telegram_bot
+    """
+    import metrics
+
+    bot.load_cache()
+    bot.load_last_update_times()
+    bot.load_account_classes()
+    server = ScheduleServiceServer(bot.schedule_service_response, asyncio.get_running_loop(),
+                                   host, port, render_metrics=metrics.registry.render,
+                                   health=bot.scrape_health).start()
+    bot.loop_monitor.start()
+    try:
+        while True:
+            # Очистка кэша раз в 6 часов, как в боте
+            await asyncio.sleep(21600)
+            bot.clean_schedule_cache()
+    finally:
+        server.stop()
+        await bot.loop_monitor.stop()
+
+
+def main():
+    import mosh_telegram_bot as bot
+
+    if bot.SCHEDULE_SERVICE_URL:
+        logger.error("SCHEDULE_SERVICE_URL задан: сервис расписания должен сам получать данные из МЭШ")
+        return
+    try:
+        asyncio.run(serve(bot))
+    except KeyboardInterrupt:
+        logger.info("Сервис расписания остановлен")
+    finally:
+        bot.close_browser()
+        bot.thread_pool.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
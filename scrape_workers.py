@@ -0,0 +1,408 @@
+"""
+Процессы получения расписания из МЭШ.
+
+Каждый процесс-исполнитель владеет своим браузером и выполняет по одному заданию
+(метод MosregSchedule учетной записи). Ожидание ответа не занимает потоков бота,
+а при превышении времени процесс вместе с браузером принудительно завершается
+и запускается заново - зависший chromedriver не держит место в пуле.
+
+Задания, для которых нет свободного процесса, ждут в очереди ограниченной длины;
+при ее переполнении новое задание сразу отклоняется (ScrapeQueueFull).
+"""
+import asyncio
+import collections
+import functools
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeWorkerError(Exception):
+    """
+    Ошибка при выполнении задания в процессе-исполнителе
+    """
+
+
+class ScrapeTimeout(ScrapeWorkerError):
+    """
+    Задание не выполнено за отведенное время (процесс перезапущен)
+    """
+
+
+class ScrapeQueueFull(ScrapeWorkerError):
+    """
+    Очередь заданий переполнена
+    """
+
+
+def create_scheduler(account, base_url):
+    """
+    Запускает Chrome и создает MosregSchedule учетной записи (None, если браузер не запустился)
+    """
+    from webdriver_manager.chrome import ChromeDriverManager
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from mosreg_schedule_selenium import MosregSchedule
+
+    try:
+        # Настройка опций Chrome
+        chrome_options = webdriver.ChromeOptions()
+        chrome_options.add_argument('--headless')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--window-size=1920,1080')
+
+        try:
+            # Попытка использовать ChromeDriverManager
+            service = Service(executable_path=ChromeDriverManager().install())
+            browser = webdriver.Chrome(service=service, options=chrome_options)
+            logger.info("ChromeDriver успешно запущен через ChromeDriverManager")
+        except Exception as driver_err:
+            logger.error(f"Ошибка при установке через ChromeDriverManager: {driver_err}")
+            # Резервный вариант - системный Chrome
+            try:
+                browser = webdriver.Chrome(options=chrome_options)
+                logger.info("Chrome запущен через системный браузер")
+            except Exception as sys_err:
+                logger.error(f"Не удалось запустить Chrome: {sys_err}")
+                return None
+
+        # Инициализируем MosregSchedule с запущенным браузером
+        return MosregSchedule(browser=browser, cookies_file=account.cookies_file, base_url=base_url)
+    except Exception as e:
+        logger.error(f"Ошибка при создании экземпляра планировщика: {e}")
+        return None
+
+
+def _close_quietly(scheduler):
+    try:
+        scheduler.close()
+    except Exception as e:
+        logger.error(f"Ошибка при закрытии браузера: {e}")
+
+
+def _worker_main(conn, factory, idle_timeout):
+    """
+    Цикл процесса-исполнителя: задания (account, method, args) -> ("ok", результат) или ("error", текст)
+    """
+    logging.basicConfig(format="%(asctime)s - %(name)s[%(process)d] - %(levelname)s - %(message)s",
+                        level=logging.INFO)
+    # Отдельная группа процессов: при принудительном завершении вместе с исполнителем
+    # завершаются chromedriver и Chrome
+    if hasattr(os, "setsid"):
+        os.setsid()
+
+    # Браузер открыт для одной учетной записи: (имя, MosregSchedule)
+    current = None
+    while True:
+        # Простаивающий браузер закрываем, процесс продолжает ждать заданий
+        if not conn.poll(idle_timeout):
+            if current is not None:
+                logger.info(f"Закрываем простаивающий браузер учетной записи {current[0]}")
+                _close_quietly(current[1])
+                current = None
+            continue
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        account, method, args = job
+        try:
+            if current is None or current[0] != account.name:
+                if current is not None:
+                    _close_quietly(current[1])
+                    current = None
+                scheduler = factory(account)
+                if scheduler is None:
+                    raise RuntimeError("не удалось запустить браузер")
+                current = (account.name, scheduler)
+            result = getattr(current[1], method)(*args)
+            conn.send(("ok", result))
+        except Exception as e:
+            # После ошибки браузер может быть в неизвестном состоянии - откроем заново
+            if current is not None:
+                _close_quietly(current[1])
+                current = None
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    if current is not None:
+        _close_quietly(current[1])
+
+
+class _Worker:
+    """
+    Процесс-исполнитель и его состояние (для отчета о здоровье пула)
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.account = None
+        self.busy = False
+        self.jobs = 0
+        self.failures = 0
+        self.restarts = 0
+        self.started_at = None
+        self.last_error = None
+        # Задача перезапуска процесса (пока он идет, процесс не возвращается в пул)
+        self.restarting = None
+
+
+class ScrapeWorkerPool:
+    """
+    Пул процессов-исполнителей.
+
+    size - число процессов (и одновременно открытых браузеров);
+    factory(account) - создает объект с методами get_schedule/get_class_info (в процессе-исполнителе,
+    поэтому должна импортироваться по имени: функция модуля или functools.partial от нее);
+    timeout - время на одно задание по умолчанию; max_queue - сколько заданий может ждать
+    свободного процесса; on_restart(reason) - вызывается при перезапуске процесса.
+    """
+
+    def __init__(self, size=2, factory=None, timeout=30, max_queue=20, idle_timeout=600, on_restart=None):
+        self.size = size
+        self.factory = factory
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.idle_timeout = idle_timeout
+        self.on_restart = on_restart
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [_Worker(index) for index in range(size)]
+        self._idle = []
+        self._waiters = collections.deque()
+        self.rejected = 0
+        self._started = False
+
+    def start(self):
+        if self._started:
+            return self
+        for worker in self._workers:
+            self._spawn(worker)
+            self._idle.append(worker)
+        self._started = True
+        logger.info(f"Запущено процессов получения расписания: {self.size}")
+        return self
+
+    def stop(self):
+        """
+        Завершает процессы (браузеры закрываются в самих процессах)
+        """
+        for worker in self._workers:
+            if worker.process is None:
+                continue
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            worker.process.join(timeout=5)
+            # Группа завершается и после выхода процесса: браузер упавшего процесса мог остаться
+            self._kill(worker)
+            worker.conn.close()
+            worker.process = None
+        self._idle.clear()
+        self._started = False
+
+    @property
+    def queue_depth(self):
+        """
+        Сколько заданий ждет свободного процесса
+        """
+        return len(self._waiters)
+
+    def alive_count(self):
+        return sum(1 for worker in self._workers if worker.process is not None and worker.process.is_alive())
+
+    def restarts(self):
+        return sum(worker.restarts for worker in self._workers)
+
+    def health(self):
+        """
+        Состояние процессов: номер, pid, жив ли, занят ли, учетная запись браузера,
+        выполнено заданий, ошибок, перезапусков, время работы и последняя ошибка
+        """
+        now = time.time()
+        return [{
+            "worker": worker.index,
+            "pid": worker.process.pid if worker.process is not None else None,
+            "alive": worker.process is not None and worker.process.is_alive(),
+            "busy": worker.busy,
+            "account": worker.account,
+            "jobs": worker.jobs,
+            "failures": worker.failures,
+            "restarts": worker.restarts,
+            "uptime": now - worker.started_at if worker.started_at else 0,
+            "last_error": worker.last_error,
+        } for worker in self._workers]
+
+    async def run(self, account, method, *args, timeout=None):
+        """
+        Выполняет метод объекта учетной записи в свободном процессе и возвращает результат
+        """
+        if not self._started:
+            self.start()
+        worker = await self._acquire(account.name)
+        try:
+            return await self._call(worker, account, method, args, timeout or self.timeout)
+        finally:
+            if worker.restarting is None:
+                self._release(worker)
+            else:
+                # Задание отменено во время перезапуска - процесс вернется в пул после него
+                worker.restarting.add_done_callback(lambda _: self._release(worker))
+
+    async def _acquire(self, account_name):
+        if self._idle:
+            # Предпочитаем процесс, в котором уже открыт браузер этой учетной записи
+            for worker in self._idle:
+                if worker.account == account_name:
+                    break
+            else:
+                worker = self._idle[0]
+            self._idle.remove(worker)
+            worker.busy = True
+            return worker
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise ScrapeQueueFull(f"очередь заданий переполнена ({self.max_queue})")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            worker = await waiter
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # Процесс уже передан этому заданию - возвращаем его в пул
+                self._release(waiter.result())
+            raise
+        worker.busy = True
+        return worker
+
+    def _release(self, worker):
+        worker.busy = False
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(worker)
+                return
+        self._idle.append(worker)
+
+    async def _call(self, worker, account, method, args, timeout):
+        if not worker.process.is_alive():
+            await asyncio.shield(self._restart(worker, "crash"))
+
+        loop = asyncio.get_running_loop()
+        worker.jobs += 1
+        try:
+            worker.conn.send((account, method, args))
+        except (OSError, ValueError) as e:
+            await asyncio.shield(self._fail(worker, f"процесс недоступен: {e}", "crash"))
+            raise ScrapeWorkerError(worker.last_error) from e
+        worker.account = account.name
+
+        # Ждем ответа без потока: цикл событий следит за каналом процесса
+        ready = loop.create_future()
+        fd = worker.conn.fileno()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            await asyncio.shield(self._fail(worker, f"нет ответа за {timeout:g} с", "timeout"))
+            raise ScrapeTimeout(worker.last_error) from None
+        except asyncio.CancelledError:
+            # Ответ отмененного задания нельзя отделить от следующего - перезапускаем процесс
+            # (не дожидаясь: процесс вернется в пул после перезапуска)
+            self._fail(worker, "задание отменено", "cancelled")
+            raise
+        finally:
+            loop.remove_reader(fd)
+
+        try:
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            await asyncio.shield(self._fail(worker, "процесс завершился во время задания", "crash"))
+            raise ScrapeWorkerError(worker.last_error) from e
+        if status != "ok":
+            worker.failures += 1
+            worker.last_error = payload
+            raise ScrapeWorkerError(payload)
+        return payload
+
+    def _fail(self, worker, error, reason):
+        """
+        Учитывает ошибку процесса и запускает его перезапуск, возвращает задачу перезапуска
+        """
+        worker.failures += 1
+        worker.last_error = error
+        logger.error(f"Процесс получения расписания {worker.index} (pid {worker.process.pid}): {error}, перезапускаем")
+        return self._restart(worker, reason)
+
+    def _spawn(self, worker):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.factory, self.idle_timeout),
+            name=f"scrape-worker-{worker.index}", daemon=True)
+        process.start()
+        child_conn.close()
+        worker.process = process
+        worker.conn = parent_conn
+        worker.account = None
+        worker.started_at = time.time()
+
+    def _kill(self, worker):
+        """
+        Завершает процесс вместе с его группой (chromedriver и Chrome); группа завершается
+        и тогда, когда сам процесс уже упал
+        """
+        process = worker.process
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except ProcessLookupError:
+            # Процесс еще не создал свою группу (или группы уже нет)
+            if process.is_alive():
+                process.kill()
+        except PermissionError:
+            process.kill()
+        process.join(timeout=5)
+
+    def _replace_process(self, worker):
+        self._kill(worker)
+        worker.conn.close()
+        self._spawn(worker)
+
+    def _restart(self, worker, reason):
+        """
+        Перезапускает процесс в потоке (ожидание завершения и запуск нового процесса
+        не задерживают цикл событий), возвращает задачу перезапуска
+        """
+        if worker.restarting is None:
+            worker.restarting = asyncio.ensure_future(self._restart_process(worker, reason))
+        return worker.restarting
+
+    async def _restart_process(self, worker, reason):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._replace_process, worker)
+        finally:
+            worker.restarting = None
+        worker.restarts += 1
+        if self.on_restart is not None:
+            self.on_restart(reason)
+
+def default_factory(base_url):
+    """
+    Фабрика браузеров МЭШ для процессов-исполнителей
+    """
+    return functools.partial(create_scheduler, base_url=base_url)
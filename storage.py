@@ -0,0 +1,220 @@
+import logging
+import pickle
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+logger = logging.getLogger(__name__)
+
+
+class SqliteStorage:
+    """
+    Общее хранилище состояния бота в файле SQLite.
+
+    Несколько процессов-обработчиков на одной машине открывают один файл:
+    настройки чатов хранятся построчно (пространство имен, ключ, значение pickle),
+    отметки ДЗ - по одной строке на урок с возрастающим номером изменения,
+    по которому процессы подтягивают изменения друг друга.
+    """
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS namespaces (
+                namespace TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS hw_status (
+                user NOT NULL,
+                date TEXT NOT NULL,
+                lesson_key TEXT NOT NULL,
+                done INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                PRIMARY KEY (user, date, lesson_key)
+            );
+            CREATE INDEX IF NOT EXISTS hw_status_seq ON hw_status (seq);
+        """)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, statements):
+        """
+        Выполняет запросы в одной транзакции (BEGIN IMMEDIATE - сразу берет блокировку записи)
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # --- Настройки (пространства имен ключ-значение) ---
+
+    def version(self, namespace):
+        """
+        Номер версии пространства имен (растет при каждом изменении)
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM namespaces WHERE namespace = ?", (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def load(self, namespace):
+        """
+        Возвращает (версия, словарь) для пространства имен
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute("SELECT version FROM namespaces WHERE namespace = ?", (namespace,)).fetchone()
+                rows = self._conn.execute("SELECT key, value FROM kv WHERE namespace = ?", (namespace,)).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        return (row[0] if row else 0), {key: pickle.loads(value) for key, value in rows}
+
+    def _bump(self, namespace):
+        return ("INSERT INTO namespaces (namespace, version) VALUES (?, 1) "
+                "ON CONFLICT (namespace) DO UPDATE SET version = version + 1", (namespace,))
+
+    def put(self, namespace, key, value):
+        self._write([
+            ("INSERT INTO kv (namespace, key, value) VALUES (?, ?, ?) "
+             "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+             (namespace, key, pickle.dumps(value))),
+            self._bump(namespace),
+        ])
+
+    def delete(self, namespace, key):
+        self._write([
+            ("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)),
+            self._bump(namespace),
+        ])
+
+    def put_many(self, namespace, items):
+        self._write([
+            ("INSERT INTO kv (namespace, key, value) VALUES (?, ?, ?) "
+             "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+             (namespace, key, pickle.dumps(value)))
+            for key, value in items.items()
+        ] + [self._bump(namespace)])
+
+    # --- Отметки ДЗ ---
+
+    def put_homework_status(self, user, date_str, lesson_key, done):
+        self._write([(
+            "INSERT INTO hw_status (user, date, lesson_key, done, seq) "
+            "VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM hw_status)) "
+            "ON CONFLICT (user, date, lesson_key) DO UPDATE SET done = excluded.done, seq = excluded.seq",
+            (user, date_str, lesson_key, int(done)),
+        )])
+
+    def put_homework_statuses(self, records):
+        """
+        Записывает отметки (user, date, lesson_key, done) одной транзакцией (перенос из файлов)
+        """
+        self._write([(
+            "INSERT INTO hw_status (user, date, lesson_key, done, seq) "
+            "VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM hw_status)) "
+            "ON CONFLICT (user, date, lesson_key) DO UPDATE SET done = excluded.done, seq = excluded.seq",
+            (user, date_str, lesson_key, int(done)),
+        ) for user, date_str, lesson_key, done in records])
+
+    def homework_changes(self, after_seq):
+        """
+        Возвращает отметки, измененные после after_seq: [(user, date, lesson_key, done, seq), ...]
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT user, date, lesson_key, done, seq FROM hw_status WHERE seq > ? ORDER BY seq",
+                (after_seq,)).fetchall()
+
+    def remove_homework_dates(self, dates):
+        dates = list(dates)
+        if dates:
+            self._write([("DELETE FROM hw_status WHERE date = ?", (date_str,)) for date_str in dates])
+
+
+class SharedDict(MutableMapping):
+    """
+    Словарь, сохраняющий каждое изменение ключа в общем хранилище.
+    Перед чтением проверяет версию пространства имен и при необходимости
+    перечитывает его, чтобы видеть изменения других процессов.
+
+    Значения сохраняются целиком при присваивании: изменение вложенного
+    словаря нужно записывать заново (d[key] = new_value).
+    """
+
+    def __init__(self, storage, namespace):
+        self.storage = storage
+        self.namespace = namespace
+        self._version, self._data = storage.load(namespace)
+
+    def _refresh(self):
+        if self.storage.version(self.namespace) != self._version:
+            self._version, self._data = self.storage.load(self.namespace)
+
+    def __getitem__(self, key):
+        self._refresh()
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self.storage.put(self.namespace, key, value)
+        self._data[key] = value
+        self._version = None
+
+    def __delitem__(self, key):
+        self._refresh()
+        if key not in self._data:
+            raise KeyError(key)
+        self.storage.delete(self.namespace, key)
+        del self._data[key]
+        self._version = None
+
+    def __iter__(self):
+        self._refresh()
+        return iter(list(self._data))
+
+    def __len__(self):
+        self._refresh()
+        return len(self._data)
+
+    def __contains__(self, key):
+        self._refresh()
+        return key in self._data
+
+    def update_from(self, data):
+        """
+        Записывает в хранилище все ключи словаря одной транзакцией
+        """
+        if data:
+            self.storage.put_many(self.namespace, data)
+            self._data.update(data)
+            self._version = None
+
+
+def open_storage(url):
+    """
+    Открывает общее хранилище по адресу вида sqlite:///path/to/bot.db
+    Возвращает None, если адрес не задан (состояние хранится в файлах процесса)
+    """
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        logger.info(f"Общее хранилище состояния: SQLite {path}")
+        return SqliteStorage(path)
+    raise ValueError(f"Неподдерживаемый адрес хранилища: {url}")
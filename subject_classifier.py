@@ -0,0 +1,147 @@
+import re
+from typing import NamedTuple
+
+# Правила классификации предметов: (ключевое слово, эмодзи, категория)
+# Порядок важен: при совпадении нескольких ключевых слов выбирается первое по списку
+DEFAULT_SUBJECT_RULES = (
+    ("математика", "🔢", "математика"),
+    ("алгебра", "🧮", "математика"),
+    ("геометрия", "📐", "математика"),
+    ("русский", "🇷🇺", "языки"),
+    ("литература", "📚", "языки"),
+    ("английский", "🇬🇧", "языки"),
+    ("иностранный", "🌍", "языки"),
+    ("история", "🏛️", "общество"),
+    ("обществознание", "👥", "общество"),
+    ("география", "🗺️", "естествознание"),
+    ("биология", "🧬", "естествознание"),
+    ("химия", "🧪", "естествознание"),
+    ("физика", "⚛️", "естествознание"),
+    ("информатика", "💻", "информатика"),
+    ("физическая культура", "🏃‍♂️", "спорт"),
+    ("физкультура", "🏋️", "спорт"),
+    ("изо", "🎨", "искусство"),
+    ("музыка", "🎵", "искусство"),
+    ("технология", "🔧", "технология"),
+    ("обж", "🚨", "обж"),
+    ("группа", "👥", "группа"),
+)
+
+# Правила игнорирования: (префикс названия, исключения)
+# Предмет игнорируется, если начинается с префикса и не содержит ни одного из исключений
+DEFAULT_IGNORE_RULES = (
+    ("группа", ("_ров",)),
+)
+
+DEFAULT_EMOJI = "📝"
+DEFAULT_CATEGORY = "прочее"
+
+# Максимальное число запомненных названий предметов
+MAX_MEMO_SIZE = 4096
+
+
+class SubjectInfo(NamedTuple):
+    emoji: str
+    category: str
+    ignored: bool
+
+
+def normalize_ignore_rules(ignore_rules):
+    """
+    Приводит правила игнорирования к хешируемому виду ((prefix, (exception, ...)), ...)
+    """
+    return tuple(
+        (prefix.lower(), tuple(exception.lower() for exception in exceptions))
+        for prefix, exceptions in ignore_rules
+    )
+
+
+class SubjectClassifier:
+    """
+    Классификатор предметов: за один проход по названию определяет эмодзи,
+    категорию и признак игнорирования.
+
+    Все ключевые слова собраны в одно регулярное выражение, которое компилируется
+    один раз при создании классификатора. Результаты запоминаются для каждого
+    встреченного названия предмета.
+    """
+
+    def __init__(self, rules=DEFAULT_SUBJECT_RULES, ignore_rules=DEFAULT_IGNORE_RULES):
+        self.rules = tuple((keyword.lower(), emoji, category) for keyword, emoji, category in rules)
+        self.ignore_rules = normalize_ignore_rules(ignore_rules)
+        # Ключ, однозначно описывающий набор правил (используется в ключах кэша отрисовки)
+        self.key = hash((self.rules, self.ignore_rules))
+
+        self._rule_index = {}
+        for index, (keyword, _, _) in enumerate(self.rules):
+            self._rule_index.setdefault(keyword, index)
+
+        # Просмотр вперед позволяет найти совпадения, начинающиеся в каждой позиции,
+        # в том числе перекрывающиеся
+        keywords = sorted(self._rule_index, key=self._rule_index.get)
+        if keywords:
+            alternation = "|".join(re.escape(keyword) for keyword in keywords)
+            self._keywords_re = re.compile(f"(?=({alternation}))")
+        else:
+            self._keywords_re = None
+
+        self._ignore_res = [
+            (re.compile(re.escape(prefix)), [re.compile(re.escape(exception)) for exception in exceptions])
+            for prefix, exceptions in self.ignore_rules
+        ]
+        self._memo = {}
+
+    def classify(self, subject):
+        """
+        Возвращает SubjectInfo для названия предмета
+        """
+        info = self._memo.get(subject)
+        if info is not None:
+            return info
+
+        subject_lower = subject.lower()
+
+        emoji = DEFAULT_EMOJI
+        category = DEFAULT_CATEGORY
+        if self._keywords_re is not None:
+            best_index = None
+            for match in self._keywords_re.finditer(subject_lower):
+                index = self._rule_index[match.group(1)]
+                if best_index is None or index < best_index:
+                    best_index = index
+                    if index == 0:
+                        break
+            if best_index is not None:
+                _, emoji, category = self.rules[best_index]
+
+        ignored = False
+        for prefix_re, exception_res in self._ignore_res:
+            if prefix_re.match(subject_lower) and not any(exception_re.search(subject_lower) for exception_re in exception_res):
+                ignored = True
+                break
+
+        info = SubjectInfo(emoji, category, ignored)
+        if len(self._memo) >= MAX_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[subject] = info
+        return info
+
+
+# Классификаторы для разных наборов правил игнорирования
+_classifiers = {}
+
+
+def get_classifier(ignore_rules=None):
+    """
+    Возвращает классификатор для указанного набора правил игнорирования
+    (по умолчанию - стандартные правила). Классификаторы создаются один раз.
+    """
+    if ignore_rules is None:
+        ignore_rules = DEFAULT_IGNORE_RULES
+    rules_key = normalize_ignore_rules(ignore_rules)
+
+    classifier = _classifiers.get(rules_key)
+    if classifier is None:
+        classifier = SubjectClassifier(ignore_rules=rules_key)
+        _classifiers[rules_key] = classifier
+    return classifier
@@ -0,0 +1,139 @@
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from lesson_model import Lesson
+
+logger = logging.getLogger(__name__)
+
+
+class PredictedDay(NamedTuple):
+    """
+    Прогноз расписания на дату по недельному шаблону
+    """
+    date: str
+    lessons: Tuple[Lesson, ...]
+    # Сколько сохраненных дней того же дня недели легло в прогноз
+    days: int
+    # Доля дней, в которых урок стоял на том же месте (среднее по урокам, от 0 до 1)
+    confidence: float
+
+
+def _weekday(date_str):
+    return datetime.strptime(date_str, "%d-%m-%Y").weekday()
+
+
+def _ordinal(date_str):
+    return datetime.strptime(date_str, "%d-%m-%Y").toordinal()
+
+
+class WeeklyTimetable:
+    """
+    Недельный шаблон расписания: школьное расписание повторяется каждую неделю,
+    поэтому уроки даты, которой еще нет в кэше, можно предсказать по тому же дню недели.
+
+    Для каждого класса (partition - часть ключа кэша до даты, None для класса по умолчанию)
+    и дня недели хранятся уроки последних weeks сохраненных дней без домашних заданий.
+    Шаблон дня недели - самое частое число уроков и на каждом месте самый частый предмет
+    (время, кабинет и учитель - из последнего дня с этим предметом на этом месте);
+    при равенстве побеждают более свежие дни. Дни без уроков (каникулы, праздники)
+    в шаблон не попадают.
+    """
+
+    def __init__(self, weeks=4):
+        self.weeks = weeks
+        # (partition, weekday) -> {date: lessons}
+        self._days = {}
+        # (partition, weekday) -> (lessons, days, confidence), пересчитывается при изменении дней
+        self._templates = {}
+
+    def observe(self, partition, date_str, lessons):
+        """
+        Учитывает полученное расписание на дату
+        """
+        try:
+            slot = (partition, _weekday(date_str))
+        except ValueError:
+            return
+        days = self._days.setdefault(slot, {})
+        if not lessons:
+            if days.pop(date_str, None) is not None:
+                self._templates.pop(slot, None)
+            return
+        lessons = tuple(lesson._replace(homework=None, lesson_id=None) for lesson in lessons)
+        if days.get(date_str) == lessons:
+            return
+        days[date_str] = lessons
+        if len(days) > self.weeks:
+            # Остаются только последние weeks дней
+            for old in sorted(days, key=_ordinal)[:-self.weeks]:
+                del days[old]
+        self._templates.pop(slot, None)
+
+    def learn(self, cache, split_key):
+        """
+        Учитывает весь кэш расписания (словарь ключ -> DaySchedule) от старых дат к новым;
+        split_key(key) возвращает (partition, date)
+        """
+        for key, day in sorted(cache.items(), key=lambda item: self._key_ordinal(split_key(item[0])[1])):
+            partition, date_str = split_key(key)
+            self.observe(partition, date_str, day.lessons)
+        logger.info(f"Недельный шаблон расписания построен по {self.days_count()} дням")
+
+    def export(self):
+        """
+        Сохраненные дни для записи на диск
+        """
+        return {slot: dict(days) for slot, days in self._days.items() if days}
+
+    def load(self, data):
+        """
+        Восстанавливает сохраненные дни (результат export)
+        """
+        self._days = {slot: dict(days) for slot, days in data.items()}
+        self._templates.clear()
+
+    def predict(self, partition, date_str) -> Optional[PredictedDay]:
+        """
+        Прогноз расписания на дату или None, если для этого дня недели нет сохраненных дней
+        """
+        try:
+            slot = (partition, _weekday(date_str))
+        except ValueError:
+            return None
+        template = self._template(slot)
+        if template is None:
+            return None
+        lessons, days, confidence = template
+        return PredictedDay(date_str, lessons, days, confidence)
+
+    def days_count(self):
+        return sum(len(days) for days in self._days.values())
+
+    @staticmethod
+    def _key_ordinal(date_str):
+        try:
+            return _ordinal(date_str)
+        except ValueError:
+            return 0
+
+    def _template(self, slot):
+        if slot in self._templates:
+            return self._templates[slot]
+        days = self._days.get(slot)
+        if not days:
+            return None
+        # От свежих дней к старым: Counter.most_common при равенстве сохраняет порядок добавления
+        recent = [days[date_str] for date_str in sorted(days, key=_ordinal, reverse=True)]
+        length = Counter(len(lessons) for lessons in recent).most_common(1)[0][0]
+        template = []
+        agreement = 0.0
+        for position in range(length):
+            candidates = [lessons[position] for lessons in recent if len(lessons) > position]
+            subject, votes = Counter(lesson.subject for lesson in candidates).most_common(1)[0]
+            template.append(next(lesson for lesson in candidates if lesson.subject == subject))
+            agreement += votes / len(recent)
+        result = (tuple(template), len(recent), agreement / length)
+        self._templates[slot] = result
+        return result
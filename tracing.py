@@ -0,0 +1,228 @@
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Текущий span (передается через contextvars в задачи asyncio и, через wrap_context, в потоки)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+_ids = itertools.count(1)
+
+
+class Span:
+    """
+    Участок обработки запроса: имя, время начала, длительность и атрибуты.
+    Корневой span (без родителя) собирает все вложенные span-ы своей трассы.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent", "start", "start_wall",
+                 "duration", "attributes", "error", "spans", "_stage", "_token")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.span_id = next(_ids)
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.start = time.perf_counter()
+        self.start_wall = time.time()
+        self.duration = None
+        self.attributes = dict(attributes) if attributes else {}
+        self.error = None
+        self.spans = [] if parent is None else None
+        self._stage = None
+        self._token = None
+
+    @property
+    def root(self):
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+    def set(self, **attributes):
+        """
+        Добавляет атрибуты к span-у
+        """
+        self.attributes.update(attributes)
+
+    def to_dict(self, root_start):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent is not None else None,
+            "offset_ms": round((self.start - root_start) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    """
+    Создает span-ы и передает завершенные трассы экспортеру в формате JSONL
+    и в журнал медленных запросов
+    """
+
+    def __init__(self):
+        self.export_path = None
+        self.slow_threshold = None
+        self._export_lock = threading.Lock()
+
+    def configure(self, export_path=None, slow_threshold=None):
+        """
+        export_path - файл JSONL для записи всех трасс (None - не записывать)
+        slow_threshold - порог в секундах для записи медленных запросов в лог (None - не записывать)
+        """
+        self.export_path = export_path
+        self.slow_threshold = slow_threshold
+
+    def start_span(self, name, **attributes):
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    def end_span(self, span, error=None):
+        # Незавершенный этап закрывается вместе с родителем
+        if span._stage is not None:
+            self.end_span(span._stage)
+        span.duration = time.perf_counter() - span.start
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        if span._token is not None:
+            try:
+                _current_span.reset(span._token)
+            except ValueError:
+                # span завершается в другом контексте (например, этап из stage())
+                pass
+            span._token = None
+        if span.parent is None:
+            self._finish_trace(span)
+        else:
+            span.root.spans.append(span)
+
+    def span(self, name, **attributes):
+        """
+        Контекстный менеджер: with tracer.span("name", key=value) as span: ...
+        """
+        return _SpanContext(self, name, attributes)
+
+    def stage(self, name, **attributes):
+        """
+        Завершает предыдущий этап текущего span-а и начинает новый.
+        Удобно для последовательных шагов длинной функции без вложенных блоков with.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        if parent._stage is not None:
+            self.end_span(parent._stage)
+        stage = Span(name, parent, attributes)
+        parent._stage = stage
+        return stage
+
+    def traced(self, name=None, **attributes):
+        """
+        Декоратор: выполняет функцию (обычную или асинхронную) внутри span-а
+        """
+        def decorator(func):
+            span_name = name or func.__name__
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name, **attributes):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, **attributes):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _finish_trace(self, root):
+        if self.slow_threshold is not None and root.duration >= self.slow_threshold:
+            logger.warning(f"Медленный запрос: {format_trace(root)}")
+        if self.export_path:
+            record = {
+                "trace_id": root.trace_id,
+                "name": root.name,
+                "start": root.start_wall,
+                "duration_ms": round(root.duration * 1000, 2),
+                "attributes": root.attributes,
+                "error": root.error,
+                "spans": [span.to_dict(root.start) for span in sorted(root.spans, key=lambda s: s.start)],
+            }
+            try:
+                line = json.dumps(record, ensure_ascii=False, default=str)
+                with self._export_lock:
+                    with open(self.export_path, "a", encoding="utf-8") as f:
+                        f.write(line + "\n")
+            except Exception as e:
+                logger.error(f"Ошибка при записи трассы: {e}")
+
+
+class _SpanContext:
+    __slots__ = ("tracer", "name", "attributes", "span")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span = self.tracer.start_span(self.name, **self.attributes)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.end_span(self.span, exc)
+        return False
+
+
+def format_trace(root):
+    """
+    Краткое описание трассы для лога: общее время и длительность span-ов
+    """
+    parts = [f"{root.name} {root.duration:.2f} с"]
+    attributes = ", ".join(f"{key}={value}" for key, value in root.attributes.items())
+    if attributes:
+        parts[0] += f" ({attributes})"
+    for span in sorted(root.spans, key=lambda s: s.start):
+        depth = 0
+        parent = span.parent
+        while parent is not None:
+            depth += 1
+            parent = parent.parent
+        duration = f"{span.duration:.2f} с" if span.duration is not None else "?"
+        parts.append(f"{'  ' * depth}{span.name} {duration}" + (f" [{span.error}]" if span.error else ""))
+    return "\n".join(parts)
+
+
+def current_span():
+    """
+    Возвращает текущий span (или None вне трассы)
+    """
+    return _current_span.get()
+
+
+def wrap_context(func):
+    """
+    Возвращает функцию, выполняющую func в копии текущего контекста
+    (для передачи трассы в поток через run_in_executor)
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+# Трассировщик бота
+tracer = Tracer()
+span = tracer.span
+stage = tracer.stage
+traced = tracer.traced